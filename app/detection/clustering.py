@@ -1,130 +1,502 @@
-import pandas as pd
 import numpy as np
+from collections import Counter
+from sqlalchemy import or_, text
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import sessionmaker
 from sentence_transformers import SentenceTransformer
 from sklearn.cluster import HDBSCAN
+from sklearn.decomposition import PCA
 from datetime import datetime, timedelta, timezone
 import os
 import sys
+import time
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
-from app.models import Tweet, engine
+from app.models import Tweet, Narrative, NarrativeUser, Alert, engine
+from app.services.bulk_writer import ROWS_PER_STATEMENT
+from app.repository import load_embeddings
+from app.services.rate_counters import score_velocity
 
 Session = sessionmaker(bind=engine)
 
-def detect_narratives():
-    session = Session()
-    print("[CLUSTERING] Starting narrative detection cycle...")
-    
-    # 1. Fetch recent tweets (All for now to ensure we capture the batch)
-    # cutoff = datetime.now() - timedelta(hours=6)
-    tweets = session.query(Tweet).filter(Tweet.embedding != None).limit(500).all()
-    print(f"[CLUSTERING] Fetched {len(tweets)} tweets with embeddings from DB.")
-    
-    if len(tweets) < 5: # Lower threshold for demo
-        print("[CLUSTERING] Not enough tweets to cluster (Need 5+).")
-        session.close()
-        return
-
-    # 2. Extract Embeddings
-    # Assuming embeddings are stored as list/vector in DB. 
-    # pgvector returns numpy array or string depending on driver, but SQLAlchemy model should handle it?
-    # Actually, we might need to cast or ensure they are lists.
-    
-    embeddings = [np.array(t.embedding) for t in tweets if t.embedding is not None]
-    tweet_ids = [t.tweet_id for t in tweets if t.embedding is not None]
-    
-    if not embeddings:
-        session.close()
-        return
-
-    data_matrix = np.vstack(embeddings).astype(np.float64)
-    print(f"[CLUSTERING] Data Shape: {data_matrix.shape}")
-    
-    # 3. Cluster using HDBSCAN
-    print(f"[CLUSTERING] Clustering {len(data_matrix)} tweets...")
-    clusterer = HDBSCAN(min_cluster_size=5, min_samples=3, metric='euclidean')
-    labels = clusterer.fit_predict(data_matrix)
-    
-    # 4. Update Database
-    # Map label back to tweet
-    # Label -1 is noise
-    
-    updates = 0
-    unique_labels = set(labels)
-    print(f"[CLUSTERING] Found {len(unique_labels) - (1 if -1 in unique_labels else 0)} clusters.")
-
-    # We can do bulk update or iterate. 
-    # For MVP, iterate is fine or batch update by ID.
-    
-    for t_id, label in zip(tweet_ids, labels):
-        if label != -1:
-            # Update tweet object
-            # Ideally we'd do session.query(Tweet).filter...update
-            # But we have the objects in memory if we kept them map-able
-            # Optimization: filter query
-            pass
-            # session.query(Tweet).filter(Tweet.tweet_id == t_id).update({"narrative_id": int(label)})
-            # updates += 1
-            
-    # Efficient update
-    # Construct mappings
-    mappings = []
-    for t_id, label in zip(tweet_ids, labels):
-        if label != -1:
-            mappings.append({'tweet_id': t_id, 'narrative_id': int(label)})
-            
+def cosine_distances_to(centroids, vectors):
+    """(n_vectors, n_centroids) cosine distances; centroids need not be normalized."""
+    c = centroids / np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    v = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    return 1.0 - v @ c.T
+
+def cluster_radius(distances):
+    radius = np.percentile(distances, config.NARRATIVE_RADIUS_PERCENTILE)
+    return float(np.clip(radius, config.NARRATIVE_MIN_RADIUS, config.NARRATIVE_MAX_RADIUS))
+
+def merge_centroid(centroid, count, new_vectors):
+    """Running mean: the centroid of count old members plus new_vectors."""
+    return (np.asarray(centroid, dtype=np.float64) * count + new_vectors.sum(axis=0)) / (count + len(new_vectors))
+
+def tighten_cluster(members, embeddings, min_cluster_size):
+    """
+    Keeps the members within NARRATIVE_MAX_RADIUS of the cluster's medoid (most
+    central member), so noise HDBSCAN lumped in with a real topic is dropped.
+    Returns the kept member indices, or None if too few remain.
+    """
+    vectors = embeddings[members]
+    pairwise = cosine_distances_to(vectors, vectors)
+    medoid = vectors[pairwise.mean(axis=1).argmin()]
+    kept = members[cosine_distances_to(medoid[None, :], vectors)[:, 0] <= config.NARRATIVE_MAX_RADIUS]
+    return kept if len(kept) >= min_cluster_size else None
+
+class EmbeddingReducer:
+    """
+    Linear reduction applied before HDBSCAN: (x - mean) @ components.T.
+    'pca' keeps the top principal directions of recent tweets; 'random' is a
+    Gaussian random projection (no fit, distances preserved in expectation).
+    Saved as plain arrays so every analyzer restart reuses the same basis.
+    """
+    def __init__(self, kind, mean, components, fitted_at):
+        self.kind = kind
+        self.mean = mean.astype(np.float32)
+        self.components = components.astype(np.float32)
+        self.fitted_at = fitted_at
+
+    @classmethod
+    def fit(cls, kind, embeddings, dim, seed=42):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if kind == 'pca':
+            pca = PCA(n_components=dim, svd_solver='randomized', random_state=seed).fit(embeddings)
+            mean, components = pca.mean_, pca.components_
+        elif kind == 'random':
+            rng = np.random.default_rng(seed)
+            mean = np.zeros(embeddings.shape[1])
+            components = rng.normal(0, 1 / np.sqrt(dim), size=(dim, embeddings.shape[1]))
+        else:
+            raise ValueError(f"Unknown reducer '{kind}', expected 'pca' or 'random'")
+        return cls(kind, mean, components, datetime.now(timezone.utc))
+
+    def transform(self, embeddings):
+        return (np.asarray(embeddings, dtype=np.float32) - self.mean) @ self.components.T
+
+    @property
+    def dim(self):
+        return self.components.shape[0]
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(path, kind=self.kind, mean=self.mean, components=self.components, fitted_at=self.fitted_at.timestamp())
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            fitted_at = datetime.fromtimestamp(float(data['fitted_at']), timezone.utc)
+            return cls(str(data['kind']), data['mean'], data['components'], fitted_at)
+
+def get_reducer(sample_fn, kind=None, dim=None, path=None, refit_hours=None):
+    """
+    Returns the cached reducer, refitting it on sample_fn() (recent embeddings)
+    when missing, stale or configured differently. None if reduction is off or
+    there is not enough data to fit it yet.
+    """
+    kind = kind or config.NARRATIVE_REDUCER
+    dim = dim or config.NARRATIVE_REDUCER_DIM
+    path = path or config.NARRATIVE_REDUCER_PATH
+    refit_hours = config.NARRATIVE_REDUCER_REFIT_HOURS if refit_hours is None else refit_hours
+    if kind in (None, '', 'none'):
+        return None
+
+    reducer = None
+    if os.path.exists(path):
+        try:
+            reducer = EmbeddingReducer.load(path)
+        except Exception as e:
+            print(f"[CLUSTERING] Ignoring unreadable reducer cache {path}: {e}")
+    age = datetime.now(timezone.utc) - reducer.fitted_at if reducer else None
+    if reducer and reducer.kind == kind and reducer.dim == dim and age < timedelta(hours=refit_hours):
+        return reducer
+
+    sample = sample_fn()
+    if len(sample) <= dim:
+        return None
+    reducer = EmbeddingReducer.fit(kind, sample, dim)
+    reducer.save(path)
+    print(f"[CLUSTERING] Fitted {kind} reducer {sample.shape[1]} -> {dim} dims on {len(sample)} tweets.")
+    return reducer
+
+def assign_to_centroids(centroids, radii, embeddings):
+    """Index of the nearest centroid per embedding if within its radius, else -1."""
+    assigned = np.full(len(embeddings), -1, dtype=np.int64)
+    if len(centroids) and len(embeddings):
+        distances = cosine_distances_to(centroids, embeddings)
+        nearest = distances.argmin(axis=1)
+        within = distances[np.arange(len(embeddings)), nearest] <= np.asarray(radii)[nearest]
+        assigned[within] = nearest[within]
+    return assigned
+
+def assign_incremental(centroids, radii, embeddings, min_cluster_size=None, min_samples=None, reducer=None):
+    """
+    One incremental clustering step.
+    Each embedding joins its nearest existing narrative if within that narrative's
+    radius; HDBSCAN runs only on the ones left over.
+    Returns (assigned, new_clusters):
+      assigned: int array, index into centroids or -1
+      new_clusters: [(member_indices, centroid, radius), ...] found among the leftovers
+    If a reducer is given HDBSCAN runs in its reduced space; assignment, radii
+    and centroids always use the full embeddings.
+    """
+    min_cluster_size = min_cluster_size or config.NARRATIVE_MIN_CLUSTER_SIZE
+    min_samples = min_samples or config.NARRATIVE_MIN_SAMPLES
+
+    assigned = assign_to_centroids(centroids, radii, embeddings)
+
+    new_clusters = []
+    leftover = np.where(assigned == -1)[0]
+    if len(leftover) >= min_cluster_size:
+        # The leftovers often hold a single emerging topic amid noise
+        clusterer = HDBSCAN(min_cluster_size=min_cluster_size, min_samples=min_samples, metric='euclidean', allow_single_cluster=True)
+        points = embeddings[leftover] if reducer is None else reducer.transform(embeddings[leftover])
+        labels = clusterer.fit_predict(points)
+        for label in sorted(set(labels) - {-1}):
+            members = tighten_cluster(leftover[labels == label], embeddings, min_cluster_size)
+            if members is None: continue
+            centroid = embeddings[members].mean(axis=0)
+            radius = cluster_radius(cosine_distances_to(centroid[None, :], embeddings[members])[:, 0])
+            new_clusters.append((members, centroid, radius))
+    return assigned, new_clusters
+
+class NarrativeMatcher:
+    """
+    Provisional narrative ids for the worker: nearest centroid within its radius,
+    the same rule the clustering cycle applies later. Centroids are reloaded
+    every RATE_NARRATIVE_REFRESH_SECONDS.
+    """
+    def __init__(self, refresh_seconds=None):
+        self.refresh_seconds = refresh_seconds or config.RATE_NARRATIVE_REFRESH_SECONDS
+        self.ids = np.empty(0, dtype=np.int64)
+        self.centroids = None
+        self.radii = None
+        self.loaded_at = None
+
+    def refresh(self, session):
+        since = datetime.now(timezone.utc) - timedelta(hours=config.NARRATIVE_BASELINE_HOURS)
+        rows = session.query(Narrative.narrative_id, Narrative.centroid, Narrative.radius).filter(
+            Narrative.last_seen >= since, Narrative.centroid != None
+        ).all()
+        self.ids = np.array([r[0] for r in rows], dtype=np.int64)
+        self.centroids = np.vstack([np.asarray(r[1], dtype=np.float32) for r in rows]) if rows else None
+        self.radii = np.array([r[2] for r in rows], dtype=np.float32)
+        self.loaded_at = time.monotonic()
+
+    def match(self, session, embeddings):
+        """Narrative id per embedding, -1 if none is close enough."""
+        if self.loaded_at is None or time.monotonic() - self.loaded_at >= self.refresh_seconds:
+            self.refresh(session)
+        matched = np.full(len(embeddings), -1, dtype=np.int64)
+        if self.centroids is None or not len(embeddings):
+            return matched
+        distances = cosine_distances_to(self.centroids, np.asarray(embeddings, dtype=np.float32))
+        nearest = distances.argmin(axis=1)
+        within = distances[np.arange(len(embeddings)), nearest] <= self.radii[nearest]
+        matched[within] = self.ids[nearest[within]]
+        return matched
+
+def roll_ring(counts, last_bucket, now_bucket, width, new_buckets=()):
+    """
+    Tweet counts per time bucket (minute, hour...) as a ring indexed by
+    bucket % width. Advances the ring from last_bucket to now_bucket (zeroing
+    the buckets that passed) and adds one tweet per entry of new_buckets that
+    falls in the window.
+    """
+    if not counts or len(counts) != width or last_bucket is None or now_bucket - last_bucket >= width:
+        counts = [0] * width
+    else:
+        counts = list(counts)
+        for bucket in range(last_bucket + 1, now_bucket + 1):
+            counts[bucket % width] = 0
+    for bucket in new_buckets:
+        if now_bucket - width < bucket <= now_bucket:
+            counts[bucket % width] += 1
+    return counts
+
+def ring_matrix(rings, ends, now_bucket, width):
+    """
+    Stacks rings (see roll_ring) last advanced to ends into an (n, width) matrix
+    of counts ordered oldest -> newest, ending at now_bucket. Buckets a ring has
+    not reached yet (older data from the previous lap) count as zero.
+    Returns (matrix, buckets).
+    """
+    matrix = np.zeros((len(rings), width), dtype=np.int64)
+    last = np.full(len(rings), -1, dtype=np.int64)
+    for i, (ring, end) in enumerate(zip(rings, ends)):
+        if ring and len(ring) == width and end is not None:
+            matrix[i] = ring
+            last[i] = end
+    buckets = np.arange(now_bucket - width + 1, now_bucket + 1)
+    aligned = matrix[:, buckets % width]
+    aligned[buckets[None, :] > last[:, None]] = 0
+    return aligned, buckets
+
+def add_members(narrative, timestamps, now):
+    """Folds newly assigned tweets (their timestamps) into the narrative's counters."""
+    timestamps = [ts for ts in timestamps if ts]
+    if timestamps:
+        first, last = min(timestamps), max(timestamps)
+        narrative.first_seen = first if narrative.first_seen is None else min(narrative.first_seen, first)
+        narrative.last_seen = last if narrative.last_seen is None else max(narrative.last_seen, last)
+
+    now_minute = int(now.timestamp() // 60)
+    minutes = [int(ts.timestamp() // 60) for ts in timestamps]
+    last_minute = narrative.rate_minute
+    narrative.minute_counts = roll_ring(narrative.minute_counts, last_minute, now_minute, 60, minutes)
+    narrative.hour_counts = roll_ring(
+        narrative.hour_counts, None if last_minute is None else last_minute // 60, now_minute // 60,
+        config.NARRATIVE_BASELINE_HOURS, [m // 60 for m in minutes]
+    )
+    narrative.rate_minute = now_minute
+
+def refresh_rates(narratives, now):
+    """
+    Recomputes current rate, baseline, velocity and the spike flag for all
+    narratives at once from their own counters (no tweet scan):
+      current rate: tweets in the last NARRATIVE_SPIKE_WINDOW_MINUTES, per hour
+      baseline: tweets/hour over the last NARRATIVE_BASELINE_HOURS (or the
+                narrative's lifetime, if shorter)
+    Returns the is_spike flags as a bool array.
+    """
+    window = config.NARRATIVE_SPIKE_WINDOW_MINUTES
+    hours = config.NARRATIVE_BASELINE_HOURS
+    now_minute = int(now.timestamp() // 60)
+    ends = [n.rate_minute for n in narratives]
+
+    minutes, minute_buckets = ring_matrix([n.minute_counts for n in narratives], ends, now_minute, 60)
+    hourly, hour_buckets = ring_matrix(
+        [n.hour_counts for n in narratives], [None if e is None else e // 60 for e in ends], now_minute // 60, hours
+    )
+
+    current = minutes[:, -window:].sum(axis=1) * (60.0 / window)
+    now_ts = now.timestamp()
+    first_seen = np.array([n.first_seen.timestamp() if n.first_seen else now_ts for n in narratives], dtype=np.float64)
+    covered_hours = (now_ts - np.maximum(first_seen, now_ts - hours * 3600)) / 3600
+    baseline = hourly.sum(axis=1) / np.maximum(covered_hours, 1.0) # Avoid div by zero
+    velocity, is_spike = score_velocity(current, baseline)
+
+    # Store the advanced rings back in ring order
+    minute_rings = np.empty_like(minutes)
+    minute_rings[:, minute_buckets % 60] = minutes
+    hour_rings = np.empty_like(hourly)
+    hour_rings[:, hour_buckets % hours] = hourly
+    for i, narrative in enumerate(narratives):
+        narrative.minute_counts = minute_rings[i].tolist()
+        narrative.hour_counts = hour_rings[i].tolist()
+        narrative.rate_minute = now_minute
+        narrative.hourly_rate = float(current[i])
+        narrative.baseline_rate = float(baseline[i])
+        narrative.velocity = float(velocity[i])
+        narrative.is_spike = bool(is_spike[i])
+    return is_spike
+
+def update_representative(narrative, tweet_ids, vectors):
+    """
+    Keeps the member closest to the centroid as the narrative's summary tweet.
+    Returns True if it changed (its text still has to be loaded).
+    """
+    distances = cosine_distances_to(np.asarray(narrative.centroid)[None, :], vectors)[:, 0]
+    best = int(distances.argmin())
+    if narrative.representative_distance is None or distances[best] < narrative.representative_distance:
+        narrative.representative_tweet_id = tweet_ids[best]
+        narrative.representative_distance = float(distances[best])
+        return True
+    return False
+
+def count_new_users(session, pairs):
+    """
+    Records (narrative_id, user_id) pairs; returns {narrative_id: newly seen users}.
+    ON CONFLICT DO NOTHING ... RETURNING only yields the pairs not seen before.
+    """
+    added = Counter()
+    pairs = sorted(set(pairs))
+    for start in range(0, len(pairs), ROWS_PER_STATEMENT):
+        rows = [{'narrative_id': nid, 'user_id': uid} for nid, uid in pairs[start:start + ROWS_PER_STATEMENT]]
+        stmt = insert(NarrativeUser).values(rows).on_conflict_do_nothing().returning(NarrativeUser.narrative_id)
+        added.update(r[0] for r in session.execute(stmt))
+    return added
+
+def expire_buffer(session):
+    """Unassigned tweets older than the buffer window are marked noise (-1) and never re-clustered."""
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=config.NARRATIVE_BUFFER_HOURS)
+    return session.query(Tweet).filter(
+        Tweet.narrative_id == None, Tweet.embedding != None,
+        or_(Tweet.timestamp_absolute < cutoff, Tweet.timestamp_absolute == None)
+    ).update({Tweet.narrative_id: -1}, synchronize_session=False)
+
+def fold_members(session, groups, batch, embeddings, now):
+    """
+    Folds newly assigned tweets into their narratives' stats and stores their
+    narrative_id. groups: [(narrative, member indices into batch)].
+    Returns the number of tweets assigned.
+    """
+    mappings, user_pairs = [], []
+    new_representatives = {}
+    for narrative, members in groups:
+        narrative.tweet_count = (narrative.tweet_count or 0) + len(members)
+        add_members(narrative, [batch.timestamps[i] for i in members], now)
+        if update_representative(narrative, [batch.tweet_ids[i] for i in members], embeddings[members]):
+            new_representatives[narrative.representative_tweet_id] = narrative
+        user_pairs.extend((narrative.narrative_id, batch.user_ids[i]) for i in members if batch.user_ids[i])
+        mappings.extend({'tweet_id': batch.tweet_ids[i], 'narrative_id': narrative.narrative_id} for i in members)
+
+    if new_representatives:
+        for tweet_id, text_clean in session.query(Tweet.tweet_id, Tweet.text_clean).filter(Tweet.tweet_id.in_(list(new_representatives))):
+            new_representatives[tweet_id].representative_text = text_clean
+
+    by_id = {n.narrative_id: n for n, _ in groups}
+    for nid, added in count_new_users(session, user_pairs).items():
+        by_id[nid].unique_users = (by_id[nid].unique_users or 0) + added
+
+    # Tweets left out stay in the buffer, as NULL
     if mappings:
         session.bulk_update_mappings(Tweet, mappings)
-        session.commit()
-        print(f"[CLUSTERING] Updated {len(mappings)} tweets with narrative IDs.")
-    
-    # 5. Spike Detection (Volume Anomalies)
-    # Group by narrative_id and check velocity
-    detect_spikes(tweets, labels, session)
-    
-    session.close()
-
-def detect_spikes(tweets, labels, session):
-    # Convert to DataFrame for easier time grouping
-    data = []
-    for t, label in zip(tweets, labels):
-        if label == -1: continue
-        if not t.timestamp_absolute: continue
-        data.append({
-            'tweet_id': t.tweet_id,
-            'narrative_id': label,
-            'created_at': t.timestamp_absolute
-        })
-    
-    if not data: return
-    
-    df = pd.DataFrame(data)
-    df['created_at'] = pd.to_datetime(df['created_at'])
-    
-    # Iterate through narratives
-    for narrative_id in df['narrative_id'].unique():
-        narrative_df = df[df['narrative_id'] == narrative_id]
-        
-        # Calculate rates
+    return len(mappings)
+
+class BufferCursor:
+    """
+    How far detect_narratives has matched the unassigned buffer, by ingest time
+    (tweets.created_at), kept between the cycles of one analyzer process. A
+    fresh cursor (analyzer restart) matches the whole buffer once.
+    """
+    def __init__(self):
+        self.ingested_through = None
+        self.new_leftovers = 0 # unmatched tweets ingested since HDBSCAN last ran
+        self.counted = set() # leftovers counted last cycle (the overlap re-reads them)
+
+BUFFER_CURSOR = BufferCursor()
+
+def detect_narratives(cursor=None):
+    """
+    Incremental narrative detection. Narratives (centroid + radius + stats)
+    persist in the narratives table, so ids stay stable between cycles.
+
+    Each cycle matches only the tweets ingested since the previous one against
+    the centroids of the narratives seen within NARRATIVE_BASELINE_HOURS, so
+    its cost follows the new volume, not the buffer size. HDBSCAN re-clusters
+    the newest NARRATIVE_BATCH_LIMIT leftovers only once
+    NARRATIVE_RECLUSTER_MIN_LEFTOVERS new ones have piled up.
+    """
+    cursor = cursor or BUFFER_CURSOR
+    session = Session()
+    print("[CLUSTERING] Starting narrative detection cycle...")
+
+    try:
+        expired = expire_buffer(session)
+        if expired:
+            print(f"[CLUSTERING] Marked {expired} stale unassigned tweets as noise.")
+
         now = datetime.now(timezone.utc)
-        last_hour = narrative_df[narrative_df['created_at'] >= (now - timedelta(hours=1))]
-        current_rate = len(last_hour)
-        
-        # Simple baseline (avg per hour over full window, e.g. 6h)
-        duration_hours = (narrative_df['created_at'].max() - narrative_df['created_at'].min()).total_seconds() / 3600
-        duration_hours = max(duration_hours, 1) # Avoid div by zero
-        baseline_rate = len(narrative_df) / duration_hours
-        
-        velocity = current_rate / max(baseline_rate, 0.1)
-        print(f"   [DEBUG] Narrative {narrative_id}: Rate={current_rate}/hr, Baseline={baseline_rate:.2f}/hr, Velocity={velocity:.2f}x")
-        
-        if velocity >= 3.0 and current_rate > 5:
-            print(f"[SPIKE DETECTED] Narrative {narrative_id}: Velocity {velocity:.1f}x (Rate: {current_rate}/hr)")
-            # Log this spike? Create a 'Narrative' record?
-            # PDF Step 4 Deliverables: "Spike detector flags 3x+ volume increases"
-            # For now, just print. Ideally store in 'narratives' table.
+        # Same clock as created_at (Postgres), so the high-water mark never runs ahead of the rows
+        cycle_start = session.execute(text("SELECT now()")).scalar()
+        ingested_after = None
+        if cursor.ingested_through is not None:
+            ingested_after = cursor.ingested_through - timedelta(seconds=config.NARRATIVE_INGEST_OVERLAP_SECONDS)
+        buffer_since = now - timedelta(hours=config.NARRATIVE_BUFFER_HOURS)
+
+        narratives = session.query(Narrative).filter(
+            Narrative.last_seen >= now - timedelta(hours=config.NARRATIVE_BASELINE_HOURS), Narrative.centroid != None
+        ).order_by(Narrative.narrative_id).all()
+        centroids = np.vstack([np.asarray(n.centroid) for n in narratives]) if narratives else np.empty((0, 0))
+        radii = [n.radius for n in narratives]
+
+        # 1. Match the newly ingested part of the buffer to the active narratives, chunk by chunk
+        fetched, joined = 0, 0
+        leftover_ids = set()
+        before = None
+        while True:
+            batch = load_embeddings(
+                session, since=buffer_since, unassigned_only=True, limit=config.NARRATIVE_ASSIGN_CHUNK_ROWS,
+                before=before, ingested_after=ingested_after
+            )
+            if not batch.tweet_ids:
+                break
+            fetched += len(batch.tweet_ids)
+            before = (batch.timestamps[-1], batch.tweet_ids[-1])
+
+            assigned = assign_to_centroids(centroids, radii, batch.vectors)
+            groups = []
+            for k in np.unique(assigned[assigned != -1]):
+                members = np.where(assigned == k)[0]
+                narrative = narratives[k]
+                narrative.centroid = merge_centroid(narrative.centroid, narrative.tweet_count, batch.vectors[members])
+                groups.append((narrative, members))
+            joined += fold_members(session, groups, batch, batch.vectors, now)
+            leftover_ids.update(batch.tweet_ids[i] for i in np.where(assigned == -1)[0])
+            if len(batch.tweet_ids) < config.NARRATIVE_ASSIGN_CHUNK_ROWS:
+                break
+        new_leftovers = cursor.new_leftovers + len(leftover_ids - cursor.counted)
+        print(f"[CLUSTERING] Matched {fetched} newly ingested tweets, {joined} joined existing narratives "
+              f"({new_leftovers} new leftovers since the last clustering).")
+
+        # 2. Cluster the newest leftovers into new narratives, once enough new ones accumulated
+        if new_leftovers >= config.NARRATIVE_RECLUSTER_MIN_LEFTOVERS:
+            # Reads the assignments above (same transaction): only tweets still unmatched
+            batch = load_embeddings(session, since=buffer_since, unassigned_only=True, limit=config.NARRATIVE_BATCH_LIMIT)
+            reducer = get_reducer(lambda: load_embeddings(
+                session, since=now - timedelta(hours=config.NARRATIVE_REDUCER_REFIT_HOURS),
+                limit=config.NARRATIVE_REDUCER_FIT_SAMPLES
+            ).vectors)
+            _, new_clusters = assign_incremental(np.empty((0, batch.vectors.shape[1])), [], batch.vectors, reducer=reducer)
+
+            groups = []
+            for members, centroid, radius in new_clusters:
+                narrative = Narrative(centroid=centroid, radius=radius, tweet_count=0, unique_users=0)
+                session.add(narrative)
+                session.flush() # allocates narrative_id
+                narratives.append(narrative)
+                groups.append((narrative, members))
+            clustered = fold_members(session, groups, batch, batch.vectors, now)
+            print(f"[CLUSTERING] {len(new_clusters)} new narratives from {len(batch.tweet_ids)} leftovers, "
+                  f"{len(batch.tweet_ids) - clustered} still unassigned.")
+            new_leftovers = 0
+
+        # 3. Spike Detection (Volume Anomalies)
+        spikes = detect_spikes(session, narratives, now)
+        print(f"[CLUSTERING] {len(spikes)} narratives spiking.")
+        session.commit()
+
+        # Only a committed cycle moves the cursor; a failed one is redone from the same point
+        cursor.ingested_through = cycle_start
+        cursor.new_leftovers = new_leftovers
+        cursor.counted = leftover_ids
+    finally:
+        session.close()
+
+def spike_alert(narrative, now):
+    severity = "CRITICAL" if narrative.velocity >= 2 * config.NARRATIVE_SPIKE_VELOCITY else "HIGH"
+    summary = (narrative.representative_text or "")[:120]
+    return Alert(
+        timestamp=now, alert_type="NARRATIVE_SPIKE", severity=severity, narrative_id=narrative.narrative_id,
+        description=f"Narrative {narrative.narrative_id} at {narrative.velocity:.1f}x its baseline "
+                    f"({narrative.hourly_rate:.0f}/hr vs {narrative.baseline_rate:.1f}/hr). {summary}"
+    )
+
+def detect_spikes(session, narratives, now=None):
+    """
+    Refreshes rolling velocity for the narratives seen within the baseline
+    window (rates decay even without new tweets) and stores an alert for each
+    narrative that starts spiking. Older narratives are left alone: their
+    counters are all zero and their flag already cleared.
+    A narrative that stays in a spike is not re-alerted every cycle.
+    Returns the narratives currently spiking.
+    """
+    now = now or datetime.now(timezone.utc)
+    since = now - timedelta(hours=config.NARRATIVE_BASELINE_HOURS)
+    narratives = [n for n in narratives if n.last_seen is not None and n.last_seen >= since]
+    if not narratives:
+        return []
+    was_spike = np.array([bool(n.is_spike) for n in narratives])
+    is_spike = refresh_rates(narratives, now)
+
+    for i in np.where(is_spike & ~was_spike)[0]:
+        alert = spike_alert(narratives[i], now)
+        session.add(alert)
+        print(f"[SPIKE DETECTED] {alert.description}")
+    return [narratives[i] for i in np.where(is_spike)[0]]
 
 if __name__ == "__main__":
     detect_narratives()
@@ -3,13 +3,17 @@ import numpy as np
 from networkx.algorithms import community
 import matplotlib.pyplot as plt
 from sqlalchemy.orm import sessionmaker
+from datetime import datetime, timedelta, timezone
 import os
 import sys
 
 # Add project root to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
-from app.models import Tweet, User, engine
+from app.models import engine
+from app.repository import window_posts, user_mean_embeddings, mention_edges, graph_users
+from app.detection.similarity import similarity_pairs
+from app.detection.coordination import SynchronyDetector
 
 Session = sessionmaker(bind=engine)
 
@@ -17,47 +21,36 @@ def build_graph_and_detect():
     session = Session()
     print("[GRAPH] Building interaction graph...")
     
-    # 1. Fetch recent tweets with embeddings
-    # Limit to interact with manageable graph size for MVP
-    tweets = session.query(Tweet).filter(Tweet.embedding != None).limit(2000).all()
-    if not tweets:
-        print("[GRAPH] No tweets with embeddings found.")
+    # 1. Fetch the window's posts: only the columns each edge type needs
+    since = datetime.now(timezone.utc) - timedelta(hours=config.GRAPH_WINDOW_HOURS)
+    posts = window_posts(session, since)
+    if not posts:
+        print("[GRAPH] No tweets in the graph window.")
         session.close()
         return []
         
-    users = session.query(User).all()
-    user_map = {u.user_id: u for u in users}
+    # Nodes: only the users seen in the window (posters and the accounts they mention)
+    edges = mention_edges(session, since)
+    user_ids = {user_id for user_id, _ in posts} | {target for _, target, _ in edges}
     
     G = nx.Graph()
     
     # Add Nodes
-    for u in users:
-        G.add_node(u.user_id, bot_score=u.bot_score or 0.0, handle=u.handle)
+    for user_id, handle, bot_score in graph_users(session, user_ids):
+        G.add_node(user_id, bot_score=bot_score or 0.0, handle=handle)
         
-    # Add Interaction Edges (Mentions)
+    # Add Interaction Edges (Mentions), aggregated per sender/target in SQL
     print("   Adding interaction edges...")
-    for t in tweets:
-        sender = t.user_id
-        if not sender: continue
-        
-        # MENTION Edges (weight=0.5)
-        if t.mentions:
-            for mention_handle in t.mentions:
-                target_handle = mention_handle.replace('@', '')
-                # Find target user ID (assuming handle match for MVP)
-                target_user = session.query(User).filter(User.handle == target_handle).first()
-                
-                if target_user:
-                    target_id = target_user.user_id
-                    if G.has_edge(sender, target_id):
-                        G[sender][target_id]['weight'] += 0.5
-                    else:
-                        G.add_edge(sender, target_id, weight=0.5, type='MENTION')
+    for sender, target_id, mentions in edges:
+        # MENTION Edges (weight=0.5 per mention)
+        if G.has_edge(sender, target_id):
+            G[sender][target_id]['weight'] += 0.5 * mentions
+        else:
+            G.add_edge(sender, target_id, weight=0.5 * mentions, type='MENTION')
 
-    # Add Similarity Edges (Content-based)
+    # Add Similarity Edges (Content-based), from each user's mean embedding averaged in SQL
     print("   Adding similarity edges...")
-    similarity_pairs = find_similar_content_pairs(tweets)
-    for user_a, user_b, similarity in similarity_pairs:
+    for user_a, user_b, similarity in similar_user_pairs(*user_mean_embeddings(session, since)):
         # Ensure nodes exist (might be from tweets where user fetch missed?)
         if not G.has_node(user_a): G.add_node(user_a, bot_score=0)
         if not G.has_node(user_b): G.add_node(user_b, bot_score=0)
@@ -67,6 +60,18 @@ def build_graph_and_detect():
         else:
             G.add_edge(user_a, user_b, weight=similarity, type='SIMILAR')
             
+    # Add Synchrony Edges (repeatedly posting within seconds of each other, any text)
+    print("   Adding synchrony edges...")
+    users_a, users_b, _, weights = SynchronyDetector().find_pairs([p[0] for p in posts], [p[1].timestamp() for p in posts])
+    for user_a, user_b, weight in zip(users_a.tolist(), users_b.tolist(), weights.tolist()):
+        if not G.has_node(user_a): G.add_node(user_a, bot_score=0)
+        if not G.has_node(user_b): G.add_node(user_b, bot_score=0)
+        
+        if G.has_edge(user_a, user_b):
+            G[user_a][user_b]['weight'] += weight
+        else:
+            G.add_edge(user_a, user_b, weight=weight, type='SYNC')
+            
     print(f"[GRAPH] Nodes: {G.number_of_nodes()}, Edges: {G.number_of_edges()}")
     
     if G.number_of_edges() == 0:
@@ -110,7 +115,6 @@ def build_graph_and_detect():
             print(f"      [L3] Flagging {len(members)} members of {comm_type} for profiling...")
             try:
                 import redis
-                import config
                 r = redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB)
                 for member_id in members:
                     # 'member_id' here is user_id (which is handle in our MVP logic for now, or mapped)
@@ -140,8 +144,6 @@ def build_graph_and_detect():
     return results
 
 def find_similar_content_pairs(tweets):
-    from sklearn.metrics.pairwise import cosine_similarity
-    
     # Group embeddings by User
     user_embeddings = {}
     for t in tweets:
@@ -159,20 +161,14 @@ def find_similar_content_pairs(tweets):
             user_avg[uid] = np.mean(embs, axis=0)
             
     users = list(user_avg.keys())
+    return similar_user_pairs(users, np.array([user_avg[u] for u in users]) if users else None)
+
+def similar_user_pairs(users, matrix):
+    """(user_a, user_b, similarity) for users whose mean embeddings (rows of matrix) are close."""
     if len(users) < 2: return []
-    
-    matrix = np.array([user_avg[u] for u in users])
-    sim_matrix = cosine_similarity(matrix)
-    
-    pairs = []
-    # Upper triangle
-    for i in range(len(users)):
-        for j in range(i+1, len(users)):
-            score = sim_matrix[i][j]
-            if score > 0.85: # High similarity threshold
-                pairs.append((users[i], users[j], float(score)))
-                
-    return pairs
+    # Upper triangle, in row blocks (no n x n matrix)
+    rows, cols, scores = similarity_pairs(matrix, 0.85) # High similarity threshold
+    return [(users[i], users[j], float(score)) for i, j, score in zip(rows.tolist(), cols.tolist(), scores.tolist())]
 
 if __name__ == "__main__":
     build_graph_and_detect()
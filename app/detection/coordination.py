@@ -1,28 +1,543 @@
-from datetime import timedelta
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import or_, text
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+from scipy.sparse import coo_matrix, csr_matrix, diags
+from scipy.sparse.csgraph import connected_components
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import config
+from app.models import CoordinationCluster, Tweet
+from app.services.fingerprint import SimHashIndex
+from app.detection.similarity import similarity_pairs, normalize_rows
+
+def _as_utc(timestamp):
+    """Aware UTC datetime; naive timestamps are taken as UTC (None stays None)."""
+    if timestamp is None:
+        return None
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(timezone.utc)
+
+class _HashWindow:
+    """Tweets of one text_hash within the time window, in arrival order."""
+    __slots__ = ('entries', 'users', 'newest', 'sample_text', 'emitted')
+
+    def __init__(self):
+        self.entries = deque() # (timestamp, user_id, tweet_id)
+        self.users = {} # user_id -> tweets in the window
+        self.newest = None
+        self.sample_text = None
+        self.emitted = False
+
+    def evict(self, cutoff):
+        while self.entries and self.entries[0][0] < cutoff:
+            _, user, _ = self.entries.popleft()
+            self.users[user] -= 1
+            if not self.users[user]:
+                del self.users[user]
+
+class StreamingCopypastaDetector:
+    """
+    EXACT_MATCH detection fed tweet by tweet (by the worker), so bursts are
+    caught as they happen instead of only within the batch job's last 1000
+    tweets. Keeps, per text_hash, the tweets within time_window of the newest
+    one; a cluster is emitted the moment min_users distinct users are in the
+    window, once per burst.
+
+    Memory is bounded by time: hashes with nothing inside the window are
+    dropped, and at most max_hashes are tracked (least recently seen first).
+    Each worker only sees its share of the stream.
+    """
+    def __init__(self, time_window_minutes=None, min_users=3, max_hashes=None):
+        self.time_window = timedelta(minutes=time_window_minutes or config.COPYPASTA_WINDOW_MINUTES)
+        self.min_users = min_users
+        self.max_hashes = max_hashes or config.COPYPASTA_MAX_HASHES
+        self.windows = OrderedDict() # text_hash -> _HashWindow, least recently seen first
+        self.watermark = None # newest timestamp seen
+
+    def expire(self):
+        """Drops hashes whose newest tweet left the window, and the oldest ones over max_hashes."""
+        cutoff = self.watermark - self.time_window
+        while self.windows:
+            text_hash, window = next(iter(self.windows.items()))
+            if window.newest >= cutoff and len(self.windows) <= self.max_hashes:
+                break
+            del self.windows[text_hash]
+
+    def add(self, text_hash, user_id, timestamp, tweet_id=None, text=None):
+        """Feeds one tweet. Returns an EXACT_MATCH cluster dict when this tweet completes one, else None."""
+        timestamp = _as_utc(timestamp)
+        if not text_hash or not user_id or timestamp is None:
+            return None
+        if self.watermark is None or timestamp > self.watermark:
+            self.watermark = timestamp
+        cutoff = self.watermark - self.time_window
+        if timestamp < cutoff:
+            return None # arrived too late to be part of a live burst
+
+        window = self.windows.get(text_hash)
+        if window is None:
+            window = self.windows[text_hash] = _HashWindow()
+            window.sample_text = text
+        else:
+            self.windows.move_to_end(text_hash)
+        window.evict(cutoff)
+        window.entries.append((timestamp, user_id, tweet_id))
+        window.users[user_id] = window.users.get(user_id, 0) + 1
+        window.newest = timestamp if window.newest is None else max(window.newest, timestamp)
+
+        cluster = None
+        if len(window.users) < self.min_users:
+            window.emitted = False
+        elif not window.emitted:
+            window.emitted = True
+            times = [ts for ts, _, _ in window.entries]
+            cluster = {
+                'type': 'EXACT_MATCH',
+                'text_hash': text_hash,
+                'users': list(window.users),
+                'tweet_ids': [tid for _, _, tid in window.entries],
+                'tweet_count': len(window.entries),
+                'time_span_seconds': (max(times) - min(times)).total_seconds(),
+                'first_seen': min(times),
+                'last_seen': max(times),
+                'sample_text': window.sample_text
+            }
+        self.expire()
+        return cluster
+
+    def add_batch(self, items):
+        """Feeds cleaned tweets (worker dicts); returns the clusters they complete."""
+        clusters = []
+        timed = [(_as_utc(item.get('timestamp_absolute')), k) for k, item in enumerate(items)]
+        for timestamp, k in sorted(t for t in timed if t[0] is not None):
+            item = items[k]
+            cluster = self.add(item.get('text_hash'), item.get('handle'), timestamp,
+                               item.get('tweet_id'), item.get('text_clean'))
+            if cluster:
+                clusters.append(cluster)
+        return clusters
+
+class StreamingSemanticDetector:
+    """
+    Paraphrase coordination checked per tweet as the worker persists it.
+    Each embedding gets a random-hyperplane LSH signature (bands x bits sign
+    bits); tweets are indexed in buckets keyed by (band, band hash, time slot)
+    with slots as long as the window. A new tweet only looks at the buckets of
+    its own bands in the current and previous slot, a bounded set, and exact
+    cosine similarity runs only on those candidates.
+
+    A cluster is emitted when a tweet and its verified neighbours within the
+    window span min_users distinct users; later neighbours join it silently.
+    Tweets whose text_hash is already indexed are skipped (exact copies are the
+    copypasta detector's job). Memory is evicted by time, and each bucket keeps
+    at most max_bucket entries. Each worker only sees its share of the stream.
+    """
+    def __init__(self, time_window_minutes=None, similarity_threshold=None, bands=None, bits=None,
+                 dim=None, seed=None, max_bucket=None, min_users=3):
+        self.window = timedelta(minutes=time_window_minutes or config.SEMANTIC_STREAM_WINDOW_MINUTES)
+        self.threshold = similarity_threshold or config.SEMANTIC_STREAM_THRESHOLD
+        self.bands = bands or config.SEMANTIC_LSH_BANDS
+        self.bits = bits or config.SEMANTIC_LSH_BITS
+        self.max_bucket = max_bucket or config.SEMANTIC_LSH_MAX_BUCKET
+        self.min_users = min_users
+        # Fixed seed: every worker (and restart) hashes the same way
+        rng = np.random.default_rng(config.SEMANTIC_LSH_SEED if seed is None else seed)
+        self.planes = rng.standard_normal((self.bands * self.bits, dim or config.SEMANTIC_LSH_DIM)).astype(np.float32)
+        self.bit_weights = (1 << np.arange(self.bits)).astype(np.int64)
+
+        self.entries = OrderedDict() # entry id -> (timestamp, user_id, tweet_id, text_hash, row), arrival order
+        # Unit vectors and epoch seconds of live entries, by row; rows of evicted entries are reused
+        self.vectors = np.zeros((1024, self.planes.shape[1]), dtype=np.float32)
+        self.seconds = np.zeros(1024, dtype=np.float64)
+        self.free_rows = list(range(1023, -1, -1))
+        self.buckets = {} # (band, code, slot) -> deque of entry ids
+        self.slot_keys = {} # slot -> bucket keys, to drop whole slots at once
+        self.hashes = {} # text_hash -> entry id
+        self.cluster_of = {} # entry id -> emitted cluster dict
+        self.watermark = None
+        self.next_id = 0
+
+    def signatures(self, unit_vectors):
+        """(n, bands) int64 band hashes: sign bits of the projections, packed per band."""
+        bits = (unit_vectors @ self.planes.T) > 0
+        return bits.reshape(len(unit_vectors), self.bands, self.bits).astype(np.int64) @ self.bit_weights
+
+    def slot(self, timestamp):
+        return int(timestamp.timestamp() // self.window.total_seconds())
+
+    def expire(self):
+        cutoff = self.watermark - self.window
+        while self.entries:
+            entry_id, entry = next(iter(self.entries.items()))
+            if entry[0] >= cutoff:
+                break
+            del self.entries[entry_id]
+            if self.hashes.get(entry[3]) == entry_id:
+                del self.hashes[entry[3]]
+            self.cluster_of.pop(entry_id, None)
+            self.free_rows.append(entry[4])
+        oldest_slot = self.slot(self.watermark) - 1
+        for old in [s for s in self.slot_keys if s < oldest_slot]:
+            for key in self.slot_keys.pop(old):
+                self.buckets.pop(key, None)
+
+    def candidates(self, signature, slot):
+        found = set()
+        for band, code in enumerate(signature.tolist()):
+            for s in (slot - 1, slot):
+                found.update(self.buckets.get((band, code, s), ()))
+        return sorted(eid for eid in found if eid in self.entries)
+
+    def add(self, item, unit_vector, signature):
+        """Feeds one persisted tweet. Returns a SEMANTIC_SIMILARITY cluster dict when it completes one, else None."""
+        timestamp, user_id, text_hash = _as_utc(item.get('timestamp_absolute')), item.get('handle'), item.get('text_hash')
+        if timestamp is None or not user_id or (text_hash and text_hash in self.hashes):
+            return None
+        if self.watermark is None or timestamp > self.watermark:
+            self.watermark = timestamp
+        if timestamp < self.watermark - self.window:
+            return None # arrived too late to be part of a live burst
+
+        # Exact cosine only on the LSH candidates within the window
+        slot = self.slot(timestamp)
+        ids = self.candidates(signature, slot)
+        matches, scores = [], np.empty(0)
+        if ids:
+            rows = np.fromiter((self.entries[eid][4] for eid in ids), dtype=np.int64, count=len(ids))
+            scores = self.vectors[rows] @ unit_vector
+            keep = (scores > self.threshold) & (np.abs(self.seconds[rows] - timestamp.timestamp()) <= self.window.total_seconds())
+            matches, scores = [eid for eid, k in zip(ids, keep) if k], scores[keep]
+
+        # Index the tweet
+        if not self.free_rows:
+            grown = len(self.seconds)
+            self.vectors = np.concatenate((self.vectors, np.zeros_like(self.vectors)))
+            self.seconds = np.concatenate((self.seconds, np.zeros_like(self.seconds)))
+            self.free_rows = list(range(2 * grown - 1, grown - 1, -1))
+        row = self.free_rows.pop()
+        self.vectors[row] = unit_vector
+        self.seconds[row] = timestamp.timestamp()
+        entry_id = self.next_id
+        self.next_id += 1
+        self.entries[entry_id] = (timestamp, user_id, item.get('tweet_id'), text_hash, row)
+        if text_hash:
+            self.hashes[text_hash] = entry_id
+        for band, code in enumerate(signature.tolist()):
+            key = (band, code, slot)
+            if key not in self.buckets:
+                self.buckets[key] = deque(maxlen=self.max_bucket)
+                self.slot_keys.setdefault(slot, set()).add(key)
+            self.buckets[key].append(entry_id)
+
+        cluster = None
+        joined = next((self.cluster_of[eid] for eid in matches if eid in self.cluster_of), None)
+        if joined is not None:
+            # Part of a burst already reported (the batch pass merges the full membership)
+            self.cluster_of[entry_id] = joined
+        elif matches:
+            members = [entry_id] + matches
+            users = {self.entries[eid][1] for eid in members}
+            if len(users) >= self.min_users:
+                times = [self.entries[eid][0] for eid in members]
+                cluster = {
+                    'type': 'SEMANTIC_SIMILARITY',
+                    'users': sorted(users),
+                    'tweet_ids': [self.entries[eid][2] for eid in members],
+                    'avg_similarity': float(np.mean(scores)),
+                    'time_span_seconds': (max(times) - min(times)).total_seconds(),
+                    'first_seen': min(times),
+                    'last_seen': max(times),
+                    'sample_text': item.get('text_clean')
+                }
+                for eid in members:
+                    self.cluster_of[eid] = cluster
+        self.expire()
+        return cluster
+
+    def add_batch(self, items, embeddings):
+        """Feeds persisted tweets (worker dicts) with their embeddings; returns the clusters they complete."""
+        if not len(items):
+            return []
+        unit = normalize_rows(embeddings)
+        signatures = self.signatures(unit)
+        clusters = []
+        timed = [(_as_utc(item.get('timestamp_absolute')), k) for k, item in enumerate(items)]
+        for _, i in sorted(t for t in timed if t[0] is not None):
+            cluster = self.add(items[i], unit[i], signatures[i])
+            if cluster:
+                clusters.append(cluster)
+        return clusters
+
+class SynchronyDetector:
+    """
+    Accounts that repeatedly post within seconds of each other, whatever the
+    text. Posts are binned per user into bucket_seconds buckets (a sparse
+    users x buckets matrix); one sparse product counts, for every pair, the
+    buckets in which both posted (same or adjacent bucket). No per-pair loop,
+    so 100k users per window stay cheap.
+
+    Buckets with more than max_bucket_users active users (a viral moment
+    everyone reacts to) carry no synchrony signal and are ignored; they would
+    otherwise add max_bucket_users^2 pairs each.
+    """
+    def __init__(self, bucket_seconds=None, min_co_posts=None, max_bucket_users=None):
+        self.bucket_seconds = bucket_seconds or config.SYNC_BUCKET_SECONDS
+        self.min_co_posts = min_co_posts or config.SYNC_MIN_CO_POSTS
+        self.max_bucket_users = max_bucket_users or config.SYNC_MAX_BUCKET_USERS
+
+    def find_pairs(self, user_ids, timestamps):
+        """
+        user_ids, timestamps (epoch seconds): one entry per post.
+        Returns (users_a, users_b, co_posts, weights) arrays, users_a < users_b.
+        co_posts counts post pairs in the same or adjacent bucket;
+        weight = co_posts / active buckets of the less active user, capped at 1.
+        """
+        empty = (np.empty(0, dtype=object), np.empty(0, dtype=object), np.empty(0, dtype=np.int64), np.empty(0))
+        if len(user_ids) < 2:
+            return empty
+        users, user_idx = np.unique(np.asarray(user_ids, dtype=str), return_inverse=True)
+        buckets = np.floor(np.asarray(timestamps, dtype=np.float64) / self.bucket_seconds).astype(np.int64)
+        bucket_values, bucket_idx = np.unique(buckets, return_inverse=True)
+
+        # users x buckets, 1 where the user posted
+        posted = csr_matrix((np.ones(len(user_idx)), (user_idx, bucket_idx)), shape=(len(users), len(bucket_values)))
+        posted.data[:] = 1
+        crowded = np.asarray(posted.sum(axis=0)).ravel() > self.max_bucket_users
+        active = np.asarray(posted.sum(axis=1)).ravel()
+        # Users active in fewer buckets than min_co_posts cannot reach it
+        keep_users = (active >= self.min_co_posts).astype(np.float64)
+        posted = diags(keep_users) @ posted @ diags((~crowded).astype(np.float64))
+        posted.eliminate_zeros()
+        posted = posted.tocsr()
+
+        # near = posted @ A, A the (symmetric) same-or-adjacent bucket matrix, so
+        # posted @ near.T counts co-posts within one bucket and is symmetric
+        rows, cols = posted.nonzero()
+        near_rows, near_cols = [rows], [cols]
+        for shift in (-1, 1):
+            target = np.searchsorted(bucket_values, bucket_values[cols] + shift)
+            exists = target < len(bucket_values)
+            exists[exists] = bucket_values[target[exists]] == bucket_values[cols[exists]] + shift
+            near_rows.append(rows[exists])
+            near_cols.append(target[exists])
+        near_rows, near_cols = np.concatenate(near_rows), np.concatenate(near_cols)
+        near = csr_matrix((np.ones(len(near_rows)), (near_rows, near_cols)), shape=posted.shape)
+        near_t = near.T.tocsr()
+
+        # Rows in blocks sized by their expected output, so peak memory stays bounded
+        expected = posted @ np.asarray(near.sum(axis=0)).ravel()
+        bounds = np.searchsorted(np.cumsum(expected), np.arange(1, int(expected.sum() // config.SYNC_BLOCK_PAIRS) + 2) * config.SYNC_BLOCK_PAIRS)
+        bounds = np.unique(np.concatenate(([0], np.minimum(bounds + 1, len(users)), [len(users)])))
+
+        pair_a, pair_b, counts = [], [], []
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            co = (posted[start:stop] @ near_t).tocoo()
+            a = co.row + start
+            keep = (co.col > a) & (co.data >= self.min_co_posts)
+            pair_a.append(a[keep])
+            pair_b.append(co.col[keep])
+            counts.append(co.data[keep].astype(np.int64))
+        a, b, counts = np.concatenate(pair_a), np.concatenate(pair_b), np.concatenate(counts)
+
+        weights = np.minimum(counts / np.maximum(np.minimum(active[a], active[b]), 1), 1.0)
+        return users[a], users[b], counts, weights
+
+    def detect(self, tweets):
+        """Pairs as (user_a, user_b, weight) edges, from Tweet objects."""
+        posts = [(t.user_id, t.timestamp_absolute.timestamp()) for t in tweets if t.user_id and t.timestamp_absolute]
+        if not posts:
+            return []
+        users_a, users_b, _, weights = self.find_pairs([p[0] for p in posts], [p[1] for p in posts])
+        return list(zip(users_a.tolist(), users_b.tolist(), weights.tolist()))
+
+# Broader types absorb narrower ones when clusters merge
+CLUSTER_TYPE_ORDER = ['EXACT_MATCH', 'NEAR_DUPLICATE', 'SEMANTIC_SIMILARITY']
+
+def _hashes(detected):
+    return detected.get('text_hashes') or ([detected['text_hash']] if detected.get('text_hash') else [])
+
+def _user_overlap(a, b):
+    a, b = set(a), set(b)
+    return len(a & b) / max(min(len(a), len(b)), 1)
+
+def merge_cluster(existing, detected):
+    """Folds a detection dict into a CoordinationCluster row (in place)."""
+    hashes = set(_hashes(detected))
+    before = existing.tweet_count or 0
+    existing.text_hashes = sorted(set(existing.text_hashes or []) | hashes)
+    existing.users = sorted(set(existing.users or []) | {u for u in detected['users'] if u})
+    existing.narrative_ids = sorted(set(existing.narrative_ids or []) | set(detected.get('narrative_ids') or []))
+    existing.user_count = len(existing.users)
+
+    # tweet_ids keeps the latest COORDINATION_MAX_TWEET_IDS; tweet_count is the total
+    # (a detection's tweet_count beyond its listed ids is a folded cluster's capped tail)
+    detected_ids = set(detected['tweet_ids'])
+    added_ids = sorted(detected_ids - set(existing.tweet_ids or []))
+    unlisted = max((detected.get('tweet_count') or len(detected_ids)) - len(detected_ids), 0)
+    existing.tweet_ids = ((existing.tweet_ids or []) + added_ids)[-config.COORDINATION_MAX_TWEET_IDS:]
+    existing.tweet_count = before + len(added_ids) + unlisted
+
+    if existing.cluster_type in CLUSTER_TYPE_ORDER and detected['type'] in CLUSTER_TYPE_ORDER:
+        existing.cluster_type = max(existing.cluster_type, detected['type'], key=CLUSTER_TYPE_ORDER.index)
+    else:
+        existing.cluster_type = existing.cluster_type or detected['type']
+    if detected.get('avg_similarity') is not None:
+        # Weighted by the tweets each side contributed
+        added = existing.tweet_count - before
+        old = existing.avg_similarity if existing.avg_similarity is not None else detected['avg_similarity']
+        existing.avg_similarity = (old * before + detected['avg_similarity'] * added) / max(before + added, 1)
+    existing.sample_text = existing.sample_text or detected.get('sample_text')
+
+    first, last = detected.get('first_seen'), detected.get('last_seen')
+    if first is not None:
+        existing.first_seen = first if existing.first_seen is None else min(existing.first_seen, first)
+    if last is not None:
+        existing.last_seen = last if existing.last_seen is None else max(existing.last_seen, last)
+    if existing.first_seen and existing.last_seen:
+        existing.time_span_seconds = (existing.last_seen - existing.first_seen).total_seconds()
+    return existing
+
+def store_clusters(session, clusters, now=None):
+    """
+    Persists detections into coordination_clusters. A detection sharing a text
+    hash with a recent cluster (last seen within COORDINATION_MERGE_HOURS), or
+    at least COORDINATION_MERGE_USER_OVERLAP of its users, is merged into it
+    (clusters it bridges are merged together) instead of stored twice.
+    Refreshes the coordination_score of every narrative touched.
+    Returns (new, merged) counts. Does not commit.
+
+    Workers and the analyzer store concurrently: a transaction-level advisory
+    lock serializes callers until they commit (so no two insert the same
+    cluster), and candidate rows are locked FOR UPDATE before their arrays
+    are rewritten.
+    """
+    if not clusters:
+        return 0, 0
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(hours=config.COORDINATION_MERGE_HOURS)
+    new, merged = 0, 0
+    pending = {} # cluster row -> tweet ids this call added (their narratives are looked up below)
+    session.execute(text("SELECT pg_advisory_xact_lock(hashtext('coordination_clusters'))"))
+
+    for detected in clusters:
+        hashes = _hashes(detected)
+        users = [u for u in detected['users'] if u]
+        overlap = CoordinationCluster.users.overlap(users)
+        if hashes:
+            overlap = or_(CoordinationCluster.text_hashes.overlap(hashes), overlap)
+        candidates = session.query(CoordinationCluster).filter(
+            CoordinationCluster.last_seen >= cutoff, overlap
+        ).order_by(CoordinationCluster.cluster_id).with_for_update().all()
+        matches = [c for c in candidates if set(c.text_hashes or []) & set(hashes) or
+                   _user_overlap(c.users or [], users) >= config.COORDINATION_MERGE_USER_OVERLAP]
+
+        if matches:
+            target = matches[0]
+            for other in matches[1:]:
+                # This detection bridges older clusters: fold them into the oldest one
+                merge_cluster(target, {
+                    'type': other.cluster_type, 'text_hashes': other.text_hashes, 'users': other.users,
+                    'tweet_ids': other.tweet_ids, 'tweet_count': other.tweet_count, 'narrative_ids': other.narrative_ids,
+                    'avg_similarity': other.avg_similarity, 'sample_text': other.sample_text,
+                    'first_seen': other.first_seen, 'last_seen': other.last_seen
+                })
+                pending.setdefault(target, set()).update(pending.pop(other, ()))
+                session.delete(other)
+            merged += 1
+        else:
+            target = CoordinationCluster(cluster_type=detected['type'], tweet_count=0)
+            session.add(target)
+            new += 1
+        merge_cluster(target, detected)
+        session.flush()
+        pending.setdefault(target, set()).update(detected['tweet_ids'])
+
+    # Narratives of the newly added tweets only; earlier ones are already on the rows
+    tweet_ids = sorted({tid for ids in pending.values() for tid in ids})
+    narrative_of = dict(session.query(Tweet.tweet_id, Tweet.narrative_id).filter(
+        Tweet.tweet_id.in_(tweet_ids), Tweet.narrative_id > 0
+    ).all())
+    for c, ids in pending.items():
+        c.narrative_ids = sorted(set(c.narrative_ids or []) | {narrative_of[t] for t in ids if t in narrative_of})
+    refresh_coordination_scores(session, sorted(set(narrative_of.values())))
+    return new, merged
+
+def refresh_coordination_scores(session, narrative_ids):
+    """coordination_score = distinct tweets in coordination clusters / narrative tweet_count."""
+    if not narrative_ids:
+        return
+    session.flush()
+    session.execute(text("""
+        UPDATE narratives n
+        SET coordination_score = LEAST(1.0, sub.coordinated::float / GREATEST(n.tweet_count, 1))
+        FROM (
+            SELECT t.narrative_id, count(DISTINCT t.tweet_id) AS coordinated
+            FROM coordination_clusters c
+            CROSS JOIN LATERAL unnest(c.tweet_ids) AS u(tweet_id)
+            JOIN tweets t ON t.tweet_id = u.tweet_id
+            WHERE c.narrative_ids && CAST(:ids AS INTEGER[]) AND t.narrative_id = ANY(CAST(:ids AS INTEGER[]))
+            GROUP BY t.narrative_id
+        ) sub
+        WHERE n.narrative_id = sub.narrative_id
+    """), {'ids': list(narrative_ids)})
 
 class CoordinationDetector:
-    def __init__(self, time_window_minutes=10, similarity_threshold=0.85):
+    def __init__(self, time_window_minutes=10, similarity_threshold=0.85, simhash_max_distance=None):
         self.time_window = timedelta(minutes=time_window_minutes)
         self.similarity_threshold = similarity_threshold
+        self.simhash_max_distance = simhash_max_distance
 
-    def detect_coordination(self, tweets):
+    def group_near_duplicates(self, tweets):
         """
-        Detects groups of accounts posting similar content in tight time windows.
-        tweets: List of Tweet objects (SQLAlchemy)
+        Groups tweets by text_hash, then merges groups whose SimHash fingerprints
+        are within a few bits (copypasta with an edited word or an appended
+        tracking number). Integer lookups in a banded index, no embeddings.
+        Returns a list of {text_hash: [tweets]} dicts, one per merged group.
         """
-        clusters = []
-        
-        # 1. Exact Duplicates (Hash Groups)
         hash_groups = {}
         for t in tweets:
             if not t.text_hash: continue
             if t.text_hash not in hash_groups:
                 hash_groups[t.text_hash] = []
             hash_groups[t.text_hash].append(t)
-            
-        for h, group in hash_groups.items():
+
+        keys = list(hash_groups)
+        parent = list(range(len(keys)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        index = SimHashIndex(max_distance=self.simhash_max_distance)
+        for i, h in enumerate(keys):
+            fp = next((t.simhash for t in hash_groups[h] if getattr(t, 'simhash', None) is not None), None)
+            if fp is None: continue
+            for j in index.query(fp):
+                parent[find(j)] = find(i)
+            index.add(i, fp)
+
+        merged = {}
+        for i, h in enumerate(keys):
+            merged.setdefault(find(i), {})[h] = hash_groups[h]
+        return list(merged.values())
+
+    def detect_coordination(self, tweets):
+        """
+        Detects groups of accounts posting similar content in tight time windows.
+        tweets: List of Tweet objects (SQLAlchemy)
+        """
+        clusters = []
+        
+        # 1. Exact and near duplicates (text_hash + SimHash groups)
+        for group_hashes in self.group_near_duplicates(tweets):
+            group = [t for g in group_hashes.values() for t in g]
             if len(group) < 3: continue # Need at least 3 accounts
             
             # Sort by time
@@ -36,61 +551,87 @@ class CoordinationDetector:
                 # Check unique users
                 users = set(t.user_id for t in sorted_group)
                 if len(users) >= 3:
-                    clusters.append({
-                        'type': 'EXACT_MATCH',
+                    # The most reposted variant represents the group
+                    h = max(group_hashes, key=lambda k: len(group_hashes[k]))
+                    cluster = {
+                        'type': 'EXACT_MATCH' if len(group_hashes) == 1 else 'NEAR_DUPLICATE',
                         'text_hash': h,
                         'users': list(users),
                         'tweet_ids': [t.tweet_id for t in sorted_group],
                         'tweet_count': len(sorted_group),
                         'time_span_seconds': (end_time - start_time).total_seconds(),
-                        'sample_text': sorted_group[0].text_clean
-                    })
+                        'first_seen': start_time,
+                        'last_seen': end_time,
+                        'sample_text': group_hashes[h][0].text_clean
+                    }
+                    if len(group_hashes) > 1:
+                        cluster['text_hashes'] = list(group_hashes)
+                    clusters.append(cluster)
 
         # 2. Semantic Similarity (Paraphrased)
-        # Only check tweets that weren't already clustered? Or check all?
-        # For performance, maybe subset.
-        
-        semantic_clusters = self.find_semantic_similarity(tweets)
+        # Tweets already caught by their fingerprint are left out of the
+        # O(n^2) embedding comparison.
+        flagged = set(tid for c in clusters for tid in c['tweet_ids'])
+        semantic_clusters = self.find_semantic_similarity([t for t in tweets if t.tweet_id not in flagged])
         clusters.extend(semantic_clusters)
         
         return clusters
 
     def find_semantic_similarity(self, tweets):
-        # Filter tweets with embeddings
-        valid_tweets = [t for t in tweets if t.embedding is not None]
-        if len(valid_tweets) < 3: return []
+        """
+        Paraphrased coordination: tweets linked by cosine similarity above the
+        threshold form connected components (sparse edges from the blocked
+        kernel, so O(edges) after the kernel). Each component is split into
+        bursts wherever consecutive tweets are more than time_window apart; a
+        burst of 3+ users within time_window is a cluster. The result does not
+        depend on the order of the input.
+        """
+        valid_tweets = sorted(
+            (t for t in tweets if t.embedding is not None and t.timestamp_absolute),
+            key=lambda t: (t.timestamp_absolute, t.tweet_id)
+        )
+        n = len(valid_tweets)
+        if n < 3: return []
         
-        embeddings = np.array([t.embedding for t in valid_tweets])
-        sim_matrix = cosine_similarity(embeddings)
+        # Sparse edges; each tweet keeps at most SIMILARITY_MAX_NEIGHBOURS
+        rows, cols, scores = similarity_pairs(
+            np.array([t.embedding for t in valid_tweets]), self.similarity_threshold,
+            top_k=config.SIMILARITY_MAX_NEIGHBOURS, upper=False
+        )
+        if not len(rows): return []
+        graph = coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(n, n))
+        _, labels = connected_components(graph, directed=False)
         
-        clusters = []
-        processed = set()
+        # Sort by (component, time) and cut wherever the component changes or the gap exceeds the window
+        times = np.array([t.timestamp_absolute.timestamp() for t in valid_tweets])
+        order = np.lexsort((times, labels))
+        sorted_labels, sorted_times = labels[order], times[order]
+        cuts = np.ones(n, dtype=bool)
+        cuts[1:] = (sorted_labels[1:] != sorted_labels[:-1]) | (np.diff(sorted_times) > self.time_window.total_seconds())
+        starts = np.flatnonzero(cuts)
+        burst = np.empty(n, dtype=np.int64)
+        burst[order] = np.cumsum(cuts) - 1
         
-        for i in range(len(valid_tweets)):
-            if i in processed: continue
-            
-            # Find similar
-            similar_indices = np.where(sim_matrix[i] > self.similarity_threshold)[0]
-            
-            if len(similar_indices) >= 3:
-                # Check time window
-                group = [valid_tweets[j] for j in similar_indices]
-                times = [t.timestamp_absolute for t in group if t.timestamp_absolute]
-                
-                if not times: continue
-                
-                time_span = max(times) - min(times)
-                
-                if time_span <= self.time_window:
-                    users = set(t.user_id for t in group)
-                    if len(users) >= 3:
-                        clusters.append({
-                            'type': 'SEMANTIC_SIMILARITY',
-                            'users': list(users),
-                            'tweet_ids': [t.tweet_id for t in group],
-                            'avg_similarity': float(np.mean(sim_matrix[i][similar_indices])),
-                            'time_span_seconds': time_span.total_seconds()
-                        })
-                        processed.update(similar_indices)
-                        
-        return clusters
+        # Per burst: size, time span, distinct users and mean edge score
+        sizes = np.diff(np.append(starts, n))
+        spans = np.maximum.reduceat(sorted_times, starts) - np.minimum.reduceat(sorted_times, starts)
+        user_codes = np.unique([t.user_id or '' for t in valid_tweets], return_inverse=True)[1]
+        burst_users = np.unique(np.stack([burst, user_codes], axis=1), axis=0)[:, 0]
+        distinct_users = np.bincount(burst_users, minlength=len(starts))
+        inside = burst[rows] == burst[cols]
+        edge_sums = np.bincount(burst[rows][inside], weights=scores[inside], minlength=len(starts))
+        edge_counts = np.bincount(burst[rows][inside], minlength=len(starts))
+        
+        clusters = []
+        for b in np.flatnonzero((sizes >= 3) & (distinct_users >= 3) & (spans <= self.time_window.total_seconds())):
+            group = [valid_tweets[i] for i in order[starts[b]:starts[b] + sizes[b]]]
+            clusters.append({
+                'type': 'SEMANTIC_SIMILARITY',
+                'users': sorted(set(t.user_id for t in group)),
+                'tweet_ids': [t.tweet_id for t in group],
+                'avg_similarity': float(edge_sums[b] / max(edge_counts[b], 1)),
+                'time_span_seconds': float(spans[b]),
+                'first_seen': group[0].timestamp_absolute,
+                'last_seen': group[-1].timestamp_absolute
+            })
+        return sorted(clusters, key=lambda c: c['tweet_ids'][0])
@@ -1,27 +1,31 @@
 from datetime import timedelta
 import pandas as pd
+from sqlalchemy import func, text
 from sqlalchemy.orm import Session
-from app.models import Tweet
+from app.models import Tweet, Narrative
 
 class NarrativeAnalyzer:
     def __init__(self, session: Session):
         self.session = session
 
     def find_narrative_origin(self, narrative_id):
-        # 1. Get Tweets
-        tweets = self.session.query(Tweet).filter(Tweet.narrative_id == narrative_id).order_by(Tweet.timestamp_absolute.asc()).all()
+        # 1. First sighting: maintained on the narratives row, tweets only for legacy ids
+        narrative = self.session.get(Narrative, narrative_id)
+        first_tweet_time = narrative.first_seen if narrative else None
+        if first_tweet_time is None:
+            first_tweet_time = self.session.query(func.min(Tweet.timestamp_absolute)).filter(Tweet.narrative_id == narrative_id).scalar()
         
-        if not tweets:
+        if first_tweet_time is None:
             return None
             
-        # 2. Origin Seeds (First 30 mins or First 10 tweets)
-        first_tweet_time = tweets[0].timestamp_absolute
+        # 2. Origin Seeds (First 30 mins)
         cutoff_time = first_tweet_time + timedelta(minutes=30)
+        origin_seeds = self.session.query(Tweet.tweet_id, Tweet.handle).filter(
+            Tweet.narrative_id == narrative_id, Tweet.timestamp_absolute <= cutoff_time
+        ).order_by(Tweet.timestamp_absolute.asc()).all()
         
-        origin_seeds = [t for t in tweets if t.timestamp_absolute <= cutoff_time]
-        
-        # 3. Spread Timeline
-        timeline = self.build_spread_timeline(tweets)
+        # 3. Spread Timeline (aggregated in Postgres)
+        timeline = self.load_spread_timeline(narrative_id)
         
         # 4. Velocity
         velocity_metrics = self.calculate_spread_metrics(timeline)
@@ -44,22 +48,23 @@ class NarrativeAnalyzer:
             'first_seen': first_tweet_time,
             'origin_seed_count': len(origin_seeds),
             'origin_seeds': [t.tweet_id for t in origin_seeds],
-            'total_volume': len(tweets),
+            'total_volume': sum(b['count'] for b in timeline),
             'timeline': timeline,
             'velocity': velocity_metrics
         }
 
-    def build_spread_timeline(self, tweets):
-        data = [{'timestamp': t.timestamp_absolute} for t in tweets if t.timestamp_absolute]
-        if not data: return []
-        
-        df = pd.DataFrame(data)
+    def load_spread_timeline(self, narrative_id):
         # Group by 5 min buckets
-        df['time_bucket'] = df['timestamp'].dt.floor('5min')
-        counts = df.groupby('time_bucket').size().to_dict()
+        rows = self.session.execute(text("""
+            SELECT to_timestamp(floor(extract(epoch FROM timestamp_absolute) / 300) * 300) AS time_bucket, count(*)
+            FROM tweets
+            WHERE narrative_id = :nid AND timestamp_absolute IS NOT NULL
+            GROUP BY time_bucket
+            ORDER BY time_bucket
+        """), {'nid': narrative_id}).fetchall()
         
         # Convert to list for JSON serialization
-        timeline = [{'time': k.isoformat(), 'count': v} for k, v in sorted(counts.items())]
+        timeline = [{'time': row[0].isoformat(), 'count': row[1]} for row in rows]
         return timeline
 
     def calculate_spread_metrics(self, timeline):
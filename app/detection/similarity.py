@@ -0,0 +1,62 @@
+import numpy as np
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import config
+
+def normalize_rows(vectors):
+    """float32 copy of vectors with unit-length rows (zero rows stay zero)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def block_rows(n, block_elements=None):
+    """Rows per block so one block of scores holds at most block_elements floats."""
+    return max(1, (block_elements or config.SIMILARITY_BLOCK_ELEMENTS) // max(n, 1))
+
+def similarity_pairs(vectors, threshold, top_k=None, upper=True, block_elements=None):
+    """
+    Cosine-similar pairs without the n x n matrix: rows are scored in blocks
+    (block x n at a time, see SIMILARITY_BLOCK_ELEMENTS), so peak memory is
+    bounded by the block, not by n^2.
+
+    Returns sparse (i, j, score) arrays of the pairs scoring above threshold.
+    upper=True: each pair once (i < j). upper=False: both directions, and
+    top_k (if given) keeps only each row's k best neighbours.
+    A vector is never paired with itself.
+    """
+    unit = normalize_rows(vectors)
+    n = len(unit)
+    empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+    if n < 2:
+        return empty
+
+    step = block_rows(n, block_elements)
+    rows, cols, scores = [], [], []
+    for start in range(0, n, step):
+        stop = min(start + step, n)
+        # upper: only columns from start on are needed (j > i)
+        offset = start if upper else 0
+        block = unit[start:stop] @ unit[offset:].T
+        local = np.arange(stop - start)
+        block[local, local + start - offset] = -np.inf # self
+        if upper:
+            block[np.tril_indices(stop - start, k=-1)] = -np.inf # j < i inside the diagonal square
+
+        i, j = np.nonzero(block > threshold)
+        if top_k is not None and not upper:
+            # Only rows with more than top_k matches need a partial sort
+            crowded = np.where(np.bincount(i, minlength=len(local)) > top_k)[0]
+            if len(crowded):
+                keep = ~np.isin(i, crowded)
+                best = np.argpartition(block[crowded], -top_k, axis=1)[:, -top_k:]
+                i = np.concatenate((i[keep], np.repeat(crowded, top_k)))
+                j = np.concatenate((j[keep], best.ravel()))
+        s = block[i, j]
+        rows.append(i + start)
+        cols.append(j + offset)
+        scores.append(s.astype(np.float32))
+
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(scores)
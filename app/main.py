@@ -3,15 +3,16 @@ from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.orm import Session, sessionmaker
-from sqlalchemy import func, text
+from sqlalchemy import func, text, distinct
 import os
 import sys
 
 # Add project root
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
 
-from app.models import engine, Tweet, User
-from datetime import timedelta
+from app.models import engine, Tweet, User, Narrative
+from datetime import datetime, timedelta, timezone
 
 app = FastAPI(title="SentinelGraph API", version="1.0")
 
@@ -66,16 +67,8 @@ def get_stats(db: Session = Depends(get_db)):
     volume_labels = [row[0].strftime("%H:%M") if row[0] else "--:--" for row in result]
     volume_data = [row[1] for row in result]
     
-    # 3. Narratives (Top 5)
-    sql_narr = text("""
-        SELECT narrative_id, count(*) as c 
-        FROM tweets 
-        WHERE narrative_id IS NOT NULL AND narrative_id != -1 
-        GROUP BY narrative_id 
-        ORDER BY c DESC 
-        LIMIT 5
-    """)
-    res_narr = db.execute(sql_narr).fetchall()
+    # 3. Narratives (Top 5), counts maintained by the clustering job
+    res_narr = db.query(Narrative.narrative_id, Narrative.tweet_count).order_by(Narrative.tweet_count.desc()).limit(5).all()
     narrative_labels = [f"Cluster {row[0]}" for row in res_narr]
     narrative_data = [row[1] for row in res_narr]
     
@@ -116,59 +109,26 @@ def get_narratives(db: Session = Depends(get_db)):
     """
     Step 4 Deliverable: API endpoint returns list of narratives with spike flags.
     """
-    from datetime import datetime
-    import pandas as pd
-    
-    # 1. Fetch all categorized tweets (limit to recent 24h for relevance)
-    # Optimization: In prod, fetch only aggregate stats from a 'narratives' table.
-    # For MVP: Aggreagte on the fly.
-    cutoff = datetime.now() - timedelta(hours=24)
-    tweets = db.query(Tweet).filter(Tweet.narrative_id != None, Tweet.narrative_id != -1, Tweet.timestamp_absolute > cutoff).all()
-    
-    if not tweets:
-        return []
-        
-    data = [{
-        'tweet_id': t.tweet_id, 
-        'narrative_id': t.narrative_id, 
-        'timestamp': t.timestamp_absolute,
-        'text': t.text_clean
-    } for t in tweets]
-    
-    df = pd.DataFrame(data)
-    if df.empty: return []
-    
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    from datetime import datetime, timezone
-    current_time = datetime.now(timezone.utc)
+    # Stats are maintained by the clustering job: one row per narrative, no tweet scan
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=config.NARRATIVE_API_HOURS)
+    narratives = db.query(Narrative).filter(Narrative.last_seen > cutoff).all()
     
     results = []
     
-    # Group by narrative
-    for nid, group in df.groupby('narrative_id'):
-        count = len(group)
-        start_time = group['timestamp'].min()
-        end_time = group['timestamp'].max()
-        duration_hours = (end_time - start_time).total_seconds() / 3600
+    for n in narratives:
+        nid = n.narrative_id
+        count = n.tweet_count or 0
+        start_time = n.first_seen
+        end_time = n.last_seen
+        duration_hours = (end_time - start_time).total_seconds() / 3600 if start_time and end_time else 0.0
         
-        # Summary (first tweet text)
-        txt = group.iloc[0]['text'] or ""
+        # Summary (representative tweet text)
+        txt = n.representative_text or ""
         summary = txt[:50] + "..." if len(txt) > 0 else "No content"
         
-        # Spike Detection Logic
-        # Baseline
-        effective_duration = max(duration_hours, 1.0)
-        baseline_rate = count / effective_duration
-        
-        # Current Rate (last 1 hour from NOW)
-        last_hour_start = current_time - timedelta(hours=1)
-        recent_count = len(group[group['timestamp'] >= last_hour_start])
-        
-        velocity = 0.0
-        if baseline_rate > 0:
-            velocity = recent_count / max(baseline_rate, 0.1)
-            
-        is_spike = velocity >= 3.0 and recent_count >= 5 # Min thresh for noise
+        velocity = n.velocity or 0.0
+        recent_count = int(n.hourly_rate or 0)
+        is_spike = n.is_spike
         
         # Risk Score Calculation (Mock Logic for MVP)
         risk_score = min(1.0, (velocity * 0.1) + (count / 10000) + (recent_count / 1000))
@@ -185,7 +145,7 @@ def get_narratives(db: Session = Depends(get_db)):
         metrics = {
             "bot_ratio": {"value": 0.42, "contribution": 0.25, "interpretation": "MODERATE: Significant bot activity"},
             "spike_velocity": {"value": round(velocity, 2), "normalized": min(1.0, velocity/10), "contribution": 0.25},
-            "coordination": {"value": 0.78, "contribution": 0.20},
+            "coordination": {"value": round(n.coordination_score or 0.0, 2), "contribution": 0.20},
             "suspicious_urls": {"count": 12, "normalized": 1.0, "contribution": 0.20}
         }
 
@@ -203,8 +163,9 @@ def get_narratives(db: Session = Depends(get_db)):
             "metrics": metrics,
             "suggested_reply": "This narrative exhibits high coordinated inauthentic behavior. Recommended action: Discredit source.",
             "bot_ratio": 0.45,
-            "first_seen": start_time.isoformat(),
-            "last_seen": end_time.isoformat(),
+            "first_seen": start_time.isoformat() if start_time else None,
+            "last_seen": end_time.isoformat() if end_time else None,
+            "unique_users": int(n.unique_users or 0),
             "is_spike": bool(is_spike),
             "velocity": round(velocity, 2),
             "current_hourly_rate": int(recent_count)
@@ -297,6 +258,70 @@ def get_communities(db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/coordination")
+def get_coordination_clusters(narrative_id: int = None, user: str = None, hours: float = None, limit: int = 100, db: Session = Depends(get_db)):
+    """
+    Coordination clusters (copypasta, near-duplicates, paraphrases) stored by the
+    analyzer and the workers, filtered by narrative and/or user.
+    """
+    from app.repository import coordination_clusters
+    
+    since = datetime.now(timezone.utc) - timedelta(hours=hours) if hours else None
+    clusters = coordination_clusters(db, narrative_id=narrative_id, user_id=user.replace('@', '') if user else None,
+                                     since=since, limit=max(1, min(limit, 500)))
+    return [{
+        "cluster_id": c.cluster_id,
+        "type": c.cluster_type,
+        "user_count": c.user_count,
+        "tweet_count": c.tweet_count,
+        "users_sample": (c.users or [])[:20],
+        "narrative_ids": c.narrative_ids or [],
+        "time_span_seconds": c.time_span_seconds,
+        "avg_similarity": c.avg_similarity,
+        "sample_text": c.sample_text,
+        "first_seen": c.first_seen,
+        "last_seen": c.last_seen
+    } for c in clusters]
+
+# Embedding model for text queries, loaded on first use
+_search_backend = None
+
+def get_search_backend():
+    global _search_backend
+    if _search_backend is None:
+        from app.services.embeddings import get_backend
+        _search_backend = get_backend()
+    return _search_backend
+
+@app.get("/api/search/semantic")
+def search_semantic(q: str = None, tweet_id: str = None, k: int = 20, hours: float = None, db: Session = Depends(get_db)):
+    """
+    Nearest-neighbour search over tweet embeddings (pgvector HNSW index).
+    Query by free text (q) or by an existing tweet (tweet_id); hours limits results to recent tweets.
+    """
+    import time
+    from app.repository import nearest_tweets
+    
+    if not q and not tweet_id:
+        raise HTTPException(status_code=400, detail="Provide q (text) or tweet_id.")
+    k = max(1, min(k, 200))
+    
+    start = time.perf_counter()
+    if tweet_id:
+        vector = db.query(Tweet.embedding).filter(Tweet.tweet_id == tweet_id).scalar()
+        if vector is None:
+            raise HTTPException(status_code=404, detail="Tweet not found or not embedded yet.")
+    else:
+        vector = get_search_backend().encode([q])[0]
+    
+    results = nearest_tweets(db, vector, k=k, time_window=timedelta(hours=hours) if hours else None)
+    return {
+        "query": q or tweet_id,
+        "k": k,
+        "took_ms": round((time.perf_counter() - start) * 1000, 1),
+        "results": results
+    }
+
 @app.get("/api/narratives/{narrative_id}/origin")
 def get_narrative_origin(narrative_id: int, db: Session = Depends(get_db)):
     """
@@ -318,38 +343,34 @@ def get_narrative_advice(narrative_id: int, db: Session = Depends(get_db)):
     Step 10 Deliverable: API endpoint generates risk score and advice.
     """
     from app.services.advisor import Advisor
-    from app.detection.origin import NarrativeAnalyzer
     
-    # Need to aggregate data first
-    # 1. Narrrative Origin Stats
-    analyzer = NarrativeAnalyzer(session=db)
-    origin_data = analyzer.find_narrative_origin(narrative_id)
-    if not origin_data:
-        raise HTTPException(status_code=404, detail="Narrative not found") # Should catch empty
+    # 1. Narrative stats (maintained by the clustering job); tweets only for legacy ids without a row
+    narrative = db.get(Narrative, narrative_id)
+    first_seen = narrative.first_seen if narrative else None
+    if first_seen is None:
+        first_seen = db.query(func.min(Tweet.timestamp_absolute)).filter(Tweet.narrative_id == narrative_id).scalar()
+    if first_seen is None:
+        raise HTTPException(status_code=404, detail="Narrative not found")
         
-    # 2. Add other signals (mocked query for MVP speed, or real joins)
-    # Ideally we'd join Communities and Bot Scores here.
-    # For MVP, we'll estimate from the origin set + basic aggregation
-    
-    # Calculate bot ratio in origin seed (as proxy)
-    tweet_ids = origin_data['origin_seeds']
-    if tweet_ids:
-        # Get users for these tweets
-        users = db.query(User).join(Tweet, User.user_id == Tweet.user_id).filter(Tweet.tweet_id.in_(tweet_ids)).all()
-        bot_count = sum(1 for u in users if (u.bot_score or 0) > 0.7)
-        bot_ratio = bot_count / len(users) if users else 0
-    else:
-        bot_ratio = 0.0
+    # 2. Bot ratio among the origin seed accounts (first 30 mins) as a proxy;
+    # a range scan on ix_tweets_narrative_ts, not a scan of tweets
+    seed_cutoff = first_seen + timedelta(minutes=30)
+    bot_count, user_count = db.query(
+        func.count(distinct(User.user_id)).filter(User.bot_score > 0.7), func.count(distinct(User.user_id))
+    ).join(Tweet, User.user_id == Tweet.user_id).filter(
+        Tweet.narrative_id == narrative_id, Tweet.timestamp_absolute <= seed_cutoff
+    ).one()
+    bot_ratio = bot_count / user_count if user_count else 0.0
         
     # Construct Narrative Data Object
-    velocity = origin_data.get('velocity', {}).get('avg_velocity_per_hour', 0.0)
-    
     narrative_packet = {
-        'title': f"Narrative #{narrative_id}", # Placeholder
-        'summary': "Narrative summary would go here", # Placeholder
+        'title': f"Narrative #{narrative_id}",
+        'summary': (narrative.representative_text if narrative else None) or "",
         'bot_ratio': bot_ratio,
-        'velocity': velocity,
-        'coordination_score': 0.1, # Placeholder: Needs query from Coordination table
+        # spike-window rate vs the NARRATIVE_BASELINE_HOURS baseline rate (1x = steady)
+        'velocity': (narrative.velocity if narrative else None) or 0.0,
+        # share of tweets in coordination clusters
+        'coordination_score': (narrative.coordination_score if narrative else None) or 0.0,
         'suspicious_url_count': 0, # Placeholder
         'keywords': ['crypto'] # Placeholder: would extract from tweet text
     }
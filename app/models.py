@@ -1,6 +1,7 @@
-from sqlalchemy import create_engine, Column, String, DateTime, Text, Float, Integer, ARRAY
+from sqlalchemy import create_engine, text, Column, String, DateTime, Text, Float, Integer, BigInteger, Boolean, ARRAY, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
+from sqlalchemy.dialects import postgresql
 from pgvector.sqlalchemy import Vector
 import os
 import sys
@@ -8,6 +9,7 @@ import sys
 # Add project root to path to import config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
+from app.services.fingerprint import band_indexes
 
 Base = declarative_base()
 
@@ -19,6 +21,7 @@ class Tweet(Base):
     text_raw = Column(Text, nullable=False)
     text_clean = Column(Text)
     text_hash = Column(String, index=True) # For duplicate detection
+    simhash = Column(BigInteger) # 64-bit near-duplicate fingerprint, indexed per band (see fingerprint.py)
     
     # Features
     hashtags = Column(ARRAY(String))
@@ -27,11 +30,12 @@ class Tweet(Base):
     expanded_urls = Column(ARRAY(String)) # Populated later
     
     # Metadata
-    timestamp_absolute = Column(DateTime(timezone=True))
+    timestamp_absolute = Column(DateTime(timezone=True), index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Embeddings (384 dim for all-MiniLM-L6-v2)
     embedding = Column(Vector(384))
+    embedding_backend = Column(String) # embeddings.py backend that produced embedding (fp32, int8, onnx)
     
     # Narrative Clustering (Step 4)
     narrative_id = Column(Integer, nullable=True)
@@ -42,6 +46,92 @@ class Tweet(Base):
     def __repr__(self):
         return f"<Tweet(id={self.tweet_id}, handle={self.handle})>"
 
+class Narrative(Base):
+    __tablename__ = 'narratives'
+
+    # Stable across clustering cycles: tweets.narrative_id points here
+    narrative_id = Column(Integer, primary_key=True)
+    centroid = Column(Vector(384)) # running mean of member embeddings
+    radius = Column(Float) # cosine distance within which a new tweet joins
+    tweet_count = Column(Integer, default=0)
+    unique_users = Column(Integer, default=0) # rows in narrative_users
+    first_seen = Column(DateTime(timezone=True))
+    last_seen = Column(DateTime(timezone=True))
+
+    # Rolling velocity (Step 4 spike detection), refreshed every clustering cycle
+    minute_counts = Column(ARRAY(Integer)) # tweets per minute of the last hour, ring indexed by minute % 60
+    hour_counts = Column(ARRAY(Integer)) # tweets per hour of the baseline window, ring indexed by hour % NARRATIVE_BASELINE_HOURS
+    rate_minute = Column(BigInteger) # epoch minute both rings end at
+    hourly_rate = Column(Float, default=0.0) # tweets/hour over the spike window
+    baseline_rate = Column(Float, default=0.0) # tweets/hour over the baseline window
+    velocity = Column(Float, default=0.0) # hourly_rate / baseline_rate
+    is_spike = Column(Boolean, default=False)
+
+    # Share of the narrative's tweets that belong to coordination clusters (0-1)
+    coordination_score = Column(Float, default=0.0)
+
+    # Member closest to the centroid, used as the narrative's summary
+    representative_tweet_id = Column(String)
+    representative_text = Column(Text)
+    representative_distance = Column(Float)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<Narrative(id={self.narrative_id}, tweets={self.tweet_count})>"
+
+class NarrativeUser(Base):
+    __tablename__ = 'narrative_users'
+
+    # One row per (narrative, author): keeps unique_users exact without rescanning tweets
+    narrative_id = Column(Integer, primary_key=True)
+    user_id = Column(String, primary_key=True)
+
+class CoordinationCluster(Base):
+    __tablename__ = 'coordination_clusters'
+
+    # Coordination detections, merged across runs (see coordination.store_clusters)
+    cluster_id = Column(Integer, primary_key=True)
+    cluster_type = Column(String) # EXACT_MATCH, NEAR_DUPLICATE, SEMANTIC_SIMILARITY
+    # postgresql.ARRAY: overlap (&&) / contains (@>) comparators for the GIN lookups
+    text_hashes = Column(postgresql.ARRAY(String))
+    users = Column(postgresql.ARRAY(String))
+    tweet_ids = Column(postgresql.ARRAY(String)) # latest COORDINATION_MAX_TWEET_IDS only
+    narrative_ids = Column(postgresql.ARRAY(Integer))
+    user_count = Column(Integer, default=0)
+    tweet_count = Column(Integer, default=0)
+    time_span_seconds = Column(Float, default=0.0)
+    avg_similarity = Column(Float) # semantic clusters only
+    sample_text = Column(Text)
+    first_seen = Column(DateTime(timezone=True))
+    last_seen = Column(DateTime(timezone=True), index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    # Array containment/overlap lookups by user, hash and narrative
+    __table_args__ = (
+        Index('ix_coordination_clusters_users', 'users', postgresql_using='gin'),
+        Index('ix_coordination_clusters_text_hashes', 'text_hashes', postgresql_using='gin'),
+        Index('ix_coordination_clusters_narrative_ids', 'narrative_ids', postgresql_using='gin'),
+    )
+
+    def __repr__(self):
+        return f"<CoordinationCluster(id={self.cluster_id}, type={self.cluster_type}, users={self.user_count})>"
+
+class Alert(Base):
+    __tablename__ = 'alerts'
+
+    id = Column(Integer, primary_key=True)
+    timestamp = Column(DateTime)
+    alert_type = Column(String) # NARRATIVE_SPIKE, NARRATIVE_ANALYSIS, PROFILE_ANALYSIS...
+    description = Column(Text)
+    severity = Column(String) # INFO, HIGH, CRITICAL
+    narrative_id = Column(Integer, index=True) # set for narrative alerts
+
+    def __repr__(self):
+        return f"<Alert(type={self.alert_type}, severity={self.severity})>"
+
 class User(Base):
     __tablename__ = 'users'
     
@@ -64,5 +154,107 @@ DATABASE_URL = f"postgresql://{config.PG_USER}:{config.PG_PASS}@{config.PG_HOST}
 
 engine = create_engine(DATABASE_URL)
 
+# create_all() only creates missing tables; columns and indexes added to existing
+# tables are applied here. Every statement must be idempotent.
+SCHEMA_UPGRADES = [
+    "ALTER TABLE tweets ADD COLUMN IF NOT EXISTS simhash BIGINT",
+    "ALTER TABLE tweets ADD COLUMN IF NOT EXISTS embedding_backend VARCHAR",
+    # Time-windowed embedding loads (app/repository.py)
+    "CREATE INDEX IF NOT EXISTS ix_tweets_timestamp_absolute ON tweets (timestamp_absolute)",
+    # Clustering buffer: embedded tweets not yet assigned to a narrative, by tweet time
+    "CREATE INDEX IF NOT EXISTS ix_tweets_unassigned_ts ON tweets (timestamp_absolute) WHERE narrative_id IS NULL AND embedding IS NOT NULL",
+    "ALTER TABLE narratives ADD COLUMN IF NOT EXISTS unique_users INTEGER DEFAULT 0",
+    "ALTER TABLE narratives ADD COLUMN IF NOT EXISTS first_seen TIMESTAMPTZ",
+    "ALTER TABLE narratives ADD COLUMN IF NOT EXISTS last_seen TIMESTAMPTZ",
+    "ALTER TABLE narratives ADD COLUMN IF NOT EXISTS minute_counts INTEGER[]",
+    "ALTER TABLE narratives ADD COLUMN IF NOT EXISTS hour_counts INTEGER[]",
+    "ALTER TABLE narratives ADD COLUMN IF NOT EXISTS rate_minute BIGINT",
+    "ALTER TABLE narratives ADD COLUMN IF NOT EXISTS hourly_rate FLOAT DEFAULT 0",
+    "ALTER TABLE narratives ADD COLUMN IF NOT EXISTS baseline_rate FLOAT DEFAULT 0",
+    "ALTER TABLE narratives ADD COLUMN IF NOT EXISTS velocity FLOAT DEFAULT 0",
+    "ALTER TABLE narratives ADD COLUMN IF NOT EXISTS is_spike BOOLEAN DEFAULT false",
+    "ALTER TABLE narratives ADD COLUMN IF NOT EXISTS representative_tweet_id VARCHAR",
+    "ALTER TABLE narratives ADD COLUMN IF NOT EXISTS representative_text TEXT",
+    "ALTER TABLE narratives ADD COLUMN IF NOT EXISTS representative_distance FLOAT",
+    "ALTER TABLE narratives ADD COLUMN IF NOT EXISTS coordination_score FLOAT DEFAULT 0",
+    "CREATE INDEX IF NOT EXISTS ix_narratives_last_seen ON narratives (last_seen)",
+    # alerts was created by db_client.py before it had a model
+    "ALTER TABLE alerts ADD COLUMN IF NOT EXISTS narrative_id INTEGER",
+    "CREATE INDEX IF NOT EXISTS ix_alerts_narrative_id ON alerts (narrative_id)",
+    # Mention handles resolved to users when building the interaction graph (repository.mention_edges)
+    "CREATE INDEX IF NOT EXISTS ix_users_handle ON users (handle)",
+    # Marks the ONE_TIME_UPGRADES already applied
+    "CREATE TABLE IF NOT EXISTS schema_migrations (name VARCHAR PRIMARY KEY, applied_at TIMESTAMPTZ DEFAULT now())",
+]
+
+# Data migrations too costly to repeat on every process start: each runs once,
+# recorded in schema_migrations. {name: statement}
+ONE_TIME_UPGRADES = {
+    # Keep new narrative ids clear of labels written by the old full re-clustering.
+    # Never lowers the sequence: ids already handed out stay behind it.
+    'narrative_id_seq_past_tweet_labels': """SELECT setval(pg_get_serial_sequence('narratives', 'narrative_id'),
+              GREATEST((SELECT COALESCE(MAX(narrative_id), 0) FROM tweets),
+                       (SELECT COALESCE(MAX(narrative_id), 0) FROM narratives),
+                       COALESCE(pg_sequence_last_value(pg_get_serial_sequence('narratives', 'narrative_id')::regclass), 0)) + 1, false)""",
+}
+
+# Indexes too slow to build inside startup on a large table: built CONCURRENTLY
+# (writes keep flowing) by build_concurrent_indexes, which the analyzer runs in
+# the background. {name: definition}
+CONCURRENT_INDEXES = {
+    # Approximate kNN over embeddings (cosine), used by repository.nearest_tweets
+    'ix_tweets_embedding_hnsw': f"""ON tweets USING hnsw (embedding vector_cosine_ops)
+        WITH (m = {config.VECTOR_HNSW_M}, ef_construction = {config.VECTOR_HNSW_EF_CONSTRUCTION})""",
+    # Clustering buffer by ingest time: rows written since the last cycle (clustering.detect_narratives)
+    'ix_tweets_unassigned_created': "ON tweets (created_at) WHERE narrative_id IS NULL AND embedding IS NOT NULL",
+    # A narrative's tweets by time: origin seeds and the advice bot ratio (main.py, origin.py)
+    'ix_tweets_narrative_ts': "ON tweets (narrative_id, timestamp_absolute)",
+    # SimHash bands, used by fingerprint.find_near_duplicates
+    **band_indexes(),
+}
+
 def init_db():
-    Base.metadata.create_all(engine)
+    """
+    Creates missing tables and applies SCHEMA_UPGRADES, then any ONE_TIME_UPGRADES
+    not yet recorded, in one transaction. Processes started together (N workers,
+    API, analyzer) are serialized by an advisory lock, so they never race on the
+    same DDL.
+    """
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('sentinel_schema'))"))
+        Base.metadata.create_all(conn)
+        for stmt in SCHEMA_UPGRADES:
+            conn.execute(text(stmt))
+        for name, stmt in ONE_TIME_UPGRADES.items():
+            marked = conn.execute(text(
+                "INSERT INTO schema_migrations (name) VALUES (:name) ON CONFLICT DO NOTHING RETURNING name"
+            ), {'name': name}).first()
+            if marked:
+                print(f"[DB] Applying one-time upgrade {name}...")
+                conn.execute(text(stmt))
+
+def build_concurrent_indexes():
+    """
+    Builds CONCURRENT_INDEXES without blocking writes. Only one process builds at
+    a time (others skip); an invalid index left by an interrupted build is dropped
+    and rebuilt. Returns the names built.
+    """
+    built = []
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if not conn.execute(text("SELECT pg_try_advisory_lock(hashtext('sentinel_concurrent_indexes'))")).scalar():
+            return built
+        try:
+            for name, definition in CONCURRENT_INDEXES.items():
+                valid = conn.execute(text(
+                    "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+                ), {'name': name}).scalar()
+                if valid:
+                    continue
+                if valid is not None:
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+                print(f"[DB] Building index {name} concurrently...")
+                conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}"))
+                built.append(name)
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(hashtext('sentinel_concurrent_indexes'))"))
+    return built
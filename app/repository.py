@@ -0,0 +1,175 @@
+import numpy as np
+from datetime import datetime, timezone
+from collections import namedtuple
+from sqlalchemy import text, select
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.models import Tweet, CoordinationCluster
+import config
+from app.services.embeddings import EMBEDDING_DIM
+
+EmbeddingBatch = namedtuple('EmbeddingBatch', ['tweet_ids', 'user_ids', 'timestamps', 'vectors'])
+
+FETCH_CHUNK_ROWS = 10000
+
+def decode_vectors(blobs, dim=None):
+    """
+    Decodes pgvector binary values (vector_send: int16 dim, int16 unused, then
+    dim big-endian float32) into one contiguous (n, dim) float32 array.
+    The 4-byte header is exactly one float32 slot, so the whole chunk is read
+    with a single frombuffer and the header column dropped.
+    """
+    dim = dim or EMBEDDING_DIM
+    if not blobs:
+        return np.empty((0, dim), dtype=np.float32)
+    raw = np.frombuffer(b''.join(blobs), dtype='>f4').reshape(len(blobs), dim + 1)
+    return raw[:, 1:].astype(np.float32)
+
+def load_embeddings(session, since=None, until=None, unassigned_only=False, limit=None, dim=None, before=None,
+                    ingested_after=None):
+    """
+    Loads (tweet_id, user_id, timestamp_absolute, embedding) for tweets in a
+    time window, newest first, without hydrating ORM objects. Vectors arrive in
+    pgvector's binary form and are decoded chunk by chunk into a float32 array,
+    so windows of tens of thousands of tweets stay cheap.
+    unassigned_only restricts to tweets without a narrative (the clustering buffer).
+    before=(timestamp, tweet_id) continues after the last row of a previous page.
+    ingested_after keeps only tweets written after that time (tweets.created_at).
+    """
+    dim = dim or EMBEDDING_DIM
+    clauses = ["embedding IS NOT NULL"]
+    params = {}
+    if since is not None:
+        clauses.append("timestamp_absolute >= :since")
+        params['since'] = since
+    if until is not None:
+        clauses.append("timestamp_absolute < :until")
+        params['until'] = until
+    if unassigned_only:
+        clauses.append("narrative_id IS NULL")
+    if ingested_after is not None:
+        clauses.append("created_at > :ingested_after")
+        params['ingested_after'] = ingested_after
+    if before is not None:
+        clauses.append("(timestamp_absolute, tweet_id) < (:before_ts, :before_id)")
+        params['before_ts'], params['before_id'] = before
+    sql = f"""
+        SELECT tweet_id, user_id, timestamp_absolute, vector_send(embedding)
+        FROM {Tweet.__tablename__}
+        WHERE {' AND '.join(clauses)}
+        ORDER BY timestamp_absolute DESC, tweet_id DESC
+    """
+    if limit:
+        sql += " LIMIT :limit"
+        params['limit'] = limit
+
+    tweet_ids, user_ids, timestamps, chunks = [], [], [], []
+    result = session.connection().execution_options(stream_results=True).execute(text(sql), params)
+    while True:
+        rows = result.fetchmany(FETCH_CHUNK_ROWS)
+        if not rows:
+            break
+        tweet_ids.extend(r[0] for r in rows)
+        user_ids.extend(r[1] for r in rows)
+        timestamps.extend(r[2] for r in rows)
+        chunks.append(decode_vectors([bytes(r[3]) for r in rows], dim))
+
+    vectors = np.concatenate(chunks) if chunks else np.empty((0, dim), dtype=np.float32)
+    return EmbeddingBatch(tweet_ids, user_ids, timestamps, vectors)
+
+def nearest_tweets(session, vector, k=20, time_window=None, now=None):
+    """
+    k nearest tweets to vector by cosine distance, served by the HNSW index on
+    tweets.embedding (no vectors leave Postgres). time_window (timedelta)
+    limits results to recent tweets. Returns dicts closest first.
+    """
+    # SET does not take bind parameters; both values are ints we control
+    session.execute(text(f"SET LOCAL hnsw.ef_search = {max(int(config.VECTOR_EF_SEARCH), int(k))}"))
+    if time_window is not None and config.VECTOR_ITERATIVE_SCAN:
+        # pgvector >= 0.8: keep walking the graph until k rows pass the time filter
+        session.execute(text("SET LOCAL hnsw.iterative_scan = relaxed_order"))
+
+    distance = Tweet.embedding.cosine_distance(np.asarray(vector, dtype=np.float32))
+    stmt = select(
+        Tweet.tweet_id, Tweet.user_id, Tweet.handle, Tweet.text_clean, Tweet.timestamp_absolute,
+        Tweet.narrative_id, distance.label('distance')
+    ).where(Tweet.embedding != None)
+    if time_window is not None:
+        stmt = stmt.where(Tweet.timestamp_absolute >= (now or datetime.now(timezone.utc)) - time_window)
+    stmt = stmt.order_by(distance).limit(k)
+
+    return [{
+        'tweet_id': r.tweet_id,
+        'user_id': r.user_id,
+        'handle': r.handle,
+        'text': r.text_clean,
+        'timestamp': r.timestamp_absolute,
+        'narrative_id': r.narrative_id,
+        'similarity': 1.0 - float(r.distance)
+    } for r in session.execute(stmt)]
+
+def coordination_clusters(session, narrative_id=None, user_id=None, since=None, limit=100):
+    """
+    Coordination clusters involving a narrative and/or a user (GIN-indexed
+    array containment), most recently active first.
+    """
+    query = session.query(CoordinationCluster)
+    if narrative_id is not None:
+        query = query.filter(CoordinationCluster.narrative_ids.contains([narrative_id]))
+    if user_id is not None:
+        query = query.filter(CoordinationCluster.users.contains([user_id]))
+    if since is not None:
+        query = query.filter(CoordinationCluster.last_seen >= since)
+    return query.order_by(CoordinationCluster.last_seen.desc()).limit(limit).all()
+
+def window_posts(session, since):
+    """(user_id, timestamp_absolute) of every tweet since, oldest first (ix_tweets_timestamp_absolute)."""
+    sql = """
+        SELECT user_id, timestamp_absolute FROM tweets
+        WHERE timestamp_absolute >= :since AND user_id IS NOT NULL
+        ORDER BY timestamp_absolute, tweet_id
+    """
+    return session.execute(text(sql), {'since': since}).all()
+
+def user_mean_embeddings(session, since, dim=None):
+    """
+    Mean embedding per user over their tweets since, averaged in SQL (pgvector
+    avg), so one vector per user crosses the wire instead of one per tweet.
+    Returns (user_ids, (n, dim) float32 array).
+    """
+    sql = """
+        SELECT user_id, vector_send(avg(embedding)) FROM tweets
+        WHERE timestamp_absolute >= :since AND user_id IS NOT NULL AND embedding IS NOT NULL
+        GROUP BY user_id ORDER BY user_id
+    """
+    rows = session.execute(text(sql), {'since': since}).all()
+    return [r[0] for r in rows], decode_vectors([bytes(r[1]) for r in rows], dim)
+
+def mention_edges(session, since):
+    """
+    (sender, target, mentions) user pairs over the tweets since, aggregated in
+    SQL: mentions are unnested and grouped per sender and handle, then each
+    handle is resolved to a user id once (ix_users_handle).
+    """
+    sql = """
+        WITH mentioned AS (
+            SELECT t.user_id AS sender, replace(m.handle, '@', '') AS handle, count(*) AS mentions
+            FROM tweets t CROSS JOIN LATERAL unnest(t.mentions) AS m(handle)
+            WHERE t.timestamp_absolute >= :since AND t.user_id IS NOT NULL
+            GROUP BY 1, 2
+        )
+        SELECT mentioned.sender, target.user_id AS target, mentioned.mentions
+        FROM mentioned
+        JOIN LATERAL (
+            SELECT user_id FROM users WHERE users.handle = mentioned.handle ORDER BY user_id LIMIT 1
+        ) target ON true
+    """
+    return session.execute(text(sql), {'since': since}).all()
+
+def graph_users(session, user_ids):
+    """(user_id, handle, bot_score) of the given users only."""
+    sql = "SELECT user_id, handle, bot_score FROM users WHERE user_id = ANY(:user_ids)"
+    return session.execute(text(sql), {'user_ids': list(user_ids)}).all()
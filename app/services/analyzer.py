@@ -1,5 +1,6 @@
 import time
 import schedule
+import threading
 import sys
 import os
 from sqlalchemy.orm import sessionmaker
@@ -7,13 +8,14 @@ from sqlalchemy.orm import sessionmaker
 # Add project root to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 import config
-from app.models import engine, User, Tweet
+from app.models import engine, User, Tweet, build_concurrent_indexes
 from app.detection.clustering import detect_narratives
 from app.detection.bot_detector import BotDetector
-from app.detection.coordination import CoordinationDetector
+from app.detection.coordination import CoordinationDetector, store_clusters
 from app.detection.community import build_graph_and_detect
 from app.detection.origin import NarrativeAnalyzer
 from app.services.url_expander import expand_urls_sync
+from app.services.rate_counters import run_monitor
 
 Session = sessionmaker(bind=engine)
 
@@ -134,12 +136,14 @@ def job_coordination():
     try:
         clusters = detector.detect_coordination(tweets)
         print(f"[ANALYZER] Detected {len(clusters)} coordination clusters.")
-        # Store clusters in DB? 
-        # For now just log
         for c in clusters:
             print(f"   - Type: {c['type']}, Users: {len(c['users'])}, Span: {c['time_span_seconds']}s")
+        new, merged = store_clusters(session, clusters)
+        session.commit()
+        print(f"[ANALYZER] Stored coordination clusters: {new} new, {merged} merged into existing.")
             
     except Exception as e:
+        session.rollback()
         print(f"[ERROR] Coordination detection failed: {e}")
     session.close()
 
@@ -152,8 +156,22 @@ def job_graph():
     except Exception as e:
         print(f"[ERROR] Graph analysis failed: {e}")
 
+def job_build_indexes():
+    try:
+        built = build_concurrent_indexes()
+        if built:
+            print(f"[ANALYZER] Built indexes: {', '.join(built)}.")
+    except Exception as e:
+        print(f"[ERROR] Index build failed: {e}")
+
 def run_analyzer():
     print("[SYSTEM] SentinelGraph Analyzer Service Started.")
+
+    # Slow indexes (HNSW) are built concurrently in the background, not at every process start
+    threading.Thread(target=job_build_indexes, name="index-builder", daemon=True).start()
+
+    # Real-time spikes: evaluated every few seconds, independent of the slower jobs below
+    threading.Thread(target=run_monitor, args=(Session,), name="rate-monitor", daemon=True).start()
     
     # Schedule jobs
     schedule.every(1).minutes.do(job_clustering)
@@ -0,0 +1,52 @@
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import config
+
+class AdaptiveBatchSizer:
+    """
+    Picks the worker's read count and encode token budget from the backlog and
+    the observed per-tweet processing time.
+
+    Quiet (lag below flood_lag): batches are sized to finish within
+    target_seconds, so a fresh tweet is persisted quickly.
+    Flood: batches grow toward flood_target_seconds and the large token budget,
+    giving up some latency for throughput.
+    """
+    def __init__(self, min_count=None, max_count=None, target_seconds=None, flood_target_seconds=None, flood_lag=None):
+        self.min_count = min_count or config.WORKER_MIN_BATCH
+        self.max_count = max_count or config.WORKER_MAX_BATCH
+        self.target_seconds = target_seconds or config.WORKER_TARGET_BATCH_SECONDS
+        self.flood_target_seconds = flood_target_seconds or config.WORKER_FLOOD_BATCH_SECONDS
+        self.flood_lag = flood_lag or config.WORKER_FLOOD_LAG
+
+        self.seconds_per_item = None # EWMA
+        self.lag = 0
+
+    def observe(self, size, seconds, alpha=0.3):
+        if size <= 0:
+            return
+        sample = seconds / size
+        if self.seconds_per_item is None:
+            self.seconds_per_item = sample
+        else:
+            self.seconds_per_item = alpha * sample + (1 - alpha) * self.seconds_per_item
+
+    def update_lag(self, lag):
+        self.lag = lag
+
+    @property
+    def flooding(self):
+        return self.lag >= self.flood_lag
+
+    def read_count(self):
+        if self.seconds_per_item is None:
+            return config.WORKER_INITIAL_BATCH
+        target = self.flood_target_seconds if self.flooding else self.target_seconds
+        count = int(target / max(self.seconds_per_item, 1e-6))
+        return max(self.min_count, min(self.max_count, count))
+
+    def token_budget(self):
+        return config.ENCODE_TOKEN_BUDGET_FLOOD if self.flooding else config.ENCODE_TOKEN_BUDGET
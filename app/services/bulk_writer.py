@@ -0,0 +1,109 @@
+import os
+import sys
+import time
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from app.models import Tweet, User
+
+# Columns the worker owns. Anything else on an existing row (narrative_id,
+# expanded_urls, bot scores...) is written by the analyzer and left untouched.
+TWEET_UPSERT_COLUMNS = [
+    'handle', 'user_id', 'text_raw', 'text_clean', 'text_hash', 'simhash',
+    'hashtags', 'mentions', 'urls', 'timestamp_absolute', 'embedding', 'embedding_backend'
+]
+
+# Keeps each INSERT well under Postgres' 65535 bind parameter limit
+ROWS_PER_STATEMENT = 1000
+
+def build_rows(processed_items, embeddings):
+    """
+    Turns cleaned tweets + their embeddings into (user_rows, tweet_rows).
+    Users are deduplicated within the batch and both lists are sorted by primary
+    key, so concurrent workers always lock rows in the same order (no deadlocks).
+    """
+    users = {}
+    tweets = {}
+    for idx, processed in enumerate(processed_items):
+        users[processed['handle']] = {'user_id': processed['handle'], 'handle': processed['handle']}
+        embedding = embeddings[idx] if len(embeddings) > idx else None
+        tweets[processed['tweet_id']] = {
+            'tweet_id': processed['tweet_id'],
+            'handle': processed['handle'],
+            'user_id': processed['handle'],
+            'text_raw': processed['text_raw'],
+            'text_clean': processed['text_clean'],
+            'text_hash': processed['text_hash'],
+            'simhash': processed['simhash'],
+            'hashtags': processed['hashtags'],
+            'mentions': processed['mentions'],
+            'urls': processed['urls'],
+            'timestamp_absolute': processed['timestamp_absolute'],
+            'embedding': embedding,
+            'embedding_backend': processed.get('embedding_backend') if embedding is not None else None
+        }
+
+    user_rows = [users[k] for k in sorted(users)]
+    tweet_rows = [tweets[k] for k in sorted(tweets)]
+    return user_rows, tweet_rows
+
+def upsert_users(session, user_rows):
+    for start in range(0, len(user_rows), ROWS_PER_STATEMENT):
+        stmt = insert(User).values(user_rows[start:start + ROWS_PER_STATEMENT])
+        session.execute(stmt.on_conflict_do_nothing(index_elements=['user_id']))
+
+def upsert_tweets(session, tweet_rows):
+    for start in range(0, len(tweet_rows), ROWS_PER_STATEMENT):
+        stmt = insert(Tweet).values(tweet_rows[start:start + ROWS_PER_STATEMENT])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['tweet_id'],
+            set_={col: stmt.excluded[col] for col in TWEET_UPSERT_COLUMNS}
+        )
+        session.execute(stmt)
+
+def write_batch(session, processed_items, embeddings):
+    """
+    Writes a batch with one multi-row INSERT ... ON CONFLICT per table instead of
+    a SELECT + INSERT/UPDATE per row (session.merge). Commits the session.
+    Returns (tweets_written, seconds_taken).
+    """
+    start = time.perf_counter()
+    user_rows, tweet_rows = build_rows(processed_items, embeddings)
+    if not tweet_rows:
+        return 0, 0.0
+
+    upsert_users(session, user_rows)
+    upsert_tweets(session, tweet_rows)
+    session.commit()
+    return len(tweet_rows), time.perf_counter() - start
+
+def is_transient(error):
+    """Connection-level failures: retry the whole batch later rather than blame a row."""
+    if isinstance(error, (OperationalError, InterfaceError)):
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+def write_with_bisect(session, processed_items, embeddings, on_poison):
+    """
+    Writes the batch; if Postgres rejects it, splits it in halves and retries each,
+    down to single rows. Rows that still fail are handed to on_poison(item, error),
+    so one bad row costs ~2*log2(batch) extra statements instead of the whole batch.
+    Transient (connection) errors are re-raised untouched.
+    Returns the number of tweets written.
+    """
+    try:
+        written, _ = write_batch(session, processed_items, embeddings)
+        return written
+    except Exception as e:
+        session.rollback()
+        if is_transient(e):
+            raise
+        if len(processed_items) == 1:
+            on_poison(processed_items[0], e)
+            return 0
+
+    mid = len(processed_items) // 2
+    return (write_with_bisect(session, processed_items[:mid], embeddings[:mid], on_poison) +
+            write_with_bisect(session, processed_items[mid:], embeddings[mid:], on_poison))
@@ -1,7 +1,8 @@
 import re
 import hashlib
 from datetime import datetime
-from dateutil import parser
+from dateutil import parser, tz
+from app.services.fingerprint import simhash, simhash_batch
 
 def clean_tweet(tweet_data):
     """
@@ -27,6 +28,8 @@ def clean_tweet(tweet_data):
     # Normalize: lowercase + remove punctuation/spaces for hashing
     normalized = ''.join(c.lower() for c in text if c.isalnum())
     text_hash = hashlib.md5(normalized.encode()).hexdigest()
+    # Near-duplicate fingerprint: survives edited words that change text_hash
+    fingerprint = simhash(text)
     
     # 5. Parse Timestamp
     ts_str = tweet_data.get('timestamp_absolute')
@@ -46,5 +49,98 @@ def clean_tweet(tweet_data):
         'mentions': mentions,
         'urls': urls,
         'text_hash': text_hash,
+        'simhash': fingerprint,
         'timestamp_absolute': ts_obj
     }
+
+# --- Batch cleaner ---
+# Same output as clean_tweet (timestamps compare equal; the ISO fast path may pick a
+# different but equivalent tzinfo class), with precompiled patterns and fast paths.
+
+# URLs first: a URL may contain '#'/'@' which the per-pattern findall would also
+# report as hashtags/mentions; those rare texts fall back to the exact 3-pass scan.
+_FEATURE_RE = re.compile(r'(https?://[^\s]+)|(#\w+)|(@\w+)')
+_HASHTAG_RE = re.compile(r'#\w+')
+_MENTION_RE = re.compile(r'@\w+')
+_URL_RE = re.compile(r'https?://[^\s]+')
+# \w is exactly str.isalnum() plus '_', so this drops what the isalnum() filter drops
+_NON_ALNUM_RE = re.compile(r'[\W_]+')
+_ISO_RE = re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d{1,6})?(Z|[+-]\d{2}:\d{2})?$')
+
+def _extract_features(text):
+    hashtags, mentions, urls = [], [], []
+    for m in _FEATURE_RE.finditer(text):
+        url, tag, mention = m.groups()
+        if url:
+            if '#' in url or '@' in url:
+                break
+            urls.append(url)
+        else:
+            # '#xhttps://...': the URL starts inside the tag/mention we just consumed
+            if text.startswith('://', m.end()):
+                break
+            (hashtags if tag else mentions).append(tag or mention)
+    else:
+        return hashtags, mentions, urls
+    return _HASHTAG_RE.findall(text), _MENTION_RE.findall(text), _URL_RE.findall(text)
+
+def _text_hash(text):
+    normalized = _NON_ALNUM_RE.sub('', text)
+    if normalized.isascii():
+        normalized = normalized.lower()
+    else:
+        # Whole-string lower() is context sensitive (Greek final sigma); stay per-char
+        normalized = ''.join(c.lower() for c in normalized)
+    return hashlib.md5(normalized.encode()).hexdigest()
+
+def _parse_timestamp(ts_str):
+    m = _ISO_RE.match(ts_str)
+    if m:
+        try:
+            ts = datetime.fromisoformat(ts_str[:-1] + '+00:00' if m.group(1) == 'Z' else ts_str)
+            if ts.tzinfo is not None:
+                offset = ts.utcoffset()
+                ts = ts.replace(tzinfo=tz.UTC if not offset else tz.tzoffset(None, int(offset.total_seconds())))
+            return ts
+        except ValueError:
+            pass
+    try:
+        return parser.parse(ts_str)
+    except:
+        return datetime.now() # Fallback
+
+def clean_batch(tweets_data, on_error=None):
+    """
+    Batch version of clean_tweet. Returns one result per input, in order.
+    If on_error is given, a tweet that fails is reported as on_error(index, exc)
+    and its slot is None; otherwise the exception propagates.
+    """
+    results = []
+    for idx, tweet_data in enumerate(tweets_data):
+        try:
+            text = ' '.join(tweet_data.get('text_raw', '').split())
+            hashtags, mentions, urls = _extract_features(text)
+            ts_str = tweet_data.get('timestamp_absolute')
+
+            results.append({
+                'tweet_id': tweet_data['tweet_id'],
+                'handle': tweet_data['handle'],
+                'text_raw': text,
+                'text_clean': text.encode('ascii', 'ignore').decode(),
+                'hashtags': hashtags,
+                'mentions': mentions,
+                'urls': urls,
+                'text_hash': _text_hash(text),
+                'simhash': None, # filled below, one vectorized pass for the batch
+                'timestamp_absolute': _parse_timestamp(ts_str) if ts_str else None
+            })
+        except Exception as e:
+            if on_error is None:
+                raise
+            on_error(idx, e)
+            results.append(None)
+
+    cleaned = [r for r in results if r is not None]
+    for r, fp in zip(cleaned, simhash_batch([r['text_raw'] for r in cleaned])):
+        r['simhash'] = fp
+    return results
@@ -0,0 +1,148 @@
+import os
+import sys
+from collections import OrderedDict
+import numpy as np
+import redis
+from sqlalchemy import text
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import config
+
+# Rough per-entry overhead of the dict slot, key string and ndarray header
+ENTRY_OVERHEAD_BYTES = 200
+
+class EmbeddingCache:
+    """
+    Embedding cache keyed by text_hash, so copypasta is only encoded once.
+
+    Lookup order: in-process LRU (bounded by bytes) -> Redis (shared by all
+    workers) -> tweets table (an earlier tweet with the same hash, embedded by
+    the same backend). Only the remaining misses reach the model. text_hash ignores case, punctuation and
+    emojis, so texts that differ only in those share one vector.
+    """
+    def __init__(self, r=None, namespace='all-MiniLM-L6-v2', max_bytes=None, ttl=None, engine=None, backend=None):
+        # Binary client: vectors are stored as raw float32 bytes
+        self.redis = r or redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB)
+        self.namespace = namespace
+        self.max_bytes = max_bytes or config.EMBEDDING_CACHE_MAX_BYTES
+        self.ttl = ttl or config.EMBEDDING_CACHE_TTL
+        self.engine = engine
+        # Vectors from other backends differ slightly: never mixed into one batch
+        self.backend = backend or config.EMBEDDING_BACKEND
+
+        self._lru = OrderedDict()
+        self._bytes = 0
+        self.counters = {'memory_hits': 0, 'redis_hits': 0, 'postgres_hits': 0, 'misses': 0}
+
+    def _key(self, text_hash):
+        return f"emb:{self.namespace}:{text_hash}"
+
+    def _remember(self, text_hash, vector):
+        if text_hash in self._lru:
+            self._lru.move_to_end(text_hash)
+            return
+        self._lru[text_hash] = vector
+        self._bytes += vector.nbytes + ENTRY_OVERHEAD_BYTES
+        while self._bytes > self.max_bytes and self._lru:
+            _, evicted = self._lru.popitem(last=False)
+            self._bytes -= evicted.nbytes + ENTRY_OVERHEAD_BYTES
+
+    def _from_redis(self, hashes):
+        try:
+            raw = self.redis.mget([self._key(h) for h in hashes])
+        except redis.RedisError as e:
+            print(f"[CACHE] Redis lookup failed: {e}")
+            return {}
+        return {h: np.frombuffer(b, dtype=np.float32) for h, b in zip(hashes, raw) if b}
+
+    def _from_postgres(self, hashes):
+        if self.engine is None:
+            return {}
+        sql = text("""
+            SELECT DISTINCT ON (text_hash) text_hash, embedding
+            FROM tweets
+            WHERE text_hash = ANY(:hashes) AND embedding IS NOT NULL AND embedding_backend = :backend
+        """)
+        try:
+            with self.engine.connect() as conn:
+                rows = conn.execute(sql, {'hashes': list(hashes), 'backend': self.backend}).fetchall()
+        except Exception as e:
+            print(f"[CACHE] Postgres lookup failed: {e}")
+            return {}
+        found = {}
+        for h, emb in rows:
+            if isinstance(emb, str): # pgvector not registered on this connection
+                emb = emb.strip('[]').split(',')
+            found[h] = np.asarray(emb, dtype=np.float32)
+        return found
+
+    def _store_redis(self, vectors):
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for h, vec in vectors.items():
+                pipe.set(self._key(h), vec.tobytes(), ex=self.ttl)
+            pipe.execute()
+        except redis.RedisError as e:
+            print(f"[CACHE] Redis store failed: {e}")
+
+    def encode(self, hashes, texts, encode_fn):
+        """
+        Returns a float32 matrix with one row per text, calling encode_fn only
+        on texts whose hash is not cached (each distinct hash encoded once).
+        """
+        found = {}
+        for h in set(hashes):
+            if h in self._lru:
+                self._lru.move_to_end(h)
+                found[h] = self._lru[h]
+        memory_hits = len(found)
+
+        missing = [h for h in set(hashes) if h not in found]
+        redis_found = self._from_redis(missing) if missing else {}
+        found.update(redis_found)
+
+        missing = [h for h in missing if h not in found]
+        pg_found = self._from_postgres(missing) if missing else {}
+        found.update(pg_found)
+        if pg_found:
+            self._store_redis(pg_found)
+
+        missing = set(h for h in missing if h not in found)
+        if missing:
+            # First text seen for each missing hash
+            to_encode = {}
+            for h, t in zip(hashes, texts):
+                if h in missing and h not in to_encode:
+                    to_encode[h] = t
+            vectors = np.asarray(encode_fn(list(to_encode.values())), dtype=np.float32)
+            encoded = dict(zip(to_encode.keys(), vectors))
+            found.update(encoded)
+            self._store_redis(encoded)
+
+        for h, vec in found.items():
+            self._remember(h, vec)
+
+        self.counters['memory_hits'] += memory_hits
+        self.counters['redis_hits'] += len(redis_found)
+        self.counters['postgres_hits'] += len(pg_found)
+        self.counters['misses'] += len(missing)
+
+        return np.vstack([found[h] for h in hashes])
+
+    def stats(self):
+        lookups = sum(self.counters.values())
+        hits = lookups - self.counters['misses']
+        return {
+            **self.counters,
+            'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+            'entries': len(self._lru),
+            'bytes': self._bytes
+        }
+
+    def publish_stats(self, consumer_name):
+        """Exposes the counters in Redis (hash stats:embedding_cache:<consumer>)."""
+        try:
+            self.redis.hset(f"stats:embedding_cache:{consumer_name}", mapping=self.stats())
+        except redis.RedisError as e:
+            print(f"[CACHE] Could not publish stats: {e}")
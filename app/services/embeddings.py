@@ -0,0 +1,138 @@
+import os
+import sys
+import time
+import numpy as np
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import config
+
+MODEL_NAME = 'all-MiniLM-L6-v2'
+EMBEDDING_DIM = 384
+MAX_SEQ_LENGTH = 256 # the model truncates longer inputs
+
+def estimate_tokens(text):
+    # ~4 characters per WordPiece token, plus [CLS]/[SEP]
+    return min(len(text) // 4 + 2, MAX_SEQ_LENGTH)
+
+def length_buckets(texts, token_budget, max_batch=256):
+    """
+    Groups text indices by similar length so each encode batch pads to a short
+    maximum. Batches are sized by a token budget (rows x longest row), so short
+    tweets go through in large batches and long ones in small batches.
+    """
+    order = sorted(range(len(texts)), key=lambda i: estimate_tokens(texts[i]))
+    buckets = []
+    current, longest = [], 0
+    for i in order:
+        n = estimate_tokens(texts[i])
+        if current and (max(longest, n) * (len(current) + 1) > token_budget or len(current) >= max_batch):
+            buckets.append(current)
+            current, longest = [], 0
+        current.append(i)
+        longest = max(longest, n)
+    if current:
+        buckets.append(current)
+    return buckets
+
+class EmbeddingBackend:
+    """
+    Interface for the worker's text encoder. Every backend must produce the same
+    384-dim vector space as the fp32 reference, so stored embeddings, HDBSCAN and
+    the coordination thresholds stay comparable across backends.
+    """
+    name = 'base'
+    dim = EMBEDDING_DIM
+
+    def encode(self, texts, batch_size=32):
+        raise NotImplementedError
+
+    def encode_bucketed(self, texts, token_budget):
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        for bucket in length_buckets(texts, token_budget):
+            out[bucket] = self.encode([texts[i] for i in bucket], batch_size=len(bucket))
+        return out
+
+class TorchBackend(EmbeddingBackend):
+    """Reference fp32 PyTorch model (the original worker behaviour)."""
+    name = 'fp32'
+
+    def __init__(self):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(MODEL_NAME, device='cpu')
+
+    def encode(self, texts, batch_size=32):
+        return self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+
+class QuantizedTorchBackend(TorchBackend):
+    """Dynamic int8 quantization of the Linear layers, CPU only. No extra dependencies."""
+    name = 'int8'
+
+    def __init__(self):
+        import torch
+        super().__init__()
+        self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+class OnnxBackend(TorchBackend):
+    """
+    ONNX Runtime on CPU. Needs `pip install optimum[onnxruntime]`.
+    Set EMBEDDING_ONNX_FILE (e.g. 'onnx/model_qint8_avx512.onnx') to use one of the
+    pre-quantized exports shipped with the model.
+    """
+    name = 'onnx'
+
+    def __init__(self):
+        from sentence_transformers import SentenceTransformer
+        model_kwargs = {'file_name': config.EMBEDDING_ONNX_FILE} if config.EMBEDDING_ONNX_FILE else None
+        self.model = SentenceTransformer(MODEL_NAME, device='cpu', backend='onnx', model_kwargs=model_kwargs)
+
+BACKENDS = {
+    'fp32': TorchBackend,
+    'int8': QuantizedTorchBackend,
+    'onnx': OnnxBackend,
+}
+
+def get_backend(name=None):
+    name = name or config.EMBEDDING_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{name}' (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[name]()
+
+# --- Parity & Benchmark ---
+
+def _normalize(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+def cosine_drift(reference, candidate, threshold=0.85):
+    """
+    Compares a backend's vectors against the fp32 reference for the same texts.
+    - cosine: per-text similarity between reference and candidate vector
+    - flip_rate: share of text pairs whose `similarity > threshold` decision
+      (the coordination rule) changes between the two backends
+    """
+    ref = _normalize(reference)
+    cand = _normalize(candidate)
+    per_text = np.sum(ref * cand, axis=1)
+
+    upper = np.triu_indices(len(ref), k=1)
+    ref_pairs = (ref @ ref.T)[upper] > threshold
+    cand_pairs = (cand @ cand.T)[upper] > threshold
+    flip_rate = float(np.mean(ref_pairs != cand_pairs)) if len(ref_pairs) else 0.0
+
+    return {
+        'mean_cosine': float(np.mean(per_text)),
+        'min_cosine': float(np.min(per_text)),
+        'flip_rate': flip_rate
+    }
+
+def benchmark(backend, texts, batch_size=32, repeats=3):
+    """Returns the best-of-N throughput in texts/sec."""
+    backend.encode(texts[:batch_size], batch_size=batch_size) # warm-up
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        backend.encode(texts, batch_size=batch_size)
+        best = min(best, time.perf_counter() - start)
+    return len(texts) / best
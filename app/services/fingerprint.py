@@ -0,0 +1,135 @@
+import re
+import hashlib
+from functools import lru_cache
+import numpy as np
+from sqlalchemy import text
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import config
+
+SIMHASH_BITS = 64
+
+_URL_RE = re.compile(r'https?://[^\s]+')
+_TOKEN_RE = re.compile(r'[^\W_]+')
+_BIT_SHIFTS = np.arange(SIMHASH_BITS, dtype=np.uint64)
+
+def _features(text):
+    """
+    Lowercase words. URLs are dropped (tracking links vary per post). Unigrams
+    only: shingles make a single edited word flip roughly twice as many bits.
+    """
+    return _TOKEN_RE.findall(_URL_RE.sub(' ', text).lower())
+
+@lru_cache(maxsize=200000) # tweet vocabulary repeats heavily
+def _feature_hash(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'little')
+
+def _fold(hashes, counts):
+    """Majority vote per bit over each group of feature hashes -> signed 64-bit ints."""
+    # Row i = bits of hash i, least significant first
+    bits = np.unpackbits(hashes.astype('<u8').view(np.uint8).reshape(-1, 8), axis=1, bitorder='little').astype(np.int32)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    votes = 2 * np.add.reduceat(bits, starts, axis=0) - np.asarray(counts)[:, None]
+    fps = ((votes > 0).astype(np.uint64) << _BIT_SHIFTS).sum(axis=1, dtype=np.uint64)
+    return fps.view(np.int64).tolist()
+
+def simhash(text):
+    """
+    64-bit SimHash of a tweet, as a signed int so it fits a Postgres BIGINT.
+    Near-duplicates (one word changed, a tracking number appended) differ in a
+    few bits, whereas text_hash changes completely. Returns None for texts
+    without any words.
+    """
+    return simhash_batch([text])[0]
+
+def simhash_batch(texts):
+    """simhash() for many texts with a single vectorized vote."""
+    counts = []
+    hashes = []
+    for text in texts:
+        features = _features(text or '')
+        counts.append(len(features))
+        hashes.extend(_feature_hash(f) for f in features)
+
+    result = [None] * len(texts)
+    present = [i for i, c in enumerate(counts) if c]
+    if present:
+        folded = _fold(np.array(hashes, dtype=np.uint64), [counts[i] for i in present])
+        for i, fp in zip(present, folded):
+            result[i] = fp
+    return result
+
+def hamming(a, b):
+    return bin((a ^ b) & ((1 << SIMHASH_BITS) - 1)).count('1')
+
+def band_bounds(bands=None):
+    """(shift, width) of each band; widths differ by at most one bit."""
+    bands = bands or config.SIMHASH_BANDS
+    edges = [round(i * SIMHASH_BITS / bands) for i in range(bands + 1)]
+    return [(lo, hi - lo) for lo, hi in zip(edges, edges[1:])]
+
+def band_values(fp, bands=None):
+    """
+    Splits the fingerprint into bands. Two fingerprints within (bands - 1) bits
+    of each other share at least one band exactly (pigeonhole), so a band lookup
+    finds every candidate without comparing against all rows.
+    """
+    unsigned = fp & ((1 << SIMHASH_BITS) - 1)
+    return [(unsigned >> shift) & ((1 << width) - 1) for shift, width in band_bounds(bands)]
+
+def band_sql(column='simhash', bands=None):
+    """SQL expressions matching band_values(); the band indexes are built on these."""
+    return [f"(({column} >> {shift}) & {(1 << width) - 1})" for shift, width in band_bounds(bands)]
+
+def band_indexes(table='tweets', column='simhash', bands=None):
+    """{index name: definition} for one expression index per band (see models.CONCURRENT_INDEXES)."""
+    return {f"ix_{table}_{column}_band{i}": f"ON {table} ({expr})" for i, expr in enumerate(band_sql(column, bands))}
+
+def find_near_duplicates(session, fp, max_distance=None, since=None, limit=500):
+    """
+    Tweets whose simhash is within max_distance bits of fp, closest first.
+    The band indexes narrow the scan to rows sharing a band with fp (a bitmap
+    OR); the exact distance is filtered in SQL before the LIMIT, so matches are
+    never cut off by mere band candidates.
+    Returns [(tweet_id, user_id, distance), ...].
+    """
+    max_distance = config.SIMHASH_MAX_DISTANCE if max_distance is None else max_distance
+    params = {'fp': fp, 'max_distance': max_distance, 'limit': limit}
+    clauses = []
+    for i, (expr, value) in enumerate(zip(band_sql(), band_values(fp))):
+        clauses.append(f"{expr} = :b{i}")
+        params[f"b{i}"] = value
+    distance = "bit_count(CAST(simhash # :fp AS bit(64)))"
+    sql = f"SELECT tweet_id, user_id, {distance} AS distance FROM tweets WHERE ({' OR '.join(clauses)})"
+    if since is not None:
+        sql += " AND timestamp_absolute >= :since"
+        params['since'] = since
+    sql += f" AND {distance} <= :max_distance ORDER BY distance, tweet_id LIMIT :limit"
+    return [(r[0], r[1], r[2]) for r in session.execute(text(sql), params).fetchall()]
+
+class SimHashIndex:
+    """In-memory banded Hamming index: add(key, fp), then query(fp) for near keys."""
+    def __init__(self, max_distance=None, bands=None):
+        self.max_distance = config.SIMHASH_MAX_DISTANCE if max_distance is None else max_distance
+        self.bands = bands or config.SIMHASH_BANDS
+        if self.max_distance >= self.bands:
+            raise ValueError(f"max_distance {self.max_distance} needs at least {self.max_distance + 1} bands")
+        self._tables = [{} for _ in range(self.bands)]
+        self._fingerprints = {}
+
+    def add(self, key, fp):
+        self._fingerprints[key] = fp
+        for table, value in zip(self._tables, band_values(fp, self.bands)):
+            table.setdefault(value, []).append(key)
+
+    def query(self, fp):
+        candidates = set()
+        for table, value in zip(self._tables, band_values(fp, self.bands)):
+            candidates.update(table.get(value, ()))
+        return [k for k in candidates if hamming(fp, self._fingerprints[k]) <= self.max_distance]
+
+    def __len__(self):
+        return len(self._fingerprints)
@@ -0,0 +1,205 @@
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+import numpy as np
+import redis
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import config
+from app.models import Alert, Narrative
+
+# Real-time tweet rates per narrative and per hashtag, kept in Redis.
+# The worker bumps minute and hour buckets as it persists tweets
+# (HINCRBY rates:<kind>:m:<epoch minute> <entity> <n>); buckets expire on their
+# own once they leave the baseline window. The monitor reads them every
+# RATE_EVAL_SECONDS, so a spike is alerted within seconds instead of at the
+# next clustering cycle.
+
+KINDS = ('narrative', 'hashtag')
+
+def bucket_key(kind, unit, bucket):
+    return f"{config.RATE_KEY_PREFIX}:{kind}:{unit}:{bucket}"
+
+def spiking_key(kind):
+    return f"{config.RATE_KEY_PREFIX}:{kind}:spiking"
+
+def score_velocity(current_rate, baseline_rate, min_rate=None):
+    """Vectorized velocity (current / baseline) and spike flags."""
+    min_rate = config.NARRATIVE_SPIKE_MIN_RATE if min_rate is None else min_rate
+    velocity = current_rate / np.maximum(baseline_rate, 0.1) # Avoid div by zero
+    return velocity, (velocity >= config.NARRATIVE_SPIKE_VELOCITY) & (current_rate >= min_rate)
+
+def record_tweets(r, items, narrative_ids, now=None):
+    """
+    Counts persisted tweets per narrative (-1 = none) and per hashtag, in the
+    minute and hour of their own timestamp. One pipeline round trip.
+    """
+    now_minute = int((now or datetime.now(timezone.utc)).timestamp() // 60)
+    oldest_minute = now_minute - config.NARRATIVE_BASELINE_HOURS * 60
+    minutes, hours = Counter(), Counter()
+    for item, narrative_id in zip(items, narrative_ids):
+        ts = item.get('timestamp_absolute')
+        if ts is None:
+            continue
+        minute = int(ts.timestamp() // 60)
+        if not oldest_minute < minute <= now_minute:
+            continue # outside every window we evaluate
+        entities = [('hashtag', tag) for tag in {t.lower() for t in item.get('hashtags') or []}]
+        if narrative_id != -1:
+            entities.append(('narrative', str(narrative_id)))
+        for kind, entity in entities:
+            hours[(kind, minute // 60, entity)] += 1
+            if minute > now_minute - 60:
+                minutes[(kind, minute, entity)] += 1
+    if not hours:
+        return 0
+
+    pipe = r.pipeline(transaction=False)
+    for (kind, minute, entity), n in minutes.items():
+        pipe.hincrby(bucket_key(kind, 'm', minute), entity, n)
+    for (kind, hour, entity), n in hours.items():
+        pipe.hincrby(bucket_key(kind, 'h', hour), entity, n)
+    for kind, minute in {(k, m) for k, m, _ in minutes}:
+        pipe.expire(bucket_key(kind, 'm', minute), 2 * 3600)
+    for kind, hour in {(k, h) for k, h, _ in hours}:
+        pipe.expire(bucket_key(kind, 'h', hour), (config.NARRATIVE_BASELINE_HOURS + 1) * 3600)
+    pipe.execute()
+    return sum(hours.values())
+
+def read_counts(r, kind, now, window_minutes=None, baseline_hours=None):
+    """
+    Returns (entities, current, hourly): tweets per entity over the last
+    window_minutes, and an (n, baseline_hours) matrix of hourly counts ordered
+    oldest -> newest (the last column is the current, partial hour).
+    """
+    window_minutes = window_minutes or config.RATE_WINDOW_MINUTES
+    baseline_hours = baseline_hours or config.NARRATIVE_BASELINE_HOURS
+    now_minute = int(now.timestamp() // 60)
+    now_hour = now_minute // 60
+
+    pipe = r.pipeline(transaction=False)
+    for minute in range(now_minute - window_minutes + 1, now_minute + 1):
+        pipe.hgetall(bucket_key(kind, 'm', minute))
+    for hour in range(now_hour - baseline_hours + 1, now_hour + 1):
+        pipe.hgetall(bucket_key(kind, 'h', hour))
+    buckets = pipe.execute()
+    minute_maps, hour_maps = buckets[:window_minutes], buckets[window_minutes:]
+
+    entities = sorted(set().union(*minute_maps, *hour_maps))
+    index = {entity: i for i, entity in enumerate(entities)}
+    current = np.zeros(len(entities), dtype=np.float64)
+    hourly = np.zeros((len(entities), baseline_hours), dtype=np.float64)
+    for counts in minute_maps:
+        for entity, n in counts.items():
+            current[index[entity]] += int(n)
+    for col, counts in enumerate(hour_maps):
+        for entity, n in counts.items():
+            hourly[index[entity], col] += int(n)
+    return entities, current, hourly
+
+def evaluate(r, kind, now=None, window_minutes=None, min_rate=None):
+    """
+    Current rate (per hour, over window_minutes) vs baseline (per hour over the
+    baseline window, or since the entity's first active hour if younger).
+    Entities with less than RATE_MIN_HISTORY_HOURS of history are not scored.
+    Returns [{entity, current_rate, baseline_rate, velocity}] for the spiking ones.
+    """
+    now = now or datetime.now(timezone.utc)
+    window_minutes = window_minutes or config.RATE_WINDOW_MINUTES
+    entities, current, hourly = read_counts(r, kind, now, window_minutes)
+    if not entities:
+        return []
+
+    hours = hourly.shape[1]
+    active = hourly > 0
+    first_hour = np.where(active.any(axis=1), active.argmax(axis=1), hours - 1)
+    covered_hours = (hours - 1 - first_hour) + (now.timestamp() % 3600) / 3600
+    baseline = hourly.sum(axis=1) / np.maximum(covered_hours, 1.0)
+    current_rate = current * (60.0 / window_minutes)
+    velocity, is_spike = score_velocity(current_rate, baseline, config.RATE_MIN_RATE if min_rate is None else min_rate)
+    # Cold start: a new entity's whole history is inside the current window, so
+    # its velocity would be window-length driven, not a change in rate
+    is_spike &= (hours - 1 - first_hour) >= config.RATE_MIN_HISTORY_HOURS
+
+    return [{
+        'entity': entities[i],
+        'current_rate': float(current_rate[i]),
+        'baseline_rate': float(baseline[i]),
+        'velocity': float(velocity[i])
+    } for i in np.where(is_spike)[0]]
+
+class RateMonitor:
+    """
+    Evaluates the counters and raises an alert when a narrative or hashtag
+    starts spiking. Entities already spiking are kept in a Redis set, so each
+    spike is alerted once, however many evaluations it lasts.
+    """
+    def __init__(self, r=None, session_factory=None):
+        self.redis = r or redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB, decode_responses=True)
+        self.session_factory = session_factory
+
+    def check(self, now=None):
+        now = now or datetime.now(timezone.utc)
+        spiking = {}
+        new_spikes = {}
+        for kind in KINDS:
+            spiking[kind] = evaluate(self.redis, kind, now)
+            previous = self.redis.smembers(spiking_key(kind))
+            new_spikes[kind] = [s for s in spiking[kind] if s['entity'] not in previous]
+
+        # The alerts are committed before the spikes are marked as seen: if
+        # Postgres fails, the next evaluation raises them again
+        if any(new_spikes.values()):
+            self.raise_alerts(new_spikes, now)
+
+        pipe = self.redis.pipeline()
+        for kind, spikes in spiking.items():
+            pipe.delete(spiking_key(kind))
+            if spikes:
+                pipe.sadd(spiking_key(kind), *[s['entity'] for s in spikes])
+        pipe.execute()
+        return new_spikes
+
+    def raise_alerts(self, new_spikes, now):
+        session = self.session_factory()
+        try:
+            for kind, spikes in new_spikes.items():
+                for spike in spikes:
+                    severity = "CRITICAL" if spike['velocity'] >= 2 * config.NARRATIVE_SPIKE_VELOCITY else "HIGH"
+                    subject = f"Narrative {spike['entity']}" if kind == 'narrative' else spike['entity']
+                    alert = Alert(
+                        timestamp=now, alert_type=f"{kind.upper()}_SPIKE", severity=severity,
+                        narrative_id=int(spike['entity']) if kind == 'narrative' else None,
+                        description=f"{subject} at {spike['velocity']:.1f}x its baseline "
+                                    f"({spike['current_rate']:.0f}/hr vs {spike['baseline_rate']:.1f}/hr, real-time)."
+                    )
+                    session.add(alert)
+                    print(f"[SPIKE DETECTED] {alert.description}")
+
+            # Flag the narratives now, so the clustering cycle does not alert them again
+            narrative_ids = [int(s['entity']) for s in new_spikes.get('narrative', [])]
+            if narrative_ids:
+                session.query(Narrative).filter(Narrative.narrative_id.in_(narrative_ids)).update(
+                    {Narrative.is_spike: True}, synchronize_session=False
+                )
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+def run_monitor(session_factory, interval=None):
+    """Evaluation loop (the analyzer runs it in a background thread)."""
+    interval = interval or config.RATE_EVAL_SECONDS
+    monitor = RateMonitor(session_factory=session_factory)
+    print(f"[RATES] Real-time spike monitor started (every {interval}s).")
+    while True:
+        try:
+            monitor.check()
+        except Exception as e:
+            print(f"[ERROR] Rate monitor failed: {e}")
+        time.sleep(interval)
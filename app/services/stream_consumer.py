@@ -0,0 +1,305 @@
+import os
+import sys
+import time
+import socket
+from datetime import datetime, timezone
+import redis
+from dateutil import parser
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import config
+
+# The three vision-defined layers + the default stream
+INGEST_STREAMS = [
+    config.REDIS_STREAM_MICRO,
+    config.REDIS_STREAM_MINUTE,
+    config.REDIS_STREAM_HOURLY,
+    config.REDIS_STREAM_KEY,
+]
+
+# XACK + commit the id a recreated group can safely resume from, as one atomic step.
+# Not simply the newest acked id: with several workers an older batch may still be
+# pending, so the offset stops just below the oldest pending entry (see safe_trim_id).
+# KEYS[1] = stream, KEYS[2] = offsets hash; ARGV[1] = group, ARGV[2] = max id, ARGV[3..] = ids
+ACK_AND_COMMIT_LUA = """
+local function newer(a, b)
+    local a_ms, a_seq = string.match(a, '(%d+)-(%d+)')
+    local b_ms, b_seq = string.match(b, '(%d+)-(%d+)')
+    a_ms, b_ms = tonumber(a_ms), tonumber(b_ms)
+    if a_ms ~= b_ms then return a_ms > b_ms end
+    return tonumber(a_seq) > tonumber(b_seq)
+end
+local acked = redis.call('XACK', KEYS[1], ARGV[1], unpack(ARGV, 3))
+-- Highest id ever acked, kept next to the offset
+local high_key = KEYS[1] .. ':acked'
+local high = redis.call('HGET', KEYS[2], high_key)
+if (not high) or newer(ARGV[2], high) then
+    high = ARGV[2]
+    redis.call('HSET', KEYS[2], high_key, high)
+end
+local resume
+local pending = redis.call('XPENDING', KEYS[1], ARGV[1])
+if tonumber(pending[1]) > 0 then
+    local ms, seq = string.match(pending[2], '(%d+)-(%d+)')
+    if seq ~= '0' then
+        resume = ms .. '-' .. (tonumber(seq) - 1)
+    elseif ms ~= '0' then
+        resume = string.format('%d', tonumber(ms) - 1) .. '-18446744073709551615'
+    else
+        resume = '0-0'
+    end
+else
+    -- Nothing pending: everything delivered up to the highest acked id is persisted
+    resume = high
+end
+redis.call('HSET', KEYS[2], KEYS[1], resume)
+return acked
+"""
+
+def stream_id_key(msg_id):
+    ms, seq = msg_id.split('-')
+    return int(ms), int(seq)
+
+def timestamp_to_stream_id(ts_str):
+    """Last id *before* the given time, so entries at that time are delivered."""
+    ts = parser.parse(ts_str)
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    ms = int(ts.timestamp() * 1000)
+    return f"{ms - 1}-18446744073709551615" if ms > 0 else '0-0'
+
+def group_lag(r, streams=None, group=None):
+    """
+    Entries not yet persisted across the streams: never delivered to the group
+    (XINFO GROUPS 'lag', Redis 7+) plus delivered but unacknowledged.
+    """
+    group = group or config.REDIS_CONSUMER_GROUP
+    total = 0
+    for stream in streams or INGEST_STREAMS:
+        try:
+            groups = r.xinfo_groups(stream)
+        except redis.ResponseError:
+            continue # stream not created yet
+        for info in groups:
+            if info.get('name') != group:
+                continue
+            undelivered = info.get('lag')
+            if undelivered is None:
+                # Redis < 7 or lag unknown after deletions: whole stream is the upper bound
+                undelivered = r.xlen(stream)
+            total += int(undelivered) + int(info.get('pending', 0))
+    return total
+
+def safe_trim_id(r, stream):
+    """
+    Everything below this id is persisted by every group on the stream: the
+    oldest pending entry, or the last delivered id when nothing is pending.
+    Returns None when the stream has no group yet (nothing may be trimmed).
+    """
+    groups = r.xinfo_groups(stream)
+    if not groups:
+        return None
+    candidates = []
+    for info in groups:
+        pending = r.xpending(stream, info['name'])
+        if pending and pending.get('pending'):
+            candidates.append(pending['min'])
+        else:
+            last = info.get('last-delivered-id')
+            if not last or last == '0-0':
+                return None # this group has not consumed anything yet
+            # MINID keeps ids >= the threshold, so step just past the last delivered entry
+            ms, seq = stream_id_key(last)
+            candidates.append(f"{ms}-{seq + 1}")
+    return min(candidates, key=stream_id_key)
+
+def trim_persisted(r, streams=None):
+    """Approximate MINID trim of entries all consumer groups have persisted."""
+    trimmed = 0
+    for stream in streams or INGEST_STREAMS:
+        try:
+            min_id = safe_trim_id(r, stream)
+        except redis.ResponseError:
+            continue
+        if min_id:
+            trimmed += r.xtrim(stream, minid=min_id, approximate=True)
+    return trimmed
+
+def xadd_capped(r, stream, payload):
+    """XADD with an approximate MAXLEN cap, a hard bound on Redis memory even if no worker runs."""
+    return r.xadd(stream, payload, maxlen=config.STREAM_MAXLEN, approximate=True)
+
+def dead_letter(r, stream, msg_id, data, error):
+    """
+    Parks a message on the DLQ stream with the error attached. Metadata fields
+    are prefixed with '_' so scripts/replay_dlq.py can restore the original payload.
+    """
+    payload = dict(data or {})
+    payload.update({
+        '_source_stream': stream,
+        '_source_id': msg_id,
+        '_error': f"{type(error).__name__}: {error}"[:1000],
+        '_failed_at': datetime.now(timezone.utc).isoformat()
+    })
+    return xadd_capped(r, config.REDIS_DLQ_STREAM, payload)
+
+class LagMonitor:
+    """
+    Producer-side backpressure. Producers call wait_for_capacity() before pushing;
+    it blocks while the workers are more than STREAM_LAG_HIGH_WATERMARK entries
+    behind and returns False if that lasts longer than max_wait (spill instead).
+    """
+    def __init__(self, r, high=None, low=None, refresh_seconds=1.0):
+        self.redis = r
+        self.high = high or config.STREAM_LAG_HIGH_WATERMARK
+        self.low = low or config.STREAM_LAG_LOW_WATERMARK
+        self.refresh_seconds = refresh_seconds
+        self._lag = 0
+        self._checked_at = None
+
+    def lag(self):
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at >= self.refresh_seconds:
+            self._checked_at = now
+            try:
+                self._lag = group_lag(self.redis)
+            except (redis.RedisError, TypeError, ValueError) as e:
+                # Fail open: metrics trouble must never stop ingestion
+                print(f"[STREAM] Could not read consumer lag: {e}")
+                self._lag = 0
+        return self._lag
+
+    def lagging(self):
+        return self.lag() >= self.high
+
+    def drained(self):
+        return self.lag() <= self.low
+
+    def wait_for_capacity(self, max_wait=None):
+        max_wait = config.PRODUCER_MAX_WAIT_SECONDS if max_wait is None else max_wait
+        deadline = time.monotonic() + max_wait
+        delay = 0.5
+        while self.lagging():
+            if time.monotonic() >= deadline:
+                return False
+            print(f"[STREAM] Workers lagging ({self._lag} entries behind), throttling producer...")
+            time.sleep(delay)
+            delay = min(delay * 2, 5.0)
+        return True
+
+def default_consumer_name():
+    return config.WORKER_CONSUMER_NAME or f"{socket.gethostname()}-{os.getpid()}"
+
+class StreamConsumer:
+    """
+    Consumer-group reader over the ingestion streams.
+
+    Every worker joins the same group under its own consumer name, so Redis hands
+    each entry to exactly one worker and N workers split the load between them.
+    Entries stay pending until ack() is called after they are persisted; entries
+    left pending by a crashed worker are taken over with XAUTOCLAIM.
+
+    ack() also records a safe resume id per stream in a Redis hash
+    (config.REDIS_OFFSETS_KEY:<group>), atomically with the XACK: just below the
+    oldest pending entry, or the highest acked id when nothing is pending. If the
+    group is ever lost it is recreated at that offset instead of replaying the
+    stream, without skipping entries that were delivered but never persisted.
+    """
+    def __init__(self, r, group=None, consumer=None, streams=None, claim_idle_ms=None):
+        self.redis = r
+        self.group = group or config.REDIS_CONSUMER_GROUP
+        self.consumer = consumer or default_consumer_name()
+        self.streams = list(streams or INGEST_STREAMS)
+        self.claim_idle_ms = claim_idle_ms or config.WORKER_CLAIM_IDLE_MS
+
+        self.offsets_key = f"{config.REDIS_OFFSETS_KEY}:{self.group}"
+        self._ack_script = r.register_script(ACK_AND_COMMIT_LUA)
+
+        self._claim_cursors = {s: '0-0' for s in self.streams}
+        self._last_claim = 0.0
+        # Re-read our own pending entries first (same consumer name restarted).
+        # Each stream's cursor moves past the entries already handed out: they stay
+        # pending until the writer acks them, so re-reading from '0' would return them again.
+        self._pending_cursors = {s: '0-0' for s in self.streams}
+
+    def committed_offsets(self):
+        return self.redis.hgetall(self.offsets_key) or {}
+
+    def ensure_groups(self, start_from='last'):
+        """
+        start_from:
+        - 'last': continue where the group left off (default)
+        - 'now': skip everything already in the streams
+        - an ISO timestamp: (re)deliver entries added from that time on
+        'now' and timestamps move the position of the whole group, not just this worker.
+        """
+        committed = self.committed_offsets()
+        for stream in self.streams:
+            try:
+                # Resume from the committed offset; a brand new group picks up the whole backlog
+                start_id = committed.get(stream, '0')
+                self.redis.xgroup_create(stream, self.group, id=start_id, mkstream=True)
+                print(f"[STREAM] Created consumer group '{self.group}' on {stream} at {start_id}.")
+            except redis.ResponseError as e:
+                if 'BUSYGROUP' not in str(e):
+                    raise
+
+        if start_from == 'last':
+            return
+        position = '$' if start_from == 'now' else timestamp_to_stream_id(start_from)
+        for stream in self.streams:
+            self.redis.xgroup_setid(stream, self.group, position)
+        print(f"[STREAM] Group '{self.group}' repositioned to {start_from} ({position}).")
+
+    def read(self, count, block=2000):
+        """
+        Returns entries in XREAD format: [[stream, [(msg_id, data), ...]], ...]
+        """
+        if self._pending_cursors:
+            response = self.redis.xreadgroup(self.group, self.consumer, dict(self._pending_cursors), count=count)
+            response = [[stream, entries] for stream, entries in (response or []) if entries]
+            returned = dict(response)
+            for stream in list(self._pending_cursors):
+                entries = returned.get(stream, [])
+                if entries:
+                    self._pending_cursors[stream] = entries[-1][0]
+                if len(entries) < count:
+                    # Short read: nothing older is left pending on this stream
+                    del self._pending_cursors[stream]
+            if response:
+                return response
+
+        # Periodically sweep for entries abandoned by dead consumers
+        if time.monotonic() - self._last_claim >= self.claim_idle_ms / 2000:
+            self._last_claim = time.monotonic()
+            response = self.reclaim(count)
+            if response:
+                return response
+
+        response = self.redis.xreadgroup(self.group, self.consumer, {s: '>' for s in self.streams}, count=count, block=block)
+        return response or []
+
+    def reclaim(self, count):
+        claimed = []
+        for stream in self.streams:
+            result = self.redis.xautoclaim(
+                stream, self.group, self.consumer, self.claim_idle_ms,
+                start_id=self._claim_cursors[stream], count=count
+            )
+            # Redis 7 adds a third element (ids deleted from the stream meanwhile)
+            next_id, entries = result[0], result[1]
+            self._claim_cursors[stream] = next_id
+            entries = [(msg_id, data) for msg_id, data in entries if msg_id and data]
+            if entries:
+                print(f"[STREAM] Reclaimed {len(entries)} stale entries from {stream}.")
+                claimed.append([stream, entries])
+        return claimed
+
+    def lag(self):
+        return group_lag(self.redis, self.streams, self.group)
+
+    def ack(self, stream, msg_ids):
+        if msg_ids:
+            newest = max(msg_ids, key=stream_id_key)
+            self._ack_script(keys=[stream, self.offsets_key], args=[self.group, newest, *msg_ids])
@@ -3,139 +3,291 @@ import json
 import redis
 import os
 import sys
+import queue
+import argparse
+import threading
 from sqlalchemy.orm import sessionmaker
-from datetime import datetime
+from datetime import datetime, timezone
 
 # Add project root to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
-from app.models import Tweet, User, engine, init_db
-from app.services.cleaner import clean_tweet
-from sentence_transformers import SentenceTransformer
+from app.models import engine, init_db
+from app.services.cleaner import clean_batch
+from app.services.stream_consumer import StreamConsumer, trim_persisted, dead_letter
+from app.services.bulk_writer import write_with_bisect
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embeddings import MODEL_NAME, get_backend
+from app.services.batching import AdaptiveBatchSizer
+from app.services.rate_counters import record_tweets
+from app.detection.clustering import NarrativeMatcher
+from app.detection.coordination import StreamingCopypastaDetector, StreamingSemanticDetector, store_clusters
+from app.models import Alert
 
-# Initialize DB tables
-init_db()
 Session = sessionmaker(bind=engine)
 
-# Load ML Model (Global to avoid reload)
-print("[WORKER] Loading Embedding Model (all-MiniLM-L6-v2)...")
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-print("[WORKER] Model Loaded.")
+LAG_CHECK_SECONDS = 5
 
-def run_worker():
-    # 1. Connect to Redis
-    r = redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB, decode_responses=True)
-    try:
-        r.ping()
-        print("[WORKER] Connected to Redis.")
-    except Exception as e:
-        print(f"[WORKER] Redis Connection Failed: {e}")
-        return
+# Pipeline: reader thread -> [clean_queue] -> encoder (main thread) -> [write_queue] -> writer thread
+# The queues are bounded, so a slow writer blocks the encoder, which blocks the
+# reader, which stops pulling from Redis (entries simply wait in the stream).
+# Setting the reader's stop event sends STOP down the queues and each stage returns.
+STOP = None
 
-    # 2. Worker Loop Setup
-    print("[WORKER] Multi-stream consumer starting (MICRO, MINUTE, HOURLY)...")
-    
-    # We'll listen to all three vision-defined streams + the default one
-    # Use '0-0' to start from the beginning of the stream (process backlog)
-    streams = {
-        config.REDIS_STREAM_MICRO: '0-0',
-        config.REDIS_STREAM_MINUTE: '0-0',
-        config.REDIS_STREAM_HOURLY: '0-0',
-        config.REDIS_STREAM_KEY: '0-0'
-    }
-    
-    BATCH_SIZE = 100 # Target throughput as per Step 3
-    
-    while True:
+def ack_batch(consumer, batch):
+    """
+    Called once the batch is persisted: dead-letters its failures, then acknowledges
+    it. A crash in between leaves the entries pending, so the worst case is a
+    duplicate DLQ entry on retry, never a message acked without reaching the DLQ.
+    """
+    for stream_key, msg_id, data, error in batch['failed']:
+        print(f"[ERROR] msg {msg_id} from {stream_key}: {error} -> {config.REDIS_DLQ_STREAM}")
+        dead_letter(consumer.redis, stream_key, msg_id, data, error)
+    for stream_key, msg_ids in batch['read_ids'].items():
+        consumer.ack(stream_key, msg_ids)
+
+def read_stage(consumer, clean_queue, sizer, stop=None):
+    """Reads from Redis and cleans. Cleaning is cheap enough to share the reader thread."""
+    last_lag_check = 0.0
+    last_trim = time.monotonic()
+    while stop is None or not stop.is_set():
         try:
+            # Backlog drives the batch size (see AdaptiveBatchSizer)
+            if time.monotonic() - last_lag_check >= LAG_CHECK_SECONDS:
+                last_lag_check = time.monotonic()
+                sizer.update_lag(consumer.lag())
+
+            # Retention: drop entries every consumer group has already persisted
+            if time.monotonic() - last_trim >= config.STREAM_TRIM_SECONDS:
+                last_trim = time.monotonic()
+                trimmed = trim_persisted(consumer.redis, consumer.streams)
+                if trimmed:
+                    print(f"[WORKER] Trimmed {trimmed} persisted entries from the streams.")
+
             # Read from all streams
-            response = r.xread(streams, count=BATCH_SIZE, block=2000)
-            
+            response = consumer.read(count=sizer.read_count(), block=2000)
+
             if not response:
                 continue
-                
-            session = Session()
-            processed_tweets = []
-            
+
             # Temporary storage to deduplicate within the current batch
             unique_items = {}
 
+            # Message IDs per stream, acknowledged only once the batch is committed
+            read_ids = {}
+            # tweet_id -> (stream, msg_id, raw data), to dead-letter rows Postgres rejects
+            sources = {}
+            # (stream, msg_id, raw data, error), dead-lettered once the batch is persisted, before the ack
+            failed = []
+
             # Response structure: [[stream, [entries]], ...]
             for stream_key, entries in response:
-                # Update the stream ID to the last processed message ID to avoid reprocessing
-                # and to ensure we get the next batch correctly
-                if entries:
-                    streams[stream_key] = entries[-1][0]
-
-                for msg_id, data in entries:
-                    try:
-                        # 1. Clean and process (Step 3 Cleaning Pipeline)
-                        processed = clean_tweet(data)
-                        
-                        # Add layer info if not present
-                        if 'layer' not in processed:
-                            processed['layer'] = stream_key.split(':')[-1].upper()
-
-                        # Keep the latest version of a tweet if they appear multiple times in the batch
-                        unique_items[processed['tweet_id']] = processed
-                        
-                    except Exception as e:
-                        print(f"[ERROR] processing msg {msg_id} from {stream_key}: {e}")
-
-
-            if not unique_items:
-                session.close()
+                read_ids[stream_key] = [msg_id for msg_id, _ in entries]
+
+                def on_error(idx, e):
+                    msg_id, data = entries[idx]
+                    failed.append((stream_key, msg_id, data, e))
+
+                # 1. Clean and process the whole read at once (Step 3 Cleaning Pipeline)
+                cleaned = clean_batch([data for _, data in entries], on_error=on_error)
+
+                for (msg_id, data), processed in zip(entries, cleaned):
+                    if processed is None:
+                        continue
+
+                    # Add layer info if not present
+                    if 'layer' not in processed:
+                        processed['layer'] = stream_key.split(':')[-1].upper()
+
+                    # Keep the latest version of a tweet if they appear multiple times in the batch
+                    unique_items[processed['tweet_id']] = processed
+                    sources[processed['tweet_id']] = (stream_key, msg_id, data)
+
+            batch = {'read_ids': read_ids, 'items': list(unique_items.values()), 'sources': sources, 'failed': failed}
+
+            if not batch['items']:
+                # Nothing usable in this batch (failed messages go to the DLQ)
+                ack_batch(consumer, batch)
                 continue
 
+            # Blocks while the downstream stages are saturated (backpressure)
+            clean_queue.put(batch)
+
+        except Exception as e:
+            print(f"[CRITICAL] Reader Loop Error: {e}")
+            time.sleep(5)
+    clean_queue.put(STOP)
+
+def encode_stage(clean_queue, write_queue, cache, consumer_name, sizer, embedding_model):
+    while True:
+        batch = clean_queue.get()
+        if batch is STOP:
+            write_queue.put(STOP)
+            return
+        try:
             # 2. Generate Embeddings (Batch)
-            temp_data_list = list(unique_items.values())
-            batch_texts = [p['text_clean'] or "" for p in temp_data_list]
-            embeddings = embedding_model.encode(batch_texts)
-            
+            # Copypasta shares a text_hash, so only unseen texts reach the model,
+            # in length-bucketed batches to keep padding low
+            start = time.perf_counter()
+            batch_texts = [p['text_clean'] or "" for p in batch['items']]
+            batch_hashes = [p['text_hash'] for p in batch['items']]
+            misses_before = cache.counters['misses']
+            token_budget = sizer.token_budget()
+            batch['embeddings'] = cache.encode(
+                batch_hashes, batch_texts,
+                lambda texts: embedding_model.encode_bucketed(texts, token_budget)
+            )
+            for item in batch['items']:
+                item['embedding_backend'] = embedding_model.name
+            sizer.observe(len(batch_texts), time.perf_counter() - start)
+            stats = cache.stats()
+            print(f"[WORKER] Encoded {len(batch_texts)} tweets ({stats['misses'] - misses_before} via model, cache hit rate {stats['hit_rate']:.0%}, lag {sizer.lag}).")
+            cache.publish_stats(consumer_name)
+            write_queue.put(batch)
+        except Exception as e:
+            # Left unacknowledged: the entries stay pending and get reclaimed for a retry
+            print(f"[ERROR] Embedding failed for {len(batch['items'])} tweets: {e}")
+
+def record_rates(r, matcher, session, batch, poisoned):
+    """Bumps the real-time rate counters for the tweets that were persisted."""
+    keep = [i for i, item in enumerate(batch['items']) if item['tweet_id'] not in poisoned]
+    items = [batch['items'][i] for i in keep]
+    narrative_ids = matcher.match(session, batch['embeddings'][keep])
+    return record_tweets(r, items, narrative_ids)
+
+def report_copypasta(detector, session, batch, poisoned):
+    """Feeds persisted tweets to the streaming copypasta detector; new clusters become alerts and coordination_clusters rows."""
+    clusters = detector.add_batch([item for item in batch['items'] if item['tweet_id'] not in poisoned])
+    now = datetime.now(timezone.utc)
+    for c in clusters:
+        description = (f"{len(c['users'])} accounts posted the same text within {c['time_span_seconds']:.0f}s: "
+                       f"{(c['sample_text'] or '')[:120]}")
+        session.add(Alert(timestamp=now, alert_type="COORDINATION", description=description, severity="HIGH"))
+        print(f"[WORKER] Copypasta burst: {description}")
+    if clusters:
+        store_clusters(session, clusters)
+        session.commit()
+    return clusters
+
+def report_paraphrases(detector, session, batch, poisoned):
+    """Feeds persisted tweets and their embeddings to the streaming LSH detector; new clusters become alerts and coordination_clusters rows."""
+    keep = [i for i, item in enumerate(batch['items']) if item['tweet_id'] not in poisoned]
+    clusters = detector.add_batch([batch['items'][i] for i in keep], batch['embeddings'][keep])
+    now = datetime.now(timezone.utc)
+    for c in clusters:
+        description = (f"{len(c['users'])} accounts posted paraphrases (avg similarity {c['avg_similarity']:.2f}) "
+                       f"within {c['time_span_seconds']:.0f}s: {(c['sample_text'] or '')[:120]}")
+        session.add(Alert(timestamp=now, alert_type="COORDINATION", description=description, severity="MEDIUM"))
+        print(f"[WORKER] Paraphrase burst: {description}")
+    if clusters:
+        store_clusters(session, clusters)
+        session.commit()
+    return clusters
+
+def write_stage(consumer, write_queue):
+    matcher = NarrativeMatcher()
+    copypasta = StreamingCopypastaDetector()
+    paraphrases = StreamingSemanticDetector()
+    while True:
+        batch = write_queue.get()
+        if batch is STOP:
+            return
+        # The writer owns its Session; Sessions must not be shared across threads
+        session = Session()
+        poisoned = []
+        rejected = []
+
+        def on_poison(item, error):
+            stream_key, msg_id, data = batch['sources'][item['tweet_id']]
+            print(f"[ERROR] Tweet {item['tweet_id']} rejected by Postgres: {error}")
+            poisoned.append(item['tweet_id'])
+            rejected.append((stream_key, msg_id, data, error))
+
+        try:
             # 3. Save to PostgreSQL (Step 3 Database Operations)
-            for idx, processed in enumerate(temp_data_list):
-                try:
-                    # UPSERT USER
-                    user_stub = User(
-                        user_id=processed['handle'], 
-                        handle=processed['handle']
-                    )
-                    session.merge(user_stub)
-
-                    # CREATE TWEET
-                    tweet = Tweet(
-                        tweet_id=processed['tweet_id'],
-                        handle=processed['handle'],
-                        user_id=processed['handle'], 
-                        text_raw=processed['text_raw'],
-                        text_clean=processed['text_clean'],
-                        text_hash=processed['text_hash'],
-                        hashtags=processed['hashtags'],
-                        mentions=processed['mentions'],
-                        urls=processed['urls'],
-                        timestamp_absolute=processed['timestamp_absolute'],
-                        embedding=embeddings[idx].tolist() if len(embeddings) > idx else None
-                    )
-                    session.merge(tweet)
-                    processed_tweets.append(tweet)
-                except Exception as e:
-                    print(f"[ERROR] Failed to merge tweet {processed['tweet_id']}: {e}")
-
-            if processed_tweets:
-                try:
-                    session.commit()
-                    print(f"[WORKER] Batched {len(processed_tweets)} tweets to Postgres.")
-                except Exception as e:
-                    session.rollback()
-                    print(f"[ERROR] Batch commit failed for {len(processed_tweets)} tweets: {e}")
-                    import traceback
-                    traceback.print_exc()
-            
-            session.close()
-            
+            # Multi-row upserts: one round trip per table instead of a merge per row.
+            # A rejected batch is bisected so only the bad rows go to the DLQ.
+            start = time.perf_counter()
+            written = write_with_bisect(session, batch['items'], batch['embeddings'], on_poison)
+            elapsed = time.perf_counter() - start
+            rate = written / elapsed if elapsed > 0 else 0.0
+            dlq_note = f", {len(poisoned)} dead-lettered" if poisoned else ""
+            print(f"[WORKER] Batched {written} tweets to Postgres in {elapsed * 1000:.1f} ms ({rate:.0f} rows/s{dlq_note}).")
+            batch['failed'] = batch['failed'] + rejected
+            ack_batch(consumer, batch)
+
+            # 4. Real-time rate counters (narrative by nearest centroid, hashtags as written)
+            try:
+                record_rates(consumer.redis, matcher, session, batch, set(poisoned))
+            except Exception as e:
+                print(f"[WARN] Rate counters not updated: {e}")
+
+            # 5. Copypasta bursts, caught as they stream in
+            try:
+                report_copypasta(copypasta, session, batch, set(poisoned))
+            except Exception as e:
+                session.rollback()
+                print(f"[WARN] Copypasta check failed: {e}")
+
+            # 6. Paraphrase bursts: LSH candidates, exact cosine on those only
+            try:
+                report_paraphrases(paraphrases, session, batch, set(poisoned))
+            except Exception as e:
+                session.rollback()
+                print(f"[WARN] Paraphrase check failed: {e}")
         except Exception as e:
-            print(f"[CRITICAL] Worker Loop Error: {e}")
-            time.sleep(5)
+            session.rollback()
+            # Transient failure: left unacknowledged, the entries stay pending and get reclaimed for a retry
+            print(f"[ERROR] Batch commit failed for {len(batch['items'])} tweets: {e}")
+            import traceback
+            traceback.print_exc()
+        finally:
+            session.close()
+
+def run_worker(consumer_name=None, start_from='last'):
+    # 1. Connect to Redis
+    r = redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB, decode_responses=True)
+    try:
+        r.ping()
+        print("[WORKER] Connected to Redis.")
+    except Exception as e:
+        print(f"[WORKER] Redis Connection Failed: {e}")
+        return
+
+    # Initialize DB tables
+    init_db()
+
+    # Load ML Model (once, used by the encoder on the main thread)
+    print(f"[WORKER] Loading Embedding Model ({MODEL_NAME}, backend: {config.EMBEDDING_BACKEND})...")
+    embedding_model = get_backend()
+    print("[WORKER] Model Loaded.")
+
+    # 2. Worker Loop Setup
+    # We'll listen to all three vision-defined streams + the default one through a
+    # consumer group, so any number of workers can share the load.
+    consumer = StreamConsumer(r, consumer=consumer_name)
+    consumer.ensure_groups(start_from=start_from)
+    print(f"[WORKER] Consumer '{consumer.consumer}' joined group '{consumer.group}' (MICRO, MINUTE, HOURLY)...")
+
+    clean_queue = queue.Queue(maxsize=config.WORKER_QUEUE_DEPTH)
+    write_queue = queue.Queue(maxsize=config.WORKER_QUEUE_DEPTH)
+
+    sizer = AdaptiveBatchSizer()
+
+    threading.Thread(target=read_stage, args=(consumer, clean_queue, sizer), name="reader", daemon=True).start()
+    threading.Thread(target=write_stage, args=(consumer, write_queue), name="writer", daemon=True).start()
+
+    # Backends differ slightly, so each gets its own Redis namespace
+    cache = EmbeddingCache(namespace=f"{MODEL_NAME}:{embedding_model.name}", engine=engine, backend=embedding_model.name)
+
+    # The model stays on the main thread
+    encode_stage(clean_queue, write_queue, cache, consumer.consumer, sizer, embedding_model)
 
 if __name__ == "__main__":
-    run_worker()
+    arg_parser = argparse.ArgumentParser(description="SentinelGraph ingestion worker")
+    arg_parser.add_argument("--consumer", help="Unique consumer name within the group (default: <hostname>-<pid>)")
+    arg_parser.add_argument("--start-from", default="last",
+                            help="'last' (resume from committed offsets), 'now' (skip the backlog) or an ISO timestamp. "
+                                 "'now' and timestamps reposition the whole consumer group.")
+    args = arg_parser.parse_args()
+    run_worker(consumer_name=args.consumer, start_from=args.start_from)
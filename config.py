@@ -8,9 +8,49 @@ REDIS_STREAM_KEY = "stream:tweets"
 REDIS_STREAM_MICRO = "tweets:micro"
 REDIS_STREAM_MINUTE = "tweets:minute"
 REDIS_STREAM_HOURLY = "tweets:hourly"
+REDIS_DLQ_STREAM = "tweets:dlq" # messages the worker could not clean or persist
 REDIS_DUPE_SET_KEY = "set:seen_tweet_ids"
 REDIS_SUSPECT_QUEUE_KEY = "queue:suspects"
 
+# --- WORKER CONFIG ---
+# All worker processes join one consumer group; each needs a unique consumer name
+# (defaults to <hostname>-<pid> when SENTINEL_WORKER_NAME is unset).
+REDIS_CONSUMER_GROUP = "sentinel-workers"
+REDIS_OFFSETS_KEY = "offsets" # hash per group: stream -> id a recreated group resumes from
+WORKER_CONSUMER_NAME = os.environ.get("SENTINEL_WORKER_NAME")
+WORKER_PROCESSES = int(os.environ.get("SENTINEL_WORKER_PROCESSES", "1"))
+WORKER_CLAIM_IDLE_MS = 60000 # pending entries idle this long belong to a dead worker
+WORKER_QUEUE_DEPTH = 4 # batches buffered between pipeline stages (read -> encode -> write)
+
+# Adaptive batching: small, fast batches when quiet; large ones during floods
+WORKER_INITIAL_BATCH = 100
+WORKER_MIN_BATCH = 20
+WORKER_MAX_BATCH = 1000
+WORKER_TARGET_BATCH_SECONDS = 0.5 # per-batch latency target when the backlog is small
+WORKER_FLOOD_BATCH_SECONDS = 3.0 # per-batch latency allowed while flooding
+WORKER_FLOOD_LAG = 5000 # unpersisted entries at which we switch to throughput mode
+ENCODE_TOKEN_BUDGET = 4096 # padded tokens per encode call (rows x longest row)
+ENCODE_TOKEN_BUDGET_FLOOD = 16384
+
+# --- EMBEDDINGS ---
+# Backend for all-MiniLM-L6-v2: 'fp32' (PyTorch reference), 'int8' (dynamic
+# quantization) or 'onnx' (ONNX Runtime). Check parity first with
+# scripts/benchmark_embeddings.py.
+EMBEDDING_BACKEND = os.environ.get("SENTINEL_EMBEDDING_BACKEND", "fp32")
+EMBEDDING_ONNX_FILE = None # e.g. "onnx/model_qint8_avx512.onnx"
+EMBEDDING_MIN_PARITY = 0.99 # min cosine vs fp32 for a backend to be considered safe
+
+# --- EMBEDDING CACHE (keyed by text_hash) ---
+EMBEDDING_CACHE_MAX_BYTES = 64 * 1024 * 1024 # in-process LRU, ~40k vectors of 384 floats
+EMBEDDING_CACHE_TTL = 24 * 3600 # seconds a vector lives in Redis
+
+# --- STREAM RETENTION & BACKPRESSURE ---
+STREAM_MAXLEN = 500000 # hard cap per stream (approximate MAXLEN on XADD)
+STREAM_TRIM_SECONDS = 60 # how often workers trim entries every group has persisted
+STREAM_LAG_HIGH_WATERMARK = 20000 # unpersisted entries at which producers slow down
+STREAM_LAG_LOW_WATERMARK = 5000 # ...and below which spilled files are fed back
+PRODUCER_MAX_WAIT_SECONDS = 30 # how long a producer throttles before spilling to disk
+
 # --- POSTGRES CONFIG ---
 PG_HOST = "localhost"
 PG_PORT = "5433"
@@ -26,6 +66,81 @@ DEFAULT_SEARCH_QUERY = "Virat Kohli"
 VELOCITY_ALERT_THRESHOLD = 10 # tweets per minute to trigger alert
 SENTIMENT_ALERT_THRESHOLD = -0.5 # significantly negative
 
+# --- NARRATIVE CLUSTERING (incremental) ---
+NARRATIVE_BATCH_LIMIT = 5000 # newest unassigned leftovers HDBSCAN clusters per run
+NARRATIVE_ASSIGN_CHUNK_ROWS = 20000 # newly ingested rows matched to centroids per query
+NARRATIVE_INGEST_OVERLAP_SECONDS = 60 # re-read behind the ingest high-water mark (worker transactions still open at the cut)
+NARRATIVE_RECLUSTER_MIN_LEFTOVERS = 200 # new unmatched tweets needed before HDBSCAN runs again
+NARRATIVE_BUFFER_HOURS = 6 # clustering window by tweet time; unassigned tweets older than this become noise (-1)
+NARRATIVE_MIN_CLUSTER_SIZE = 5
+NARRATIVE_MIN_SAMPLES = 3
+NARRATIVE_RADIUS_PERCENTILE = 90 # of member distances to the centroid
+NARRATIVE_MIN_RADIUS = 0.15 # cosine distance
+NARRATIVE_MAX_RADIUS = 0.35
+NARRATIVE_SPIKE_VELOCITY = 3.0 # spike-window rate vs baseline rate
+NARRATIVE_SPIKE_MIN_RATE = 5 # tweets/hour over the spike window, below this is noise
+NARRATIVE_SPIKE_WINDOW_MINUTES = 60 # current rate is measured over this many minutes (max 60)
+NARRATIVE_BASELINE_HOURS = 24 # baseline rate is measured over this many hours
+NARRATIVE_API_HOURS = 24 # /api/narratives lists narratives seen within this window
+# Optional reduction of embeddings before HDBSCAN: 'pca', 'random' or 'none'
+NARRATIVE_REDUCER = os.getenv("SENTINEL_NARRATIVE_REDUCER", "pca")
+NARRATIVE_REDUCER_DIM = 32
+NARRATIVE_REDUCER_REFIT_HOURS = 24
+NARRATIVE_REDUCER_FIT_SAMPLES = 20000 # recent embeddings the reducer is fitted on
+NARRATIVE_REDUCER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "models", "narrative_reducer.npz")
+
+# --- REAL-TIME RATE COUNTERS (Redis) ---
+# The worker counts tweets per narrative and per hashtag in minute/hour buckets;
+# the analyzer's monitor compares current vs baseline rate every few seconds.
+# Velocity threshold and baseline window are the NARRATIVE_SPIKE_* ones above.
+RATE_KEY_PREFIX = "rates"
+RATE_EVAL_SECONDS = 10
+RATE_WINDOW_MINUTES = 15 # current rate is measured over this many minutes
+RATE_MIN_RATE = 10 # tweets/hour over the window, below this is noise
+RATE_MIN_HISTORY_HOURS = 2 # entities first seen more recently have no baseline yet and never spike
+RATE_NARRATIVE_REFRESH_SECONDS = 60 # how often the worker reloads narrative centroids
+
+# --- STREAMING COPYPASTA DETECTION (worker) ---
+COPYPASTA_WINDOW_MINUTES = 10 # same text from 3+ users within this window is a cluster
+COPYPASTA_MAX_HASHES = 200000 # text hashes tracked per worker (memory bound)
+
+# --- COORDINATION CLUSTERS (persisted, merged across runs) ---
+COORDINATION_MERGE_HOURS = 24 # detections merge into clusters last seen within this window
+COORDINATION_MERGE_USER_OVERLAP = 0.5 # share of the smaller user set two clusters must have in common
+COORDINATION_MAX_TWEET_IDS = 2000 # tweet ids kept per cluster (latest); tweet_count keeps the total
+
+# --- STREAMING SEMANTIC COORDINATION (worker, random-hyperplane LSH) ---
+SEMANTIC_STREAM_WINDOW_MINUTES = 10
+SEMANTIC_STREAM_THRESHOLD = 0.85 # cosine, verified exactly on the LSH candidates
+SEMANTIC_LSH_BANDS = 20 # 20 bands x 12 bits: ~87% recall at cosine 0.85, few random candidates
+SEMANTIC_LSH_BITS = 12
+SEMANTIC_LSH_DIM = 384 # embedding dimension (all-MiniLM-L6-v2)
+SEMANTIC_LSH_SEED = 1729 # hyperplanes must be the same in every worker
+SEMANTIC_LSH_MAX_BUCKET = 256 # most recent entries kept per bucket
+
+# --- CO-POSTING SYNCHRONY (SynchronyDetector) ---
+SYNC_BUCKET_SECONDS = 10 # posts in the same or adjacent bucket count as simultaneous
+SYNC_MIN_CO_POSTS = 3 # simultaneous buckets before a pair is reported
+SYNC_MAX_BUCKET_USERS = 500 # busier buckets (everyone reacting to one event) are ignored
+SYNC_BLOCK_PAIRS = 2 ** 24 # candidate pairs per block of users, bounds peak memory
+
+# --- COMMUNITY GRAPH (app/detection/community.py) ---
+GRAPH_WINDOW_HOURS = 24 # users, mentions and posts seen within this window make the graph
+
+# --- SIMILARITY KERNEL (app/detection/similarity.py) ---
+SIMILARITY_BLOCK_ELEMENTS = 2 ** 24 # scores per row block (float32: 64 MB), bounds peak memory
+SIMILARITY_MAX_NEIGHBOURS = 200 # per tweet in semantic coordination
+
+# --- VECTOR INDEX (pgvector HNSW on tweets.embedding) ---
+VECTOR_HNSW_M = 16
+VECTOR_HNSW_EF_CONSTRUCTION = 64
+VECTOR_EF_SEARCH = 64 # candidates per query; raised to k when k is larger
+VECTOR_ITERATIVE_SCAN = True # needs pgvector >= 0.8, keeps time-filtered queries from returning < k rows
+
+# --- NEAR-DUPLICATE FINGERPRINTS (SimHash) ---
+SIMHASH_MAX_DISTANCE = 5 # differing bits still counted as the same copypasta
+SIMHASH_BANDS = 6 # must be > SIMHASH_MAX_DISTANCE so near matches share a band
+
 # --- SMART SCHEDULE BUCKETS ---
 KEYWORD_BUCKETS = {
     "Entity: Jio": {
@@ -5,6 +5,7 @@ import json
 import time
 from datetime import datetime
 import config
+from app.services.stream_consumer import LagMonitor, xadd_capped
 
 class SentinelDB:
     def __init__(self):
@@ -17,6 +18,7 @@ class SentinelDB:
                 decode_responses=True
             )
             self.redis.ping() # Check connection
+            self.lag_monitor = LagMonitor(self.redis)
             print("[OK] Connected to Redis (The Nerve Center)")
         except redis.ConnectionError:
             print("[ERROR] Redis Connection Failed! Ensure Docker/Redis is running on port 6379.")
@@ -77,8 +79,9 @@ class SentinelDB:
         # 1. Add to Dupe Set
         self.redis.sadd(config.REDIS_DUPE_SET_KEY, tweet_data['tweet_id'])
         
-        # 2. Add to Stream
-        self.redis.xadd(config.REDIS_STREAM_KEY, tweet_data)
+        # 2. Add to Stream (throttled while the workers are behind)
+        self.lag_monitor.wait_for_capacity(max_wait=float('inf'))
+        xadd_capped(self.redis, config.REDIS_STREAM_KEY, tweet_data)
 
     # --- POSTGRES OPERATIONS (COLD PATH) ---
 
@@ -2,8 +2,10 @@ import os
 import json
 import redis
 import config
+from app.services.stream_consumer import LagMonitor, xadd_capped
 
 r = redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB, decode_responses=True)
+lag_monitor = LagMonitor(r)
 path = os.path.join('data', 'raw_json')
 
 for filename in os.listdir(path):
@@ -29,5 +31,6 @@ for filename in os.listdir(path):
                 for item in data:
                     item['layer'] = layer
                     payload = {k: str(v) for k, v in item.items()}
-                    r.xadd(stream_key, payload)
+                    lag_monitor.wait_for_capacity(max_wait=float('inf'))
+                    xadd_capped(r, stream_key, payload)
                 print(f"Ingested {len(data)} items from {filename} -> {stream_key}")
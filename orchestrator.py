@@ -4,11 +4,20 @@ import time
 import sys
 import os
 import signal
+import socket
+import config
+
+# Workers share one Redis consumer group, so we can run several side by side.
+# Consumer names include the hostname so orchestrators on other hosts don't collide.
+WORKERS = [
+    {"name": f"WORKER-{i}", "command": [sys.executable, "app/worker.py", "--consumer", f"{socket.gethostname()}-worker-{i}"]}
+    for i in range(config.WORKER_PROCESSES)
+]
 
 # List of services to run
 SERVICES = [
     {"name": "INGEST", "command": [sys.executable, "scripts/ingest.py"]},
-    {"name": "WORKER", "command": [sys.executable, "app/worker.py"]},
+    *WORKERS,
     {"name": "ANALYZER", "command": [sys.executable, "app/services/analyzer.py"]},
     {"name": "SQUAD", "command": [sys.executable, "run_squad.py"]},
 ]
@@ -0,0 +1,62 @@
+"""
+Micro-benchmark of the cleaning step: per-tweet clean_tweet vs clean_batch.
+
+Usage: python scripts/benchmark_cleaner.py [--samples 50000] [--repeat 3]
+
+Prints tweets/sec for both paths and checks that they produce the same output.
+"""
+import argparse
+import random
+import time
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.cleaner import clean_tweet, clean_batch
+
+def make_tweets(samples):
+    words = "jio outage scam alert virat kohli rcb protest fiber down network refund fraud breaking news india 🚀 🔥".split()
+    rng = random.Random(42)
+    tweets = []
+    for i in range(samples):
+        parts = [rng.choice(words) for _ in range(rng.randint(5, 30))]
+        if rng.random() < 0.5:
+            parts.append(f"#{rng.choice(words)}")
+        if rng.random() < 0.3:
+            parts.append(f"@user{rng.randint(1, 500)}")
+        if rng.random() < 0.2:
+            parts.append(f"https://t.co/{rng.randint(10000, 99999)}")
+        tweets.append({
+            'tweet_id': str(i),
+            'handle': f"user{rng.randint(1, 500)}",
+            'text_raw': "  ".join(parts),
+            'timestamp_absolute': f"2025-01-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00.000Z"
+        })
+    return tweets
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--samples", type=int, default=50000)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    tweets = make_tweets(args.samples)
+    assert [clean_tweet(t) for t in tweets] == clean_batch(tweets), "clean_batch output differs from clean_tweet"
+
+    before = best_of(lambda: [clean_tweet(t) for t in tweets], args.repeat)
+    after = best_of(lambda: clean_batch(tweets), args.repeat)
+
+    print(f"[BENCH] clean_tweet : {args.samples / before:>10.0f} tweets/sec")
+    print(f"[BENCH] clean_batch : {args.samples / after:>10.0f} tweets/sec ({before / after:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmarks the HDBSCAN stage of narrative clustering with and without the
+embedding reducer.
+
+Usage: python scripts/benchmark_clustering.py [--sizes 5000,20000,100000] [--reducers none,pca,random] [--dim 32]
+
+For each window size prints wall time per reducer and cluster agreement
+(adjusted Rand index) against the unreduced run and against the generating
+topics. Unreduced HDBSCAN is quadratic in high dimension, so it is skipped
+above --max-raw; larger windows are then scored against the topics only.
+Uses embeddings from Postgres when there are enough, synthetic topics otherwise.
+"""
+import argparse
+import time
+import numpy as np
+import os
+import sys
+from sklearn.cluster import HDBSCAN
+from sklearn.metrics import adjusted_rand_score
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from app.detection.clustering import EmbeddingReducer
+from app.services.embeddings import EMBEDDING_DIM
+
+def synthetic_embeddings(n, topics=50, noise_share=0.3, seed=42):
+    """Normalized tweets around random topic directions plus unrelated noise; returns (X, topic labels)."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(topics, EMBEDDING_DIM))
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+
+    n_noise = int(n * noise_share)
+    truth = np.concatenate([rng.integers(0, topics, n - n_noise), np.full(n_noise, -1)])
+    X = rng.normal(0, 0.035, size=(n, EMBEDDING_DIM)) # ~0.7 cosine to the topic
+    X[truth >= 0] += centers[truth[truth >= 0]]
+    X[truth < 0] = rng.normal(size=(n_noise, EMBEDDING_DIM))
+    X /= np.linalg.norm(X, axis=1, keepdims=True)
+    return X.astype(np.float32), truth
+
+def load_window(n):
+    try:
+        from sqlalchemy.orm import sessionmaker
+        from app.models import engine
+        from app.repository import load_embeddings
+        session = sessionmaker(bind=engine)()
+        try:
+            vectors = load_embeddings(session, limit=n).vectors
+        finally:
+            session.close()
+        if len(vectors) >= n:
+            print(f"[BENCH] Using {n} tweets from Postgres.")
+            return vectors, None
+    except Exception as e:
+        print(f"[BENCH] Postgres unavailable ({e}), using synthetic topics.")
+    return synthetic_embeddings(n)
+
+def run_hdbscan(points):
+    start = time.perf_counter()
+    labels = HDBSCAN(min_cluster_size=config.NARRATIVE_MIN_CLUSTER_SIZE, min_samples=config.NARRATIVE_MIN_SAMPLES,
+                     metric='euclidean', allow_single_cluster=True).fit_predict(points)
+    return labels, time.perf_counter() - start
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--sizes", default="5000,20000,100000")
+    arg_parser.add_argument("--reducers", default="none,pca,random")
+    arg_parser.add_argument("--dim", type=int, default=config.NARRATIVE_REDUCER_DIM)
+    arg_parser.add_argument("--max-raw", type=int, default=20000, help="largest window clustered without reduction")
+    args = arg_parser.parse_args()
+
+    print(f"{'tweets':>8} {'reducer':>8} {'fit s':>7} {'hdbscan s':>10} {'clusters':>9} {'ARI vs none':>12} {'ARI vs topics':>14}")
+    for n in [int(x) for x in args.sizes.split(',')]:
+        X, truth = load_window(n)
+        baseline = None
+        for kind in args.reducers.split(','):
+            if kind == 'none' and n > args.max_raw:
+                print(f"{n:>8} {kind:>8} {'skipped (--max-raw)':>30}")
+                continue
+
+            fit_secs = 0.0
+            points = X
+            if kind != 'none':
+                start = time.perf_counter()
+                reducer = EmbeddingReducer.fit(kind, X[:config.NARRATIVE_REDUCER_FIT_SAMPLES], args.dim)
+                points = reducer.transform(X)
+                fit_secs = time.perf_counter() - start
+
+            labels, secs = run_hdbscan(points)
+            if kind == 'none':
+                baseline = labels
+            vs_none = f"{adjusted_rand_score(baseline, labels):.3f}" if baseline is not None else "-"
+            vs_truth = f"{adjusted_rand_score(truth, labels):.3f}" if truth is not None else "-"
+            n_clusters = len(set(labels) - {-1})
+            print(f"{n:>8} {kind:>8} {fit_secs:>7.2f} {secs:>10.2f} {n_clusters:>9} {vs_none:>12} {vs_truth:>14}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Compares embedding backends against the fp32 reference.
+
+Usage: python scripts/benchmark_embeddings.py [--backends fp32,int8,onnx] [--samples 1000]
+
+For each backend prints throughput (texts/sec) and cosine drift vs fp32. A backend
+is safe for the worker when min cosine stays above EMBEDDING_MIN_PARITY and almost
+no pairs flip across the coordination similarity threshold.
+"""
+import argparse
+import random
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from app.services.embeddings import get_backend, cosine_drift, benchmark
+
+def load_texts(samples):
+    try:
+        from sqlalchemy import text
+        from app.models import engine
+        with engine.connect() as conn:
+            rows = conn.execute(text("SELECT text_clean FROM tweets WHERE text_clean IS NOT NULL LIMIT :n"), {'n': samples}).fetchall()
+        texts = [r[0] for r in rows if r[0]]
+        if texts:
+            print(f"[BENCH] Using {len(texts)} tweets from Postgres.")
+            return texts
+    except Exception as e:
+        print(f"[BENCH] Postgres unavailable ({e}), using synthetic texts.")
+
+    words = "jio outage scam alert virat kohli rcb protest fiber down network refund fraud breaking news india".split()
+    rng = random.Random(42)
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(5, 40))) for _ in range(samples)]
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--backends", default="fp32,int8,onnx")
+    arg_parser.add_argument("--samples", type=int, default=1000)
+    arg_parser.add_argument("--batch-size", type=int, default=32)
+    args = arg_parser.parse_args()
+
+    texts = load_texts(args.samples)
+    reference_backend = get_backend('fp32')
+    reference = reference_backend.encode(texts, batch_size=args.batch_size)
+
+    print(f"{'backend':<8} {'texts/s':>10} {'mean cos':>9} {'min cos':>9} {'flips':>8}  verdict")
+    for name in args.backends.split(','):
+        try:
+            backend = reference_backend if name == 'fp32' else get_backend(name)
+        except Exception as e:
+            print(f"{name:<8} unavailable: {e}")
+            continue
+
+        throughput = benchmark(backend, texts, batch_size=args.batch_size)
+        drift = cosine_drift(reference, backend.encode(texts, batch_size=args.batch_size))
+        ok = drift['min_cosine'] >= config.EMBEDDING_MIN_PARITY
+        print(f"{name:<8} {throughput:>10.1f} {drift['mean_cosine']:>9.4f} {drift['min_cosine']:>9.4f} {drift['flip_rate']:>8.4%}  {'OK' if ok else 'DRIFT'}")
+
+if __name__ == "__main__":
+    main()
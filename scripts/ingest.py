@@ -9,10 +9,15 @@ from watchdog.events import FileSystemEventHandler
 # Add project root to path to import config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
+from app.services.stream_consumer import LagMonitor, xadd_capped
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SPILL_DIR = os.path.join(PROJECT_ROOT, 'data', 'spill')
 
 class JSONHandler(FileSystemEventHandler):
     def __init__(self, r):
         self.redis = r
+        self.lag_monitor = LagMonitor(r)
 
     def on_created(self, event):
         if event.is_directory:
@@ -48,6 +53,13 @@ class JSONHandler(FileSystemEventHandler):
                 os.rename(file_path, os.path.join(error_dir, filename))
                 return
 
+            # Backpressure: wait for the workers, then spill the file to disk if they stay behind
+            if not self.lag_monitor.wait_for_capacity():
+                os.makedirs(SPILL_DIR, exist_ok=True)
+                os.rename(file_path, os.path.join(SPILL_DIR, os.path.basename(file_path)))
+                print(f"[INGEST] Workers still lagging, spilled {filename} to {SPILL_DIR}.")
+                return
+
             # Determine Layer Stream
             if 'micro' in filename:
                 stream_key = config.REDIS_STREAM_MICRO
@@ -76,7 +88,7 @@ class JSONHandler(FileSystemEventHandler):
 
                 # Push to Redis Stream
                 payload = {k: str(v) for k, v in item.items()}
-                self.redis.xadd(stream_key, payload)
+                xadd_capped(self.redis, stream_key, payload)
                 count += 1
 
             print(f"[INGEST] ({layer}) Pushed {count} tweets from {filename} to Redis.")
@@ -91,6 +103,16 @@ class JSONHandler(FileSystemEventHandler):
             except Exception as move_err:
                 print(f"[CRITICAL] Could not move failed file: {move_err}")
 
+def feed_spilled_files(watch_path, lag_monitor):
+    """Moves one spilled file back into the watched folder once the workers have caught up."""
+    if not os.path.isdir(SPILL_DIR) or not lag_monitor.drained():
+        return
+    for filename in sorted(os.listdir(SPILL_DIR)):
+        if filename.endswith('.json'):
+            os.rename(os.path.join(SPILL_DIR, filename), os.path.join(watch_path, filename))
+            print(f"[INGEST] Lag drained, re-queued spilled file {filename}.")
+            return
+
 def start_ingester():
     # Connect to Redis
     r = redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB, decode_responses=True)
@@ -115,6 +137,7 @@ def start_ingester():
     try:
         while True:
             time.sleep(1)
+            feed_spilled_files(path, event_handler.lag_monitor)
     except KeyboardInterrupt:
         observer.stop()
     observer.join()
@@ -0,0 +1,56 @@
+"""
+Lists or replays dead-lettered messages from the tweets:dlq stream.
+
+Usage:
+    python scripts/replay_dlq.py                      # list what is in the DLQ
+    python scripts/replay_dlq.py --replay             # push everything back to its source stream
+    python scripts/replay_dlq.py --replay --match "DataError" --count 100
+
+Replayed entries are re-added to their original stream (original fields only)
+and deleted from the DLQ, so the worker processes them like new messages.
+"""
+import argparse
+import os
+import sys
+import redis
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+def original_payload(data):
+    return {k: v for k, v in data.items() if not k.startswith('_')}
+
+def replay_dlq(r, count=None, match=None, replay=False):
+    replayed = 0
+    seen = 0
+    for msg_id, data in r.xrange(config.REDIS_DLQ_STREAM, count=count):
+        error = data.get('_error', '')
+        if match and match not in error:
+            continue
+        seen += 1
+        source = data.get('_source_stream') or config.REDIS_STREAM_KEY
+        print(f"[DLQ] {msg_id} tweet={data.get('tweet_id', '?')} from {source}: {error}")
+
+        if replay:
+            pipe = r.pipeline()
+            pipe.xadd(source, original_payload(data), maxlen=config.STREAM_MAXLEN, approximate=True)
+            pipe.xdel(config.REDIS_DLQ_STREAM, msg_id)
+            pipe.execute()
+            replayed += 1
+
+    print(f"[DLQ] {seen} matching entries, {replayed} replayed.")
+    return replayed
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--replay", action="store_true", help="re-add entries to their source stream and remove them from the DLQ")
+    arg_parser.add_argument("--match", help="only entries whose error contains this text")
+    arg_parser.add_argument("--count", type=int, help="max entries to scan")
+    args = arg_parser.parse_args()
+
+    r = redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB, decode_responses=True)
+    replay_dlq(r, count=args.count, match=args.match, replay=args.replay)
+
+if __name__ == "__main__":
+    main()
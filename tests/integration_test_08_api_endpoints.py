@@ -15,13 +15,13 @@ import unittest
 import os
 import sys
 from fastapi.testclient import TestClient
-from datetime import datetime
+from datetime import datetime, timezone
 
 # Add project root to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.main import app
-from app.models import engine, User, Tweet
+from app.models import engine, User, Tweet, Narrative
 from sqlalchemy.orm import sessionmaker
 
 class TestAPIEndpointsIntegration(unittest.TestCase):
@@ -42,6 +42,7 @@ class TestAPIEndpointsIntegration(unittest.TestCase):
         """Clean up after each test."""
         self.session.query(Tweet).filter(Tweet.tweet_id.like(f"{self.test_prefix}%")).delete()
         self.session.query(User).filter(User.user_id.like(f"{self.test_prefix}%")).delete()
+        self.session.query(Narrative).filter(Narrative.narrative_id.in_([888, 777])).delete()
         self.session.commit()
         self.session.close()
 
@@ -56,6 +57,10 @@ class TestAPIEndpointsIntegration(unittest.TestCase):
             timestamp_absolute=datetime.now()
         )
         self.session.add(t)
+        # Stats row the clustering job would maintain
+        now = datetime.now(timezone.utc)
+        self.session.merge(Narrative(narrative_id=888, tweet_count=1, unique_users=1, first_seen=now, last_seen=now,
+                                     representative_text="Narrative tweet"))
         self.session.commit()
         
         response = self.client.get("/api/narratives")
@@ -114,6 +119,9 @@ class TestAPIEndpointsIntegration(unittest.TestCase):
              user = User(user_id=f"{self.test_prefix}_adv_u{i}", handle=f"adv_u{i}", bot_score=0.8)
              self.session.merge(user)
              self.session.add(t)
+        now = datetime.now(timezone.utc)
+        self.session.merge(Narrative(narrative_id=nid, tweet_count=5, unique_users=5, first_seen=now, last_seen=now,
+                                     representative_text="Coordinated narrative content"))
         self.session.commit()
         
         response = self.client.get(f"/api/narratives/{nid}/advice")
@@ -0,0 +1,62 @@
+import unittest
+from unittest.mock import MagicMock
+import numpy as np
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from app.services.batching import AdaptiveBatchSizer
+from app.services.embeddings import EmbeddingBackend, length_buckets, estimate_tokens
+
+class TestAdaptiveBatchSizer(unittest.TestCase):
+    def test_initial_count(self):
+        sizer = AdaptiveBatchSizer()
+        self.assertEqual(sizer.read_count(), config.WORKER_INITIAL_BATCH)
+
+    def test_quiet_vs_flood(self):
+        """Same per-tweet cost: small batches when quiet, large ones during a flood."""
+        sizer = AdaptiveBatchSizer(min_count=10, max_count=5000, target_seconds=0.5, flood_target_seconds=5.0, flood_lag=1000)
+        sizer.observe(100, 1.0) # 10ms per tweet
+
+        sizer.update_lag(50)
+        self.assertEqual(sizer.read_count(), 50)
+        self.assertEqual(sizer.token_budget(), config.ENCODE_TOKEN_BUDGET)
+
+        sizer.update_lag(20000)
+        self.assertEqual(sizer.read_count(), 500)
+        self.assertEqual(sizer.token_budget(), config.ENCODE_TOKEN_BUDGET_FLOOD)
+
+    def test_count_is_clamped(self):
+        sizer = AdaptiveBatchSizer(min_count=10, max_count=200, target_seconds=1.0, flood_target_seconds=2.0, flood_lag=1000)
+        sizer.observe(10, 10.0) # very slow
+        self.assertEqual(sizer.read_count(), 10)
+        sizer.seconds_per_item = 1e-5 # very fast
+        self.assertEqual(sizer.read_count(), 200)
+
+class TestLengthBuckets(unittest.TestCase):
+    def test_buckets_cover_all_and_respect_budget(self):
+        texts = ["x" * n for n in [10, 400, 20, 800, 15, 30, 600, 5]]
+        buckets = length_buckets(texts, token_budget=200)
+
+        self.assertEqual(sorted(i for b in buckets for i in b), list(range(len(texts))))
+        for b in buckets:
+            longest = max(estimate_tokens(texts[i]) for i in b)
+            self.assertTrue(len(b) == 1 or longest * len(b) <= 200)
+        # Short texts share a bucket, long ones are split off
+        self.assertEqual(sorted(buckets[0]), [0, 2, 4, 5, 7])
+
+    def test_encode_bucketed_restores_order(self):
+        backend = EmbeddingBackend()
+        backend.dim = 2
+        backend.encode = MagicMock(side_effect=lambda texts, batch_size: np.array([[len(t), 0] for t in texts], dtype=np.float32))
+
+        texts = ["x" * n for n in [300, 4, 120, 8]]
+        out = backend.encode_bucketed(texts, token_budget=100)
+
+        np.testing.assert_array_equal(out[:, 0], [300, 4, 120, 8])
+        self.assertGreater(backend.encode.call_count, 1)
+
+if __name__ == "__main__":
+    unittest.main()
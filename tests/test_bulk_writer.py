@@ -0,0 +1,100 @@
+import unittest
+from unittest.mock import MagicMock
+from datetime import datetime
+import numpy as np
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import DataError, OperationalError
+from app.services.bulk_writer import build_rows, write_batch, write_with_bisect
+
+def make_processed(tweet_id, handle):
+    return {
+        'tweet_id': tweet_id, 'handle': handle, 'text_raw': 'hi', 'text_clean': 'hi',
+        'text_hash': 'h', 'simhash': 1, 'hashtags': [], 'mentions': [], 'urls': [],
+        'timestamp_absolute': datetime(2025, 1, 1)
+    }
+
+class TestBulkWriter(unittest.TestCase):
+    def test_build_rows_dedupes_and_sorts(self):
+        """Users are deduplicated within the batch and rows are sorted by key."""
+        items = [make_processed("t2", "bob"), make_processed("t1", "alice"), make_processed("t3", "bob")]
+        embeddings = np.arange(9, dtype=np.float32).reshape(3, 3)
+
+        user_rows, tweet_rows = build_rows(items, embeddings)
+
+        self.assertEqual([u['user_id'] for u in user_rows], ["alice", "bob"])
+        self.assertEqual([t['tweet_id'] for t in tweet_rows], ["t1", "t2", "t3"])
+        # Embeddings stay attached to their own tweet after sorting
+        np.testing.assert_array_equal(tweet_rows[0]['embedding'], embeddings[1])
+
+    def test_build_rows_records_embedding_backend(self):
+        """The backend is stored next to the embedding, and only when there is one."""
+        items = [dict(make_processed("t1", "alice"), embedding_backend='onnx'), dict(make_processed("t2", "bob"), embedding_backend='onnx')]
+
+        _, tweet_rows = build_rows(items, np.zeros((1, 3), dtype=np.float32))
+
+        self.assertEqual([t['embedding_backend'] for t in tweet_rows], ['onnx', None])
+
+    def test_write_batch_issues_one_upsert_per_table(self):
+        """A batch is two multi-row INSERT ... ON CONFLICT statements and one commit."""
+        session = MagicMock()
+        items = [make_processed(f"t{i}", f"user{i % 5}") for i in range(50)]
+        embeddings = np.zeros((50, 384), dtype=np.float32)
+
+        written, _ = write_batch(session, items, embeddings)
+
+        self.assertEqual(written, 50)
+        self.assertEqual(session.execute.call_count, 2)
+        session.commit.assert_called_once()
+
+        user_sql = str(session.execute.call_args_list[0][0][0].compile(dialect=postgresql.dialect()))
+        tweet_sql = str(session.execute.call_args_list[1][0][0].compile(dialect=postgresql.dialect()))
+        self.assertIn("ON CONFLICT (user_id) DO NOTHING", user_sql)
+        self.assertIn("ON CONFLICT (tweet_id) DO UPDATE", tweet_sql)
+        self.assertIn("embedding = excluded.embedding", tweet_sql)
+        self.assertNotIn("narrative_id", tweet_sql)
+
+class TestBisect(unittest.TestCase):
+    def make_session(self, bad_ids, transient=False):
+        """Session whose commit fails while any bad tweet is in the uncommitted statements."""
+        session = MagicMock()
+        state = {'rows': []}
+
+        def execute(stmt):
+            params = stmt.compile(dialect=postgresql.dialect()).params
+            state['rows'].extend(v for k, v in params.items() if k.startswith('tweet_id'))
+        def commit():
+            rows, state['rows'] = state['rows'], []
+            if any(r in bad_ids for r in rows):
+                if transient:
+                    raise OperationalError("stmt", {}, Exception("server closed the connection"))
+                raise DataError("stmt", {}, Exception("invalid input syntax"))
+        session.execute.side_effect = execute
+        session.commit.side_effect = commit
+        session.rollback.side_effect = lambda: state.update(rows=[])
+        return session
+
+    def test_bad_row_isolated(self):
+        """Only the poisoned row is lost; every other row of the batch lands."""
+        items = [make_processed(f"t{i}", "u") for i in range(8)]
+        embeddings = np.zeros((8, 3), dtype=np.float32)
+        poisoned = []
+        session = self.make_session({"t5"})
+
+        written = write_with_bisect(session, items, embeddings, lambda item, e: poisoned.append(item['tweet_id']))
+
+        self.assertEqual(written, 7)
+        self.assertEqual(poisoned, ["t5"])
+
+    def test_transient_error_not_bisected(self):
+        items = [make_processed(f"t{i}", "u") for i in range(4)]
+        session = self.make_session({"t1"}, transient=True)
+        with self.assertRaises(OperationalError):
+            write_with_bisect(session, items, np.zeros((4, 3)), lambda item, e: self.fail("no DLQ on transient errors"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,16 +1,23 @@
 import unittest
+import random
+import numpy as np
 from datetime import datetime, timedelta, timezone
 import os
 import sys
 
 # Add project root to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from app.detection.coordination import CoordinationDetector
+import config
+from unittest.mock import MagicMock, patch
+from app.detection.coordination import CoordinationDetector, StreamingCopypastaDetector, StreamingSemanticDetector, SynchronyDetector, merge_cluster, store_clusters
+from app.models import CoordinationCluster
+from app.services.fingerprint import simhash
 
 # Mock Tweet Object
 class MockTweet:
-    def __init__(self, tweet_id, user_id, text_hash, timestamp, embedding=None):
+    def __init__(self, tweet_id, user_id, text_hash, timestamp, embedding=None, simhash=None):
         self.tweet_id = tweet_id
+        self.simhash = simhash
         self.user_id = user_id
         self.text_hash = text_hash
         self.timestamp_absolute = timestamp
@@ -52,5 +59,238 @@ class TestCoordination(unittest.TestCase):
         clusters = detector.detect_coordination(tweets)
         self.assertEqual(len(clusters), 0)
 
+    def test_near_duplicate_coordination(self):
+        """Edited copies of a copypasta have different hashes but are grouped by SimHash."""
+        detector = CoordinationDetector(time_window_minutes=10)
+        base = "BREAKING: Jio network down across Mumbai and Pune, customers furious, refunds demanded now! Share this before they delete it"
+        variants = [base, base.replace("furious", "angry"), base + " ref 88213", base + " https://t.co/x1"]
+
+        base_time = datetime.now()
+        tweets = [
+            MockTweet(f"t{i}", f"u{i}", f"hash_{i}", base_time + timedelta(minutes=i), simhash=simhash(v))
+            for i, v in enumerate(variants)
+        ]
+        tweets.append(MockTweet("t9", "u9", "hash_9", base_time, simhash=simhash("Virat Kohli scores a century at Chinnaswamy tonight")))
+
+        clusters = detector.detect_coordination(tweets)
+
+        self.assertEqual(len(clusters), 1)
+        self.assertEqual(clusters[0]['type'], 'NEAR_DUPLICATE')
+        self.assertEqual(sorted(clusters[0]['tweet_ids']), ["t0", "t1", "t2", "t3"])
+
+class TestSemanticComponents(unittest.TestCase):
+    def make_tweets(self):
+        rng = np.random.default_rng(1)
+        base = datetime(2025, 1, 1)
+        topic = rng.normal(size=16)
+        # Paraphrases: a burst of 4 users, then the same topic again 2 hours later
+        tweets = [MockTweet(f"a{i}", f"u{i}", None, base + timedelta(minutes=i), embedding=topic + rng.normal(scale=0.05, size=16)) for i in range(4)]
+        tweets += [MockTweet(f"b{i}", f"v{i}", None, base + timedelta(hours=2, minutes=i), embedding=topic + rng.normal(scale=0.05, size=16)) for i in range(3)]
+        tweets += [MockTweet(f"n{i}", f"w{i}", None, base, embedding=rng.normal(size=16)) for i in range(20)]
+        return tweets
+
+    def test_components_split_into_bursts(self):
+        detector = CoordinationDetector(time_window_minutes=10)
+        clusters = detector.find_semantic_similarity(self.make_tweets())
+
+        self.assertEqual([c['tweet_ids'] for c in clusters], [["a0", "a1", "a2", "a3"], ["b0", "b1", "b2"]])
+        self.assertGreater(clusters[0]['avg_similarity'], 0.85)
+
+    def test_independent_of_input_order(self):
+        detector = CoordinationDetector(time_window_minutes=10)
+        tweets = self.make_tweets()
+        expected = detector.find_semantic_similarity(tweets)
+        random.Random(7).shuffle(tweets)
+        self.assertEqual(detector.find_semantic_similarity(tweets), expected)
+
+def detection(kind, text_hash, users, tweet_ids, start, minutes, similarity=None):
+    return {'type': kind, 'text_hash': text_hash, 'users': users, 'tweet_ids': tweet_ids,
+            'avg_similarity': similarity, 'sample_text': "sample text",
+            'first_seen': start, 'last_seen': start + timedelta(minutes=minutes)}
+
+class TestStoredClusters(unittest.TestCase):
+    def test_merge_unions_members_and_widens_span(self):
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        row = merge_cluster(CoordinationCluster(tweet_count=0), detection('EXACT_MATCH', "h1", ["u1", "u2", "u3"], ["t1", "t2", "t3"], start, 5))
+        merge_cluster(row, detection('SEMANTIC_SIMILARITY', None, ["u3", "u4", None], ["t3", "t4"], start + timedelta(hours=1), 2, similarity=0.9))
+
+        self.assertEqual(row.users, ["u1", "u2", "u3", "u4"])
+        self.assertEqual((row.user_count, row.tweet_count), (4, 4))
+        self.assertEqual(row.text_hashes, ["h1"])
+        self.assertEqual(row.cluster_type, 'SEMANTIC_SIMILARITY')
+        self.assertEqual(row.time_span_seconds, 62 * 60)
+
+    def test_store_merges_instead_of_duplicating(self):
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        existing = merge_cluster(CoordinationCluster(cluster_id=1, tweet_count=0), detection('EXACT_MATCH', "h1", ["u1", "u2", "u3"], ["t1", "t2", "t3"], start, 5))
+        session = MagicMock()
+        session.query.return_value.filter.return_value.order_by.return_value.with_for_update.return_value.all.side_effect = [[existing], []]
+        session.query.return_value.filter.return_value.all.return_value = [("t5", 7), ("t9", 8)]
+        existing.narrative_ids = [3]
+
+        new, merged = store_clusters(session, [
+            detection('EXACT_MATCH', "h1", ["u5", "u6", "u7"], ["t5", "t6", "t7"], start, 1), # same copypasta later on
+            detection('EXACT_MATCH', "h2", ["u8", "u9", "u10"], ["t8", "t9", "t10"], start, 1),
+        ], now=start)
+
+        self.assertEqual((new, merged), (1, 1))
+        self.assertEqual(existing.tweet_count, 6)
+        self.assertEqual(existing.narrative_ids, [3, 7])
+        self.assertEqual(session.add.call_args[0][0].narrative_ids, [8])
+        session.delete.assert_not_called()
+        # Concurrent callers are serialized, and only this call's tweets are looked up
+        self.assertIn("pg_advisory_xact_lock", str(session.execute.call_args_list[0][0][0]))
+        looked_up = session.query.return_value.filter.call_args_list[-1][0][0].right.value
+        self.assertEqual(sorted(looked_up), ["t10", "t5", "t6", "t7", "t8", "t9"])
+
+    def test_tweet_ids_capped(self):
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        with patch.object(config, 'COORDINATION_MAX_TWEET_IDS', 4):
+            row = merge_cluster(CoordinationCluster(tweet_count=0), detection('EXACT_MATCH', "h1", ["u1"], ["t1", "t2", "t3"], start, 5))
+            merge_cluster(row, detection('EXACT_MATCH', "h1", ["u2"], ["t3", "t4", "t5"], start, 6))
+            # A folded cluster whose ids were already capped brings its full count
+            merge_cluster(row, {**detection('EXACT_MATCH', "h1", ["u3"], ["t6"], start, 7), 'tweet_count': 10})
+
+        self.assertEqual(row.tweet_ids, ["t3", "t4", "t5", "t6"])
+        self.assertEqual(row.tweet_count, 15)
+
+class TestSynchrony(unittest.TestCase):
+    def test_finds_accounts_posting_together(self):
+        rng = np.random.default_rng(3)
+        # 5 accounts posting within ~3s of each other at 6 moments, 200 independent ones
+        moments = rng.uniform(0, 6 * 3600, size=6)
+        users = [f"s{k}" for k in range(5) for _ in moments]
+        times = [m + rng.uniform(0, 3) for k in range(5) for m in moments]
+        users += [f"u{k}" for k in range(200) for _ in range(6)]
+        times += list(rng.uniform(0, 6 * 3600, size=200 * 6))
+
+        detector = SynchronyDetector(bucket_seconds=10, min_co_posts=3, max_bucket_users=500)
+        users_a, users_b, counts, weights = detector.find_pairs(users, times)
+
+        pairs = set(zip(users_a.tolist(), users_b.tolist()))
+        self.assertEqual({p for p in pairs if p[0].startswith("s")}, {(f"s{i}", f"s{j}") for i in range(5) for j in range(i + 1, 5)})
+        self.assertTrue(all(a < b for a, b in pairs))
+        self.assertTrue((weights[np.char.startswith(users_a.astype(str), "s")] >= 0.9).all())
+
+    def test_crowded_buckets_ignored(self):
+        """Everyone reacting to the same moment is not synchrony."""
+        users = [f"u{k}" for k in range(50) for _ in range(3)]
+        times = [t * 3600.0 for k in range(50) for t in range(3)]
+        detector = SynchronyDetector(bucket_seconds=10, min_co_posts=3, max_bucket_users=20)
+        self.assertEqual(len(detector.find_pairs(users, times)[0]), 0)
+        detector = SynchronyDetector(bucket_seconds=10, min_co_posts=3, max_bucket_users=100)
+        self.assertEqual(len(detector.find_pairs(users, times)[0]), 50 * 49 // 2)
+
+class TestStreamingCopypasta(unittest.TestCase):
+    def test_emits_on_third_distinct_user(self):
+        detector = StreamingCopypastaDetector(time_window_minutes=10)
+        base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+        self.assertIsNone(detector.add("h1", "u1", base, "t1"))
+        self.assertIsNone(detector.add("h1", "u1", base + timedelta(minutes=1), "t2")) # same user again
+        self.assertIsNone(detector.add("h1", "u2", base + timedelta(minutes=2), "t3"))
+        cluster = detector.add("h1", "u3", base + timedelta(minutes=3), "t4")
+
+        self.assertEqual(cluster['type'], 'EXACT_MATCH')
+        self.assertEqual(sorted(cluster['users']), ["u1", "u2", "u3"])
+        self.assertEqual(cluster['tweet_ids'], ["t1", "t2", "t3", "t4"])
+        # The same burst is reported once
+        self.assertIsNone(detector.add("h1", "u4", base + timedelta(minutes=4), "t5"))
+
+    def test_users_outside_window_do_not_count(self):
+        detector = StreamingCopypastaDetector(time_window_minutes=10)
+        base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        detector.add("h1", "u1", base)
+        detector.add("h1", "u2", base + timedelta(minutes=30))
+        self.assertIsNone(detector.add("h1", "u3", base + timedelta(minutes=60)))
+        # Late arrivals older than the window are ignored
+        self.assertIsNone(detector.add("h1", "u4", base + timedelta(minutes=5)))
+
+    def test_mixed_timestamps_in_batch(self):
+        """Naive timestamps count as UTC, aware ones in any zone are converted, None is skipped."""
+        base = datetime(2025, 1, 1, 12, 0)
+        items = [
+            {'text_hash': "h1", 'handle': "u1", 'tweet_id': "t1", 'timestamp_absolute': base},
+            {'text_hash': "h1", 'handle': "u2", 'tweet_id': "t2", 'timestamp_absolute': None},
+            {'text_hash': "h1", 'handle': "u3", 'tweet_id': "t3",
+             'timestamp_absolute': datetime(2025, 1, 1, 13, 1, tzinfo=timezone(timedelta(hours=1)))},
+            {'text_hash': "h1", 'handle': "u4", 'tweet_id': "t4", 'timestamp_absolute': base.replace(tzinfo=timezone.utc) + timedelta(minutes=2)},
+        ]
+        clusters = StreamingCopypastaDetector(time_window_minutes=10).add_batch(items)
+        self.assertEqual(len(clusters), 1)
+        self.assertEqual(clusters[0]['tweet_ids'], ["t1", "t3", "t4"])
+        self.assertEqual(clusters[0]['first_seen'], base.replace(tzinfo=timezone.utc))
+
+    def test_memory_evicted_by_time(self):
+        detector = StreamingCopypastaDetector(time_window_minutes=10, max_hashes=1000)
+        base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        for i in range(5000):
+            detector.add(f"h{i}", f"u{i}", base + timedelta(seconds=i))
+        # Only the last 10 minutes of hashes survive, within max_hashes
+        self.assertLessEqual(len(detector.windows), 601)
+        self.assertIn("h4999", detector.windows)
+
+        detector = StreamingCopypastaDetector(time_window_minutes=10, max_hashes=100)
+        for i in range(500):
+            detector.add(f"h{i}", "u", base)
+        self.assertEqual(len(detector.windows), 100)
+
+def paraphrase_items(n_noise=2000, seed=5):
+    """5 paraphrases (cosine ~0.95 to each other) from 5 accounts among unrelated tweets, one per second."""
+    rng = np.random.default_rng(seed)
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    vectors = rng.normal(size=(n_noise + 5, 64)).astype(np.float32)
+    vectors[n_noise:] = vectors[n_noise] + rng.normal(scale=0.2, size=(5, 64))
+    items = [{'tweet_id': f"t{i}", 'handle': f"u{i}", 'text_hash': f"h{i}", 'text_clean': f"text {i}",
+              'timestamp_absolute': base + timedelta(seconds=i)} for i in range(n_noise + 5)]
+    return items, vectors
+
+class TestStreamingSemantic(unittest.TestCase):
+    def make_detector(self, **kwargs):
+        return StreamingSemanticDetector(time_window_minutes=60, similarity_threshold=0.85, dim=64, seed=1, **kwargs)
+
+    def test_finds_paraphrase_burst(self):
+        items, vectors = paraphrase_items()
+        clusters = self.make_detector().add_batch(items, vectors)
+
+        self.assertEqual(len(clusters), 1) # reported once, not on every later paraphrase
+        cluster = clusters[0]
+        self.assertEqual(cluster['type'], 'SEMANTIC_SIMILARITY')
+        self.assertEqual(cluster['users'], ["u2000", "u2001", "u2002"])
+        self.assertEqual(cluster['tweet_ids'], ["t2002", "t2000", "t2001"])
+        self.assertGreater(cluster['avg_similarity'], 0.85)
+
+    def test_candidates_are_a_small_fraction(self):
+        items, vectors = paraphrase_items()
+        detector = self.make_detector()
+        detector.add_batch(items[:-1], vectors[:-1])
+        unit = vectors[-1:] / np.linalg.norm(vectors[-1:])
+        signature = detector.signatures(unit)[0]
+        candidates = detector.candidates(signature, detector.slot(items[-1]['timestamp_absolute']))
+        self.assertLess(len(candidates), 200) # vs 2004 tweets in the window
+        self.assertTrue({"t2000", "t2001"} <= {detector.entries[e][2] for e in candidates})
+
+    def test_mixed_timestamps_in_batch(self):
+        items, vectors = paraphrase_items(n_noise=0)
+        items[0]['timestamp_absolute'] = items[0]['timestamp_absolute'].replace(tzinfo=None) # naive = UTC
+        items[3]['timestamp_absolute'] = None
+        clusters = self.make_detector().add_batch(items, vectors)
+        self.assertEqual(clusters[0]['users'], ["u0", "u1", "u2"])
+        self.assertEqual(clusters[0]['first_seen'].tzinfo, timezone.utc)
+
+    def test_exact_copies_and_old_tweets_skipped(self):
+        items, vectors = paraphrase_items(n_noise=0)
+        for item in items:
+            item['text_hash'] = "same" # copypasta, not paraphrase
+        self.assertEqual(self.make_detector().add_batch(items, vectors), [])
+
+        items, vectors = paraphrase_items(n_noise=0)
+        for k, item in enumerate(items):
+            item['timestamp_absolute'] += timedelta(hours=2 * k) # never within the window
+        detector = self.make_detector()
+        self.assertEqual(detector.add_batch(items, vectors), [])
+        self.assertEqual(len(detector.entries), 1)
+        self.assertLessEqual(len(detector.slot_keys), 2)
+
 if __name__ == "__main__":
     unittest.main()
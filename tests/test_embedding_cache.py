@@ -0,0 +1,77 @@
+import unittest
+from unittest.mock import MagicMock
+import numpy as np
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.embedding_cache import EmbeddingCache, ENTRY_OVERHEAD_BYTES
+
+def fake_encode(texts):
+    return np.array([[len(t), 1.0, 0.0] for t in texts], dtype=np.float32)
+
+class TestEmbeddingCache(unittest.TestCase):
+    def setUp(self):
+        self.mock_redis = MagicMock()
+        self.mock_redis.mget.side_effect = lambda keys: [None] * len(keys)
+
+    def test_copypasta_encoded_once(self):
+        """Repeated hashes in a batch hit the model once and later batches hit memory."""
+        cache = EmbeddingCache(r=self.mock_redis, max_bytes=10**6)
+        encode = MagicMock(side_effect=fake_encode)
+
+        out = cache.encode(["h1", "h1", "h2", "h1"], ["aa", "aa", "bbb", "aa"], encode)
+
+        self.assertEqual(out.shape, (4, 3))
+        self.assertEqual(out[0][0], 2.0)
+        self.assertEqual(out[2][0], 3.0)
+        encode.assert_called_once_with(["aa", "bbb"])
+        self.assertEqual(cache.counters['misses'], 2)
+
+        cache.encode(["h1", "h2"], ["aa", "bbb"], encode)
+        self.assertEqual(encode.call_count, 1)
+        self.assertEqual(cache.counters['memory_hits'], 2)
+
+    def test_redis_tier(self):
+        """Vectors cached by another worker come back from Redis."""
+        stored = np.array([9.0, 9.0, 9.0], dtype=np.float32).tobytes()
+        self.mock_redis.mget.side_effect = lambda keys: [stored if k.endswith(":h9") else None for k in keys]
+        cache = EmbeddingCache(r=self.mock_redis, max_bytes=10**6)
+        encode = MagicMock(side_effect=fake_encode)
+
+        out = cache.encode(["h9", "h1"], ["x", "yy"], encode)
+
+        np.testing.assert_array_equal(out[0], [9.0, 9.0, 9.0])
+        encode.assert_called_once_with(["yy"])
+        self.assertEqual(cache.stats()['redis_hits'], 1)
+        self.assertEqual(cache.stats()['hit_rate'], 0.5)
+
+    def test_postgres_tier_same_backend_only(self):
+        """Stored embeddings are reused only when the same backend wrote them."""
+        engine = MagicMock()
+        conn = engine.connect.return_value.__enter__.return_value
+        conn.execute.return_value.fetchall.return_value = [("h9", [9.0, 9.0, 9.0])]
+        cache = EmbeddingCache(r=self.mock_redis, max_bytes=10**6, engine=engine, backend='int8')
+        encode = MagicMock(side_effect=fake_encode)
+
+        out = cache.encode(["h9", "h1"], ["x", "yy"], encode)
+
+        np.testing.assert_array_equal(out[0], [9.0, 9.0, 9.0])
+        sql, params = conn.execute.call_args[0]
+        self.assertIn("embedding_backend = :backend", str(sql))
+        self.assertEqual(params['backend'], 'int8')
+        self.assertEqual(cache.stats()['postgres_hits'], 1)
+
+    def test_lru_bounded_by_bytes(self):
+        """The in-process tier evicts least recently used vectors beyond max_bytes."""
+        entry_size = 3 * 4 + ENTRY_OVERHEAD_BYTES
+        cache = EmbeddingCache(r=self.mock_redis, max_bytes=entry_size * 2)
+
+        cache.encode(["a", "b", "c"], ["1", "2", "3"], fake_encode)
+
+        self.assertEqual(list(cache._lru.keys()), ["b", "c"])
+        self.assertLessEqual(cache.stats()['bytes'], entry_size * 2)
+
+if __name__ == "__main__":
+    unittest.main()
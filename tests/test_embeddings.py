@@ -0,0 +1,33 @@
+import unittest
+import numpy as np
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.embeddings import cosine_drift, get_backend
+
+class TestEmbeddingParity(unittest.TestCase):
+    def test_identical_vectors_have_no_drift(self):
+        rng = np.random.default_rng(0)
+        ref = rng.normal(size=(20, 384))
+        drift = cosine_drift(ref, ref * 3.0) # scale does not matter for cosine
+        self.assertAlmostEqual(drift['mean_cosine'], 1.0, places=5)
+        self.assertAlmostEqual(drift['min_cosine'], 1.0, places=5)
+        self.assertEqual(drift['flip_rate'], 0.0)
+
+    def test_threshold_flips_are_counted(self):
+        """A pair crossing the coordination threshold counts as a flip."""
+        ref = np.array([[1.0, 0.0], [0.9, 0.1], [0.0, 1.0]])
+        cand = np.array([[1.0, 0.0], [0.5, 0.5], [0.0, 1.0]])
+        drift = cosine_drift(ref, cand, threshold=0.85)
+        # Pair (0,1) was > 0.85 in the reference and is ~0.71 in the candidate
+        self.assertAlmostEqual(drift['flip_rate'], 1 / 3)
+        self.assertLess(drift['min_cosine'], 0.99)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            get_backend('tpu')
+
+if __name__ == "__main__":
+    unittest.main()
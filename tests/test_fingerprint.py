@@ -0,0 +1,65 @@
+import unittest
+from unittest.mock import MagicMock
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.fingerprint import simhash, simhash_batch, hamming, band_values, band_sql, SimHashIndex, find_near_duplicates
+
+BASE = "BREAKING: Jio network down across Mumbai and Pune, customers furious, refunds demanded now! Share this before they delete it"
+
+class TestSimHash(unittest.TestCase):
+    def test_fits_bigint(self):
+        fps = simhash_batch([BASE, "short one", "🚀🚀", ""])
+        self.assertEqual(fps[0], simhash(BASE))
+        self.assertIsNone(fps[2]) # no words
+        self.assertIsNone(fps[3])
+        for fp in fps[:2]:
+            self.assertTrue(-2**63 <= fp < 2**63)
+
+    def test_near_duplicates_are_close(self):
+        fp = simhash(BASE)
+        self.assertEqual(simhash(BASE.upper() + " https://t.co/abc"), fp) # case and links ignored
+        self.assertLessEqual(hamming(fp, simhash(BASE.replace("Mumbai", "Delhi"))), 5)
+        self.assertGreater(hamming(fp, simhash("Virat Kohli scores a century at Chinnaswamy tonight")), 5)
+
+    def test_bands_cover_all_bits(self):
+        """Bands partition the 64 bits, so equal bands on every band means equal fingerprints."""
+        fp = simhash(BASE)
+        values = band_values(fp, bands=6)
+        self.assertEqual(len(values), 6)
+        self.assertNotEqual(values, band_values(fp ^ (1 << 63), bands=6))
+
+class TestSimHashIndex(unittest.TestCase):
+    def test_query_within_distance(self):
+        index = SimHashIndex(max_distance=3, bands=4)
+        index.add("a", 0b1111)
+        index.add("b", -1) # all 64 bits set
+        self.assertEqual(index.query(0b0111), ["a"])
+        self.assertEqual(index.query(-1 ^ 0b101), ["b"])
+        self.assertEqual(index.query(1 << 40), [])
+
+    def test_rejects_unsafe_band_count(self):
+        with self.assertRaises(ValueError):
+            SimHashIndex(max_distance=4, bands=4)
+
+    def test_db_lookup_filters_before_limit(self):
+        """Hamming distance is filtered in SQL, ahead of the LIMIT."""
+        session = MagicMock()
+        fp = simhash(BASE)
+        session.execute.return_value.fetchall.return_value = [("t2", "u2", 0), ("t1", "u1", 2)]
+
+        self.assertEqual(find_near_duplicates(session, fp, max_distance=5), [("t2", "u2", 0), ("t1", "u1", 2)])
+        sql, params = session.execute.call_args[0]
+        sql = str(sql)
+        self.assertLess(sql.index("<= :max_distance"), sql.index("LIMIT"))
+        self.assertEqual((params['fp'], params['max_distance']), (fp, 5))
+        # Band prefilter: one indexed equality per band, OR-ed
+        for i, (expr, value) in enumerate(zip(band_sql(), band_values(fp))):
+            self.assertIn(f"{expr} = :b{i}", sql)
+            self.assertEqual(params[f"b{i}"], value)
+        self.assertLess(sql.index(" OR "), sql.index("<= :max_distance"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -60,6 +60,21 @@ class TestTwitterDataCollector(unittest.TestCase):
         self.assertTrue(os.path.exists(error_path), f"File not found at {error_path}")
         if os.path.exists(error_path): os.remove(error_path)
 
+    def test_spill_when_workers_lag(self):
+        """While the workers stay behind, the file is spilled to disk instead of pushed."""
+        filename = "test_spill_micro.json"
+        with open(filename, 'w') as f:
+            json.dump([{"tweet_id": "1", "text_raw": "test"}], f)
+
+        self.handler.lag_monitor.wait_for_capacity = MagicMock(return_value=False)
+        self.handler.ingest_json_file(filename)
+
+        self.mock_redis.xadd.assert_not_called()
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        spill_path = os.path.join(project_root, 'data', 'spill', filename)
+        self.assertTrue(os.path.exists(spill_path), f"File not found at {spill_path}")
+        if os.path.exists(spill_path): os.remove(spill_path)
+
     def test_file_watcher_detection(self):
         """Test that the handler's on_created trigger works."""
         mock_event = MagicMock()
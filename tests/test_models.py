@@ -0,0 +1,58 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import models
+
+class TestSchemaUpgrades(unittest.TestCase):
+    def test_upgrades_serialized_and_hnsw_not_at_startup(self):
+        """init_db takes the schema lock first; the HNSW build is not part of it."""
+        conn = MagicMock()
+        with patch.object(models, 'engine') as engine, patch.object(models.Base.metadata, 'create_all') as create_all:
+            engine.begin.return_value.__enter__.return_value = conn
+            models.init_db()
+
+        statements = [str(c[0][0]) for c in conn.execute.call_args_list]
+        self.assertIn("pg_advisory_xact_lock", statements[0])
+        create_all.assert_called_once_with(conn)
+        self.assertFalse(any("hnsw" in s for s in statements))
+
+    def test_one_time_upgrades_run_once(self):
+        """A one-time upgrade runs only when its schema_migrations marker is newly inserted."""
+        for already_applied in (False, True):
+            conn = MagicMock()
+            conn.execute.return_value.first.return_value = None if already_applied else ("narrative_id_seq_past_tweet_labels",)
+            with patch.object(models, 'engine') as engine, patch.object(models.Base.metadata, 'create_all'):
+                engine.begin.return_value.__enter__.return_value = conn
+                models.init_db()
+
+            statements = [str(c[0][0]) for c in conn.execute.call_args_list]
+            self.assertEqual(any("setval" in s for s in statements), not already_applied)
+            self.assertTrue(any("INSERT INTO schema_migrations" in s for s in statements))
+
+    def test_concurrent_index_build(self):
+        conn = MagicMock()
+        # lock acquired, every index missing, unlock
+        conn.execute.return_value.scalar.side_effect = [True] + [None] * len(models.CONCURRENT_INDEXES)
+        with patch.object(models, 'engine') as engine:
+            engine.connect.return_value.execution_options.return_value.__enter__.return_value = conn
+            self.assertEqual(models.build_concurrent_indexes(), list(models.CONCURRENT_INDEXES))
+        self.assertIn('ix_tweets_simhash_band0', models.CONCURRENT_INDEXES)
+
+        statements = [str(c[0][0]) for c in conn.execute.call_args_list]
+        self.assertTrue(statements[2].startswith("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tweets_embedding_hnsw"))
+        self.assertIn("pg_advisory_unlock", statements[-1])
+
+    def test_concurrent_build_skipped_while_locked(self):
+        conn = MagicMock()
+        conn.execute.return_value.scalar.return_value = False # another process is building
+        with patch.object(models, 'engine') as engine:
+            engine.connect.return_value.execution_options.return_value.__enter__.return_value = conn
+            self.assertEqual(models.build_concurrent_indexes(), [])
+        conn.execute.assert_called_once()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,19 @@
 import unittest
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from collections import Counter
 import pandas as pd
+import numpy as np
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import tempfile
+import config
+from app.repository import EmbeddingBatch
+from app.detection.clustering import detect_narratives, BufferCursor, assign_incremental, merge_centroid, add_members, refresh_rates, roll_ring, detect_spikes, get_reducer
 
 # Mocking the logic since we can't easily import the complex dependencies of clustering.py in a simple unit test
 # without setting up a full DB mock. We will test the logic function directly.
@@ -89,5 +102,225 @@ class TestNarrativeDetection(unittest.TestCase):
         self.assertTrue(metrics['is_spike'])
         self.assertGreaterEqual(metrics['velocity'], 3.0)
 
+def blob(rng, center, n, noise=0.02):
+    return np.array(center) + rng.normal(0, noise, size=(n, len(center)))
+
+class TestIncrementalAssignment(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        self.centers = np.eye(16)[:3] # three orthogonal topics
+
+    def test_first_cycle_creates_narratives(self):
+        embeddings = np.vstack([blob(self.rng, self.centers[0], 10), blob(self.rng, self.centers[1], 10)])
+        assigned, new_clusters = assign_incremental(np.empty((0, 16)), [], embeddings)
+
+        self.assertTrue((assigned == -1).all())
+        self.assertEqual(len(new_clusters), 2)
+        self.assertEqual(sorted(len(m) for m, _, _ in new_clusters), [10, 10])
+
+    def test_next_cycle_reuses_existing_ids(self):
+        """New tweets on a known topic join it; only the unknown topic is re-clustered."""
+        centroids = self.centers[:2].copy()
+        embeddings = np.vstack([
+            blob(self.rng, self.centers[1], 4),   # known topic 1
+            blob(self.rng, self.centers[2], 6),   # new topic
+        ])
+        assigned, new_clusters = assign_incremental(centroids, [0.2, 0.2], embeddings)
+
+        self.assertEqual(list(assigned[:4]), [1, 1, 1, 1])
+        self.assertTrue((assigned[4:] == -1).all())
+        self.assertEqual(len(new_clusters), 1)
+        self.assertTrue(set(new_clusters[0][0]) <= {4, 5, 6, 7, 8, 9})
+        self.assertGreaterEqual(len(new_clusters[0][0]), 5)
+
+    def test_noise_does_not_become_a_narrative(self):
+        noise = self.rng.normal(0, 1, size=(30, 384))
+        _, new_clusters = assign_incremental(np.empty((0, 384)), [], noise)
+        self.assertEqual(new_clusters, [])
+
+    def test_merge_centroid_is_running_mean(self):
+        merged = merge_centroid(np.array([1.0, 0.0]), 3, np.array([[0.0, 1.0]]))
+        np.testing.assert_allclose(merged, [0.75, 0.25])
+
+class TestDetectionCycle(unittest.TestCase):
+    def test_cycles_match_only_new_tweets(self):
+        """The first cycle matches the whole buffer; later ones only what was ingested since. HDBSCAN waits for enough leftovers."""
+        rng = np.random.default_rng(4)
+        now = datetime.now(timezone.utc)
+        narrative = SimpleNamespace(narrative_id=1, centroid=np.eye(16)[0], radius=0.2, tweet_count=10, unique_users=0,
+                                    first_seen=now - timedelta(hours=3), last_seen=now - timedelta(hours=1),
+                                    minute_counts=None, hour_counts=None, rate_minute=None, is_spike=False,
+                                    representative_distance=0.0, representative_tweet_id="t0", representative_text="x")
+        on_topic = {1, 4, 6, 7}
+        vectors = np.vstack([blob(rng, np.eye(16)[0], 1) if k in on_topic else rng.normal(size=(1, 16)) for k in range(9)])
+        timestamps = [now - timedelta(minutes=k) for k in range(7)] + [now, now] # t7, t8 arrive later
+        ingested = [now - timedelta(minutes=30)] * 7 + [now + timedelta(minutes=5)] * 2
+        assigned_ids = set()
+
+        pages = []
+        def load(session, since=None, unassigned_only=False, limit=None, before=None, ingested_after=None, **kwargs):
+            pages.append((before, ingested_after))
+            rows = sorted((k for k in range(9) if f"t{k}" not in assigned_ids and ingested[k] <= clock[0]
+                           and (ingested_after is None or ingested[k] > ingested_after)),
+                          key=lambda k: (timestamps[k], f"t{k}"), reverse=True)
+            if before is not None:
+                rows = [k for k in rows if (timestamps[k], f"t{k}") < before]
+            rows = rows[:limit]
+            return EmbeddingBatch([f"t{k}" for k in rows], [f"u{k}" for k in rows], [timestamps[k] for k in rows], vectors[rows])
+
+        session = MagicMock()
+        session.query.return_value.filter.return_value.update.return_value = 0
+        session.query.return_value.filter.return_value.order_by.return_value.all.return_value = [narrative]
+        session.bulk_update_mappings.side_effect = lambda model, mappings: assigned_ids.update(m['tweet_id'] for m in mappings)
+        clock = [now]
+        session.execute.return_value.scalar.side_effect = lambda: clock[0]
+        cursor = BufferCursor()
+        with patch('app.detection.clustering.Session', return_value=session), \
+             patch('app.detection.clustering.load_embeddings', side_effect=load), \
+             patch('app.detection.clustering.get_reducer', return_value=None), \
+             patch('app.detection.clustering.count_new_users', return_value=Counter()), \
+             patch('app.detection.clustering.assign_incremental', return_value=(None, [])) as cluster, \
+             patch.object(config, 'NARRATIVE_ASSIGN_CHUNK_ROWS', 3), patch.object(config, 'NARRATIVE_BATCH_LIMIT', 2), \
+             patch.object(config, 'NARRATIVE_RECLUSTER_MIN_LEFTOVERS', 3), patch.object(config, 'NARRATIVE_INGEST_OVERLAP_SECONDS', 0):
+            # Cycle 1, fresh cursor: the whole buffer in chunks of 3
+            detect_narratives(cursor)
+            self.assertEqual(pages[:3], [(None, None), ((timestamps[2], "t2"), None), ((timestamps[5], "t5"), None)])
+            self.assertEqual(sorted(assigned_ids), ["t1", "t4", "t6"])
+            self.assertEqual(narrative.tweet_count, 13)
+            # 4 leftovers >= 3: HDBSCAN on the newest 2 still unassigned
+            np.testing.assert_array_equal(cluster.call_args[0][2], vectors[[0, 2]])
+            self.assertEqual((cursor.ingested_through, cursor.new_leftovers), (now, 0))
+
+            # Cycle 2: only t7 and t8, ingested since
+            pages.clear()
+            clock[0] = now + timedelta(minutes=10)
+            detect_narratives(cursor)
+            self.assertEqual(pages, [(None, now)])
+            self.assertEqual(sorted(assigned_ids), ["t1", "t4", "t6", "t7"])
+            # One new leftover (t8) is not enough to re-cluster
+            self.assertEqual(cluster.call_count, 1)
+            self.assertEqual(cursor.new_leftovers, 1)
+
+class TestReducer(unittest.TestCase):
+    def test_reduced_clustering_finds_same_topics(self):
+        rng = np.random.default_rng(1)
+        centers = np.eye(384)[:3]
+        embeddings = np.vstack([blob(rng, c, 20) for c in centers])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            reducer = get_reducer(lambda: embeddings, kind='pca', dim=8, path=os.path.join(tmp, "r.npz"))
+            _, new_clusters = assign_incremental(np.empty((0, 384)), [], embeddings, reducer=reducer)
+
+        self.assertEqual(reducer.transform(embeddings).shape, (60, 8))
+        self.assertEqual(sorted(sorted(m // 20) for m, _, _ in new_clusters), [[0] * 20, [1] * 20, [2] * 20])
+
+    def test_reducer_cached_until_stale(self):
+        embeddings = np.random.default_rng(2).normal(size=(50, 16))
+        calls = []
+        def sample():
+            calls.append(1)
+            return embeddings
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "r.npz")
+            first = get_reducer(sample, kind='random', dim=4, path=path)
+            again = get_reducer(sample, kind='random', dim=4, path=path)
+            np.testing.assert_array_equal(first.components, again.components)
+            self.assertEqual(len(calls), 1)
+
+            get_reducer(sample, kind='random', dim=4, path=path, refit_hours=0)
+            get_reducer(sample, kind='pca', dim=4, path=path) # configuration changed
+            self.assertEqual(len(calls), 3)
+
+        self.assertIsNone(get_reducer(sample, kind='none'))
+
+def make_narrative():
+    return SimpleNamespace(narrative_id=1, tweet_count=0, first_seen=None, last_seen=None,
+                           minute_counts=None, hour_counts=None, rate_minute=None, hourly_rate=0.0,
+                           baseline_rate=0.0, velocity=0.0, is_spike=False, representative_text=None)
+
+class TestNarrativeStats(unittest.TestCase):
+    """Same scenarios as the spike math above, maintained incrementally on the narrative row."""
+    def feed(self, narrative, timestamps, now):
+        narrative.tweet_count += len(timestamps)
+        add_members(narrative, timestamps, now)
+        refresh_rates([narrative], now)
+
+    def test_steady_state_no_spike(self):
+        base = datetime(2025, 1, 1, 10, 0, tzinfo=timezone.utc)
+        narrative = make_narrative()
+        # 10 tweets/hr for 5 hours, fed in hourly cycles
+        for hour in range(5):
+            batch = [base + timedelta(hours=hour, minutes=6 * i) for i in range(10)]
+            self.feed(narrative, batch, batch[-1])
+
+        self.assertFalse(narrative.is_spike)
+        self.assertAlmostEqual(narrative.velocity, 1.0, delta=0.5)
+        self.assertEqual(narrative.first_seen, base)
+
+    def test_spike_then_decay(self):
+        base = datetime(2025, 1, 1, 0, 0, tzinfo=timezone.utc)
+        narrative = make_narrative()
+        steady = [base + timedelta(minutes=i * 6) for i in range(100)]
+        self.feed(narrative, steady, steady[-1])
+        spike = [base + timedelta(hours=10, minutes=i) for i in range(50)]
+        self.feed(narrative, spike, spike[-1])
+
+        self.assertTrue(narrative.is_spike)
+        self.assertGreaterEqual(narrative.velocity, 3.0)
+
+        # No new tweets for two hours: the hourly rate drains and the flag clears
+        refresh_rates([narrative], spike[-1] + timedelta(hours=2))
+        self.assertEqual(narrative.hourly_rate, 0)
+        self.assertFalse(narrative.is_spike)
+
+    def test_minute_ring_ignores_old_tweets(self):
+        counts = roll_ring(None, None, 1000, 60, [1000, 999, 941, 940, 1001])
+        self.assertEqual(sum(counts), 3) # 940 is over an hour old, 1001 is in the future
+        counts = roll_ring(counts, 1000, 1030, 60)
+        self.assertEqual(sum(counts), 2) # minute 1000 and 999 survive, 941 rolled off
+
+    def test_baseline_window_forgets_old_volume(self):
+        """A burst two days ago does not raise today's baseline."""
+        base = datetime(2025, 1, 1, 0, 0, tzinfo=timezone.utc)
+        narrative = make_narrative()
+        burst = [base + timedelta(seconds=i * 10) for i in range(300)]
+        self.feed(narrative, burst, burst[-1])
+        now = base + timedelta(days=2)
+        quiet = [now - timedelta(hours=h) for h in range(1, 20)]
+        self.feed(narrative, quiet, now)
+        self.assertAlmostEqual(narrative.baseline_rate, 19 / 24, places=2)
+
+    def test_detect_spikes_alerts_once_per_spike(self):
+        """Many narratives in one pass; an alert only when one starts spiking."""
+        now = datetime(2025, 1, 1, 12, 0, tzinfo=timezone.utc)
+        narratives = []
+        for nid in range(1000):
+            narrative = make_narrative()
+            narrative.narrative_id = nid
+            steady = [now - timedelta(hours=11, minutes=i * 6) for i in range(10)]
+            burst = [now - timedelta(minutes=i) for i in range(40)] if nid == 7 else [now - timedelta(minutes=30)]
+            add_members(narrative, steady + burst, now)
+            narratives.append(narrative)
+
+        session = MagicMock()
+        spikes = detect_spikes(session, narratives, now)
+        self.assertEqual([n.narrative_id for n in spikes], [7])
+        alert = session.add.call_args[0][0]
+        self.assertEqual((alert.alert_type, alert.narrative_id), ("NARRATIVE_SPIKE", 7))
+
+        detect_spikes(session, narratives, now + timedelta(minutes=1))
+        self.assertEqual(session.add.call_count, 1)
+
+    def test_detect_spikes_skips_stale_narratives(self):
+        """Narratives not seen within the baseline window are not rewritten every cycle."""
+        now = datetime(2025, 1, 3, 12, 0, tzinfo=timezone.utc)
+        stale = make_narrative()
+        add_members(stale, [now - timedelta(days=2)], now - timedelta(days=2))
+        ring, rate_minute = list(stale.minute_counts), stale.rate_minute
+
+        self.assertEqual(detect_spikes(MagicMock(), [stale], now), [])
+        self.assertEqual((stale.minute_counts, stale.rate_minute), (ring, rate_minute))
+
 if __name__ == "__main__":
     unittest.main()
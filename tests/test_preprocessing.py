@@ -4,7 +4,7 @@ import sys
 
 # Add project root to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from app.services.cleaner import clean_tweet
+from app.services.cleaner import clean_tweet, clean_batch
 
 class TestFeatureExtraction(unittest.TestCase):
     def test_cleaning_logic(self):
@@ -36,6 +36,7 @@ class TestFeatureExtraction(unittest.TestCase):
         # 6. Text Hash (MD5 of alphanumeric lower)
         # "helloworldjoinusatsentinelgraphccelonmuskhttpsgooglecom"
         self.assertTrue(len(processed['text_hash']) == 32)
+        self.assertIsInstance(processed['simhash'], int)
         
     def test_duplicate_hashes(self):
         """Test that same content with different spacing/casing results in same hash."""
@@ -47,5 +48,44 @@ class TestFeatureExtraction(unittest.TestCase):
         
         self.assertEqual(p1['text_hash'], p2['text_hash'])
 
+class TestCleanBatch(unittest.TestCase):
+    def test_matches_clean_tweet(self):
+        """clean_batch produces the same output as clean_tweet, including the edge cases."""
+        texts = [
+            "  Hello World! 🚀 Join us at #SentinelGraph. CC: @elonmusk https://google.com  ",
+            "see https://x.com/#tag and https://x.com/@user?a=1",  # tags/mentions inside URLs
+            "#ahttps://t.co/1 @bhttp://t.co/2",                     # URL glued to a tag
+            "ΟΔΟΣ Σ ς snake_case __ Çé 42",                         # non-ASCII lowercasing
+            "",
+        ]
+        timestamps = [
+            "2023-01-01T12:00:00Z", "2023-01-01T12:00:00.123+05:30", "2023-01-01T12:00:00",
+            "Mon Jan 01 12:00:00 +0000 2023", None,
+        ]
+        tweets = [
+            {"tweet_id": str(i), "handle": "h", "text_raw": t, "timestamp_absolute": ts}
+            for i, (t, ts) in enumerate(zip(texts, timestamps))
+        ]
+
+        batch = clean_batch(tweets)
+
+        for tweet, processed in zip(tweets, batch):
+            expected = clean_tweet(tweet)
+            self.assertEqual(processed, expected)
+            if expected['timestamp_absolute']:
+                self.assertEqual(processed['timestamp_absolute'].utcoffset(), expected['timestamp_absolute'].utcoffset())
+
+    def test_errors_reported_per_item(self):
+        tweets = [{"tweet_id": "1", "handle": "a", "text_raw": "ok"}, {"tweet_id": "2", "text_raw": "no handle"}]
+        errors = []
+
+        batch = clean_batch(tweets, on_error=lambda idx, e: errors.append(idx))
+
+        self.assertEqual(batch[0]['tweet_id'], "1")
+        self.assertIsNone(batch[1])
+        self.assertEqual(errors, [1])
+        with self.assertRaises(KeyError):
+            clean_batch(tweets)
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,128 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import redis
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from app.services.rate_counters import record_tweets, evaluate, bucket_key, spiking_key, RateMonitor
+from app.detection.clustering import NarrativeMatcher
+
+NOW = datetime(2025, 1, 1, 12, 30, tzinfo=timezone.utc)
+NOW_MINUTE = int(NOW.timestamp() // 60)
+NOW_HOUR = NOW_MINUTE // 60
+
+def fake_buckets(r, kind, minute_counts, hour_counts):
+    """Serves HGETALL from {bucket: {entity: n}} dicts through the mocked pipeline."""
+    def execute():
+        keys = [c[0][0] for c in r.pipeline.return_value.hgetall.call_args_list]
+        r.pipeline.return_value.hgetall.reset_mock()
+        out = []
+        for key in keys:
+            unit, bucket = key.split(':')[-2:]
+            source = minute_counts if unit == 'm' else hour_counts
+            out.append({e: str(n) for e, n in source.get(int(bucket), {}).items()})
+        return out
+    r.pipeline.return_value.execute.side_effect = execute
+
+class TestRecordTweets(unittest.TestCase):
+    def test_one_pipeline_per_batch(self):
+        r = MagicMock(spec=redis.Redis)
+        pipe = r.pipeline.return_value
+        items = [
+            {'timestamp_absolute': NOW, 'hashtags': ['#Kohli', '#kohli']},
+            {'timestamp_absolute': NOW - timedelta(minutes=1), 'hashtags': []},
+            {'timestamp_absolute': NOW - timedelta(days=3), 'hashtags': ['#old']}, # outside every window
+            {'timestamp_absolute': None, 'hashtags': ['#x']},
+        ]
+        counted = record_tweets(r, items, [7, 7, 7, -1], now=NOW)
+
+        self.assertEqual(counted, 3) # narrative 7 twice, #kohli once
+        incr = {c[0][:2]: c[0][2] for c in pipe.hincrby.call_args_list}
+        self.assertEqual(incr[(bucket_key('narrative', 'h', NOW_HOUR), '7')], 2)
+        self.assertEqual(incr[(bucket_key('hashtag', 'm', NOW_MINUTE), '#kohli')], 1)
+        self.assertNotIn('#old', [c[0][1] for c in pipe.hincrby.call_args_list])
+        pipe.execute.assert_called_once()
+
+class TestEvaluate(unittest.TestCase):
+    def test_spike_against_baseline(self):
+        r = MagicMock(spec=redis.Redis)
+        # '1' is steady (10/hr for 24h), '2' triples its rate in the last 15 minutes
+        hours = {NOW_HOUR - h: {'1': 10, '2': 10} for h in range(1, 24)}
+        hours[NOW_HOUR] = {'1': 5, '2': 20}
+        minutes = {NOW_MINUTE: {'1': 3, '2': 10}, NOW_MINUTE - 14: {'2': 5}, NOW_MINUTE - 15: {'2': 99}}
+        fake_buckets(r, 'narrative', minutes, hours)
+
+        spikes = evaluate(r, 'narrative', now=NOW, window_minutes=15, min_rate=10)
+
+        self.assertEqual([s['entity'] for s in spikes], ['2'])
+        self.assertAlmostEqual(spikes[0]['current_rate'], 60.0)
+        self.assertGreaterEqual(spikes[0]['velocity'], config.NARRATIVE_SPIKE_VELOCITY)
+
+    def test_new_entity_does_not_spike(self):
+        """A hashtag whose first tweets are all in the current window has no baseline yet."""
+        r = MagicMock(spec=redis.Redis)
+        minutes = {NOW_MINUTE - k: {'#new': 20} for k in range(5)}
+        hours = {NOW_HOUR: {'#new': 100}, NOW_HOUR - 1: {'#old': 1}, NOW_HOUR - 3: {'#old': 1}}
+        minutes[NOW_MINUTE]['#old'] = 50
+        fake_buckets(r, 'hashtag', minutes, hours)
+
+        spikes = evaluate(r, 'hashtag', now=NOW, window_minutes=15, min_rate=10)
+
+        self.assertEqual([s['entity'] for s in spikes], ['#old'])
+
+    def test_monitor_alerts_once(self):
+        r = MagicMock(spec=redis.Redis)
+        r.smembers.side_effect = [set(), set(), set(), {'#kohli'}] # narrative, hashtag per check
+        session = MagicMock()
+        monitor = RateMonitor(r, session_factory=lambda: session)
+        spike = [{'entity': '#kohli', 'current_rate': 80.0, 'baseline_rate': 5.0, 'velocity': 16.0}]
+
+        with patch('app.services.rate_counters.evaluate', side_effect=lambda r, kind, now: spike if kind == 'hashtag' else []):
+            first = monitor.check(NOW)
+            second = monitor.check(NOW + timedelta(seconds=10))
+
+        self.assertEqual(len(first['hashtag']), 1)
+        self.assertEqual(second['hashtag'], [])
+        alert = session.add.call_args[0][0]
+        self.assertEqual((alert.alert_type, alert.severity), ("HASHTAG_SPIKE", "CRITICAL"))
+        session.add.assert_called_once()
+
+    def test_failed_alert_commit_retried(self):
+        """The spike is only marked as seen once its alert is committed."""
+        r = MagicMock(spec=redis.Redis)
+        r.smembers.return_value = set()
+        session = MagicMock()
+        session.commit.side_effect = [Exception("database down"), None]
+        monitor = RateMonitor(r, session_factory=lambda: session)
+        spike = [{'entity': '#kohli', 'current_rate': 80.0, 'baseline_rate': 5.0, 'velocity': 16.0}]
+
+        with patch('app.services.rate_counters.evaluate', side_effect=lambda r, kind, now: spike if kind == 'hashtag' else []):
+            with self.assertRaises(Exception):
+                monitor.check(NOW)
+            r.pipeline.assert_not_called()
+            retried = monitor.check(NOW + timedelta(seconds=10))
+
+        self.assertEqual(len(retried['hashtag']), 1)
+        self.assertEqual(session.add.call_count, 2)
+        r.pipeline.return_value.sadd.assert_called_once_with(spiking_key('hashtag'), '#kohli')
+
+class TestNarrativeMatcher(unittest.TestCase):
+    def test_nearest_centroid_within_radius(self):
+        matcher = NarrativeMatcher(refresh_seconds=3600)
+        session = MagicMock()
+        session.query.return_value.filter.return_value.all.return_value = [
+            (5, [1.0, 0.0, 0.0], 0.2), (9, [0.0, 1.0, 0.0], 0.2)
+        ]
+        embeddings = np.array([[0.9, 0.1, 0.0], [0.0, 1.0, 0.1], [0.0, 0.0, 1.0]], dtype=np.float32)
+
+        np.testing.assert_array_equal(matcher.match(session, embeddings), [5, 9, -1])
+        matcher.match(session, embeddings)
+        session.query.assert_called_once() # centroids cached between batches
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+from unittest.mock import MagicMock
+from datetime import datetime, timedelta, timezone
+import struct
+from collections import namedtuple
+import numpy as np
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlalchemy.dialects import postgresql
+from app.repository import decode_vectors, load_embeddings, nearest_tweets, mention_edges, window_posts, user_mean_embeddings
+
+def vector_send(values):
+    """pgvector binary format: int16 dim, int16 unused, big-endian float32 values."""
+    return struct.pack(f'>hh{len(values)}f', len(values), 0, *values)
+
+class TestEmbeddingLoader(unittest.TestCase):
+    def test_decode_binary_vectors(self):
+        blobs = [vector_send([1.0, -2.5, 3.0]), vector_send([0.0, 0.5, 1e-3])]
+        vectors = decode_vectors(blobs, dim=3)
+
+        self.assertEqual(vectors.dtype, np.float32)
+        self.assertTrue(vectors.flags['C_CONTIGUOUS'])
+        np.testing.assert_allclose(vectors, [[1.0, -2.5, 3.0], [0.0, 0.5, 1e-3]], rtol=1e-6)
+        self.assertEqual(decode_vectors([], dim=3).shape, (0, 3))
+
+    def test_load_embeddings_streams_chunks(self):
+        ts = datetime(2025, 1, 1)
+        rows = [("t1", "u1", ts, memoryview(vector_send([1.0, 2.0]))), ("t2", None, ts, memoryview(vector_send([3.0, 4.0])))]
+        session = MagicMock()
+        result = session.connection.return_value.execution_options.return_value.execute.return_value
+        result.fetchmany.side_effect = [rows[:1], rows[1:], []]
+
+        batch = load_embeddings(session, since=ts, unassigned_only=True, limit=10, dim=2)
+
+        self.assertEqual(batch.tweet_ids, ["t1", "t2"])
+        self.assertEqual(batch.user_ids, ["u1", None])
+        np.testing.assert_array_equal(batch.vectors, [[1.0, 2.0], [3.0, 4.0]])
+
+        sql, params = session.connection.return_value.execution_options.return_value.execute.call_args[0]
+        self.assertIn("vector_send(embedding)", str(sql))
+        self.assertIn("narrative_id IS NULL", str(sql))
+        self.assertEqual(params, {'since': ts, 'limit': 10})
+
+    def test_ingested_after_filters_on_created_at(self):
+        session = MagicMock()
+        execute = session.connection.return_value.execution_options.return_value.execute
+        execute.return_value.fetchmany.return_value = []
+        mark = datetime(2025, 1, 1, 12, 0)
+
+        load_embeddings(session, unassigned_only=True, ingested_after=mark, dim=2)
+
+        sql, params = execute.call_args[0]
+        self.assertIn("created_at > :ingested_after", str(sql))
+        self.assertEqual(params, {'ingested_after': mark})
+
+class TestNearestTweets(unittest.TestCase):
+    def test_knn_orders_by_cosine_distance(self):
+        """The query is an ORDER BY <=> LIMIT k that the HNSW index can serve."""
+        ts = datetime(2025, 1, 1)
+        session = MagicMock()
+        Row = namedtuple('Row', 'tweet_id user_id handle text_clean timestamp_absolute narrative_id distance')
+        session.execute.side_effect = [None, None, [Row("t1", "u1", "alice", "hi", ts, 3, 0.25)]]
+
+        results = nearest_tweets(session, np.ones(3), k=5, time_window=timedelta(hours=2), now=ts)
+
+        self.assertEqual(results[0]['tweet_id'], "t1")
+        self.assertAlmostEqual(results[0]['similarity'], 0.75)
+        self.assertIn("hnsw.ef_search", str(session.execute.call_args_list[0][0][0]))
+        sql = str(session.execute.call_args_list[2][0][0].compile(dialect=postgresql.dialect()))
+        self.assertIn("<=>", sql)
+        self.assertIn("ORDER BY", sql)
+        self.assertIn("LIMIT", sql)
+        self.assertIn("timestamp_absolute >=", sql)
+
+class TestMentionEdges(unittest.TestCase):
+    def test_one_aggregated_query(self):
+        """Mentions are unnested and grouped in SQL; handles resolve through one join, not a query each."""
+        session = MagicMock()
+        session.execute.return_value.all.return_value = [("u1", "u2", 3)]
+
+        since = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        self.assertEqual(mention_edges(session, since), [("u1", "u2", 3)])
+        session.execute.assert_called_once()
+        sql, params = session.execute.call_args[0]
+        self.assertIn("unnest(t.mentions)", str(sql))
+        self.assertIn("GROUP BY", str(sql))
+        self.assertIn("t.timestamp_absolute >= :since", str(sql))
+        self.assertEqual(params, {'since': since})
+
+class TestGraphWindow(unittest.TestCase):
+    def test_user_means_averaged_in_sql(self):
+        """One pgvector avg per user comes back, decoded into a float32 matrix."""
+        session = MagicMock()
+        session.execute.return_value.all.return_value = [("u1", vector_send([1.0, 0.0, 0.0])), ("u2", vector_send([0.0, 0.5, 0.5]))]
+
+        users, vectors = user_mean_embeddings(session, datetime(2025, 1, 1, tzinfo=timezone.utc), dim=3)
+
+        self.assertEqual(users, ["u1", "u2"])
+        np.testing.assert_allclose(vectors, [[1.0, 0.0, 0.0], [0.0, 0.5, 0.5]])
+        sql = str(session.execute.call_args[0][0])
+        self.assertIn("avg(embedding)", sql)
+        self.assertIn("GROUP BY user_id", sql)
+
+    def test_window_posts_projected_and_ordered(self):
+        session = MagicMock()
+        window_posts(session, datetime(2025, 1, 1, tzinfo=timezone.utc))
+        sql = str(session.execute.call_args[0][0])
+        self.assertIn("SELECT user_id, timestamp_absolute FROM tweets", sql)
+        self.assertIn("ORDER BY timestamp_absolute", sql)
+        self.assertNotIn("LIMIT", sql)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+import numpy as np
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sklearn.metrics.pairwise import cosine_similarity
+from app.detection.similarity import similarity_pairs, block_rows
+from app.detection.community import find_similar_content_pairs
+
+class MockTweet:
+    def __init__(self, user_id, embedding):
+        self.user_id = user_id
+        self.embedding = embedding
+
+def make_vectors(n=400, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, dim))
+    # A tight group of near-identical vectors
+    vectors[100:110] = vectors[100] + rng.normal(scale=0.05, size=(10, dim))
+    return vectors
+
+class TestSimilarityKernel(unittest.TestCase):
+    def test_matches_dense_matrix(self):
+        """Blocked pairs are exactly the dense matrix's pairs above threshold."""
+        vectors = make_vectors()
+        dense = cosine_similarity(vectors)
+        np.fill_diagonal(dense, -1)
+
+        i, j, s = similarity_pairs(vectors, 0.5, block_elements=1000) # 2 rows per block
+        self.assertEqual(set(zip(i.tolist(), j.tolist())), {(a, b) for a, b in zip(*np.nonzero(dense > 0.5)) if a < b})
+        np.testing.assert_allclose(s, dense[i, j], atol=1e-5)
+
+        i, j, _ = similarity_pairs(vectors, 0.5, upper=False, block_elements=1000)
+        self.assertEqual(len(i), int((dense > 0.5).sum()))
+
+    def test_top_k_bounds_neighbours(self):
+        vectors = make_vectors()
+        i, j, s = similarity_pairs(vectors, 0.0, top_k=3, upper=False, block_elements=5000)
+        self.assertLessEqual(np.bincount(i).max(), 3)
+        self.assertNotIn(True, (i == j).tolist())
+        # Members of the tight group find each other first
+        self.assertTrue(set(j[i == 100].tolist()) <= set(range(101, 110)))
+
+    def test_block_size_bounded(self):
+        self.assertEqual(block_rows(100000, block_elements=2 ** 24), 167)
+        self.assertEqual(block_rows(10 ** 9, block_elements=2 ** 24), 1)
+
+    def test_community_pairs_use_kernel(self):
+        tweets = [MockTweet(f"u{k}", v) for k, v in enumerate(make_vectors())]
+        pairs = find_similar_content_pairs(tweets)
+        self.assertTrue(all(score > 0.85 for _, _, score in pairs))
+        self.assertIn(("u100", "u101"), [(a, b) for a, b, _ in pairs])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+import unittest
+from unittest.mock import MagicMock
+import redis
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+from app.services.stream_consumer import StreamConsumer, stream_id_key, LagMonitor, safe_trim_id, timestamp_to_stream_id, dead_letter
+from scripts.replay_dlq import replay_dlq
+
+class TestStreamConsumer(unittest.TestCase):
+    def setUp(self):
+        self.mock_redis = MagicMock(spec=redis.Redis)
+        self.consumer = StreamConsumer(self.mock_redis, group="g", consumer="c1", streams=["s1", "s2"], claim_idle_ms=1000)
+
+    def test_ensure_groups_ignores_existing_group(self):
+        """An existing group (BUSYGROUP) is not an error, anything else is."""
+        self.mock_redis.hgetall.return_value = {}
+        self.mock_redis.xgroup_create.side_effect = redis.ResponseError("BUSYGROUP Consumer Group name already exists")
+        self.consumer.ensure_groups()
+        self.assertEqual(self.mock_redis.xgroup_create.call_count, 2)
+
+        self.mock_redis.xgroup_create.side_effect = redis.ResponseError("WRONGTYPE")
+        with self.assertRaises(redis.ResponseError):
+            self.consumer.ensure_groups()
+
+    def test_read_drains_own_pending_first(self):
+        """After a restart the consumer re-reads its own pending entries before new ones."""
+        self.mock_redis.xreadgroup.side_effect = [
+            [["s1", [("1-0", {"tweet_id": "1"})]]], # own pending, short read: drained
+            [["s2", [("5-0", {"tweet_id": "5"})]]], # new entries
+        ]
+        self.mock_redis.xautoclaim.return_value = ["0-0", [], []]
+
+        first = self.consumer.read(count=10)
+        self.assertEqual(first[0][1][0][0], "1-0")
+        self.assertEqual(self.mock_redis.xreadgroup.call_args[0][2], {"s1": "0-0", "s2": "0-0"})
+
+        second = self.consumer.read(count=10)
+        self.assertEqual(second[0][1][0][0], "5-0")
+        self.assertEqual(self.mock_redis.xreadgroup.call_args[0][2], {"s1": ">", "s2": ">"})
+
+    def test_own_pending_not_returned_twice(self):
+        """Entries still in flight are not handed out again while the pending backlog is drained."""
+        pending = [(f"{i}-0", {"tweet_id": str(i)}) for i in range(1, 6)]  # delivered before a restart, never acked
+
+        def xreadgroup(group, consumer, streams, count=None, block=None):
+            if streams["s1"] == ">":
+                return []
+            # Like Redis: an explicit id returns this consumer's pending entries after it
+            after = stream_id_key(streams["s1"])
+            return [["s1", [e for e in pending if stream_id_key(e[0]) > after][:count]]]
+
+        self.mock_redis.xreadgroup.side_effect = xreadgroup
+        consumer = StreamConsumer(self.mock_redis, group="g", consumer="c1", streams=["s1"], claim_idle_ms=1000)
+        first = [msg_id for msg_id, _ in consumer.read(count=2)[0][1]]
+        second = [msg_id for msg_id, _ in consumer.read(count=2)[0][1]]
+        third = [msg_id for msg_id, _ in consumer.read(count=2)[0][1]]
+        self.assertEqual(first, ["1-0", "2-0"])
+        self.assertEqual(second, ["3-0", "4-0"])
+        self.assertEqual(third, ["5-0"])
+
+        # Short read: the backlog is drained and new entries are read with '>'
+        self.mock_redis.xautoclaim.return_value = ["0-0", [], []]
+        consumer.read(count=2)
+        self.assertEqual(self.mock_redis.xreadgroup.call_args[0][2], {"s1": ">"})
+
+    def test_reclaim_returns_stale_entries(self):
+        """Entries abandoned by a dead consumer are claimed and returned in XREAD format."""
+        self.mock_redis.xautoclaim.side_effect = [
+            ["7-0", [("3-0", {"tweet_id": "3"})], []],
+            ["0-0", [], []],
+        ]
+        claimed = self.consumer.reclaim(count=10)
+        self.assertEqual(claimed, [["s1", [("3-0", {"tweet_id": "3"})]]])
+        self.assertEqual(self.consumer._claim_cursors["s1"], "7-0")
+
+    def test_lag_counts_undelivered_and_pending(self):
+        self.mock_redis.xinfo_groups.side_effect = [
+            [{'name': 'g', 'lag': 40, 'pending': 10}, {'name': 'other', 'lag': 999, 'pending': 0}],
+            [{'name': 'g', 'lag': None, 'pending': 2}], # lag unknown -> stream length
+        ]
+        self.mock_redis.xlen.return_value = 7
+        self.assertEqual(self.consumer.lag(), 40 + 10 + 7 + 2)
+
+    def test_ack_commits_through_script(self):
+        """XACK and the offset update go through one script call (it commits a safe resume id)."""
+        script = self.consumer._ack_script
+        self.consumer.ack("s1", ["10-1", "9-5", "10-0"])
+        script.assert_called_once_with(keys=["s1", "offsets:g"], args=["g", "10-1", "10-1", "9-5", "10-0"])
+        self.consumer.ack("s1", [])
+        self.assertEqual(script.call_count, 1)
+
+    def test_group_recreated_at_committed_offset(self):
+        self.mock_redis.hgetall.return_value = {"s1": "42-0"}
+        self.consumer.ensure_groups()
+        ids = [c.kwargs['id'] for c in self.mock_redis.xgroup_create.call_args_list]
+        self.assertEqual(ids, ["42-0", "0"])
+        self.mock_redis.xgroup_setid.assert_not_called()
+
+    def test_start_from_now_and_timestamp(self):
+        self.mock_redis.hgetall.return_value = {}
+        self.consumer.ensure_groups(start_from='now')
+        self.mock_redis.xgroup_setid.assert_called_with("s2", "g", "$")
+
+        self.consumer.ensure_groups(start_from='2025-01-01T00:00:00Z')
+        self.mock_redis.xgroup_setid.assert_called_with("s2", "g", timestamp_to_stream_id('2025-01-01T00:00:00Z'))
+        self.assertEqual(timestamp_to_stream_id('2025-01-01T00:00:00Z'), "1735689599999-18446744073709551615")
+
+class TestRetention(unittest.TestCase):
+    def setUp(self):
+        self.mock_redis = MagicMock(spec=redis.Redis)
+
+    def test_trim_stops_at_oldest_pending(self):
+        self.mock_redis.xinfo_groups.return_value = [{'name': 'g', 'last-delivered-id': '50-0'}]
+        self.mock_redis.xpending.return_value = {'pending': 3, 'min': '20-1', 'max': '50-0'}
+        self.assertEqual(safe_trim_id(self.mock_redis, "s1"), "20-1")
+
+    def test_trim_past_last_delivered_when_nothing_pending(self):
+        self.mock_redis.xinfo_groups.return_value = [{'name': 'g', 'last-delivered-id': '50-0'}]
+        self.mock_redis.xpending.return_value = {'pending': 0, 'min': None, 'max': None}
+        self.assertEqual(safe_trim_id(self.mock_redis, "s1"), "50-1")
+
+    def test_no_trim_without_consumers(self):
+        """A stream nobody consumed yet (or a group that read nothing) is never trimmed."""
+        self.mock_redis.xinfo_groups.return_value = []
+        self.assertIsNone(safe_trim_id(self.mock_redis, "s1"))
+        self.mock_redis.xinfo_groups.return_value = [{'name': 'g', 'last-delivered-id': '0-0'}]
+        self.mock_redis.xpending.return_value = {'pending': 0}
+        self.assertIsNone(safe_trim_id(self.mock_redis, "s1"))
+
+    def test_lag_monitor_throttles_then_gives_up(self):
+        monitor = LagMonitor(self.mock_redis, high=100, low=10, refresh_seconds=0)
+        monitor.lag = MagicMock(return_value=500)
+        self.assertTrue(monitor.lagging())
+        self.assertFalse(monitor.wait_for_capacity(max_wait=0))
+
+        monitor.lag = MagicMock(return_value=5)
+        self.assertTrue(monitor.wait_for_capacity(max_wait=0))
+        self.assertTrue(monitor.drained())
+
+class TestDeadLetter(unittest.TestCase):
+    def test_dead_letter_keeps_payload_and_error(self):
+        mock_redis = MagicMock(spec=redis.Redis)
+        dead_letter(mock_redis, "tweets:micro", "5-0", {"tweet_id": "1", "text_raw": "x"}, KeyError('handle'))
+
+        args, kwargs = mock_redis.xadd.call_args
+        self.assertEqual(args[0], config.REDIS_DLQ_STREAM)
+        self.assertEqual(args[1]['tweet_id'], "1")
+        self.assertEqual(args[1]['_source_stream'], "tweets:micro")
+        self.assertEqual(args[1]['_source_id'], "5-0")
+        self.assertIn("KeyError", args[1]['_error'])
+
+    def test_replay_restores_original_message(self):
+        mock_redis = MagicMock(spec=redis.Redis)
+        mock_redis.xrange.return_value = [
+            ("9-0", {"tweet_id": "1", "_source_stream": "tweets:micro", "_error": "DataError: bad"}),
+            ("9-1", {"tweet_id": "2", "_source_stream": "tweets:hourly", "_error": "KeyError: 'handle'"}),
+        ]
+        pipe = mock_redis.pipeline.return_value
+
+        replayed = replay_dlq(mock_redis, match="DataError", replay=True)
+
+        self.assertEqual(replayed, 1)
+        pipe.xadd.assert_called_once_with("tweets:micro", {"tweet_id": "1"}, maxlen=config.STREAM_MAXLEN, approximate=True)
+        pipe.xdel.assert_called_once_with(config.REDIS_DLQ_STREAM, "9-0")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import threading
+import queue
+import time
+import numpy as np
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import worker
+from app.services.batching import AdaptiveBatchSizer
+
+class FakeConsumer:
+    """Hands out one fresh entry per read and logs reads and acks in order."""
+    def __init__(self, log):
+        self.redis = MagicMock()
+        self.streams = ["tweets:micro"]
+        self.log = log
+        self.next_id = 0
+
+    def lag(self):
+        return 0
+
+    def read(self, count, block):
+        self.next_id += 1
+        msg_id = f"{self.next_id}-0"
+        self.log.append(("read", msg_id))
+        data = {"tweet_id": str(self.next_id), "handle": "user", "text_raw": f"tweet number {self.next_id}",
+                "timestamp_absolute": "2024-01-01T12:00:00Z"}
+        return [["tweets:micro", [(msg_id, data)]]]
+
+    def ack(self, stream_key, msg_ids):
+        for msg_id in msg_ids:
+            self.log.append(("ack", msg_id))
+
+class FakeModel:
+    name = "fake"
+
+    def encode_bucketed(self, texts, token_budget):
+        return np.zeros((len(texts), 384), dtype=np.float32)
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.log = []
+        self.consumer = FakeConsumer(self.log)
+        self.cache = MagicMock()
+        self.cache.counters = {'misses': 0}
+        self.cache.stats.return_value = {'misses': 0, 'hit_rate': 0.0}
+        self.cache.encode.side_effect = lambda hashes, texts, fn: fn(texts)
+        self.release = threading.Event()
+        self.session_threads = []
+
+        def write(session, items, embeddings, on_poison):
+            self.release.wait(5)
+            for item in items:
+                self.log.append(("write", f"{item['tweet_id']}-0"))
+            return len(items)
+
+        def new_session():
+            self.session_threads.append(threading.current_thread().name)
+            return MagicMock()
+
+        patches = [
+            patch.object(worker, 'Session', side_effect=new_session),
+            patch.object(worker, 'write_with_bisect', side_effect=write),
+            patch.object(worker, 'record_rates'),
+            patch.object(worker, 'report_copypasta'),
+            patch.object(worker, 'report_paraphrases'),
+            patch.object(worker, 'trim_persisted', return_value=0),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def run_pipeline(self):
+        clean_queue = queue.Queue(maxsize=1)
+        write_queue = queue.Queue(maxsize=1)
+        sizer = AdaptiveBatchSizer()
+        stop = threading.Event()
+        threads = [
+            threading.Thread(target=worker.read_stage, args=(self.consumer, clean_queue, sizer, stop), name="reader"),
+            threading.Thread(target=worker.encode_stage,
+                             args=(clean_queue, write_queue, self.cache, "c1", sizer, FakeModel()), name="encoder"),
+            threading.Thread(target=worker.write_stage, args=(self.consumer, write_queue), name="writer"),
+        ]
+        for t in threads:
+            t.start()
+        return stop, threads
+
+    def stop_pipeline(self, stop, threads):
+        stop.set()
+        self.release.set()
+        for t in threads:
+            t.join(5)
+            self.assertFalse(t.is_alive(), f"{t.name} did not stop")
+
+    def test_blocked_writer_stops_the_reader(self):
+        """With the writer stuck, the bounded queues fill and the reader stops pulling from Redis."""
+        stop, threads = self.run_pipeline()
+        time.sleep(0.3)
+        reads = sum(1 for event, _ in self.log if event == "read")
+        time.sleep(0.3)
+        self.assertEqual(sum(1 for event, _ in self.log if event == "read"), reads)
+        # One batch in the writer, one per queue, one held by the encoder, one held by the reader
+        self.assertLessEqual(reads, 5)
+        self.assertFalse(any(event == "ack" for event, _ in self.log))
+        self.stop_pipeline(stop, threads)
+
+    def test_ack_after_write_with_one_session_per_batch(self):
+        """Every entry is acknowledged only after its write; each batch gets its own Session on the writer thread."""
+        stop, threads = self.run_pipeline()
+        time.sleep(0.1)
+        self.stop_pipeline(stop, threads)
+
+        writes = [msg_id for event, msg_id in self.log if event == "write"]
+        acks = [msg_id for event, msg_id in self.log if event == "ack"]
+        self.assertTrue(writes)
+        self.assertEqual(acks, writes)
+        for msg_id in acks:
+            self.assertLess(self.log.index(("write", msg_id)), self.log.index(("ack", msg_id)))
+        self.assertEqual(len(self.session_threads), len(writes))
+        self.assertEqual(set(self.session_threads), {"writer"})
+
+    def test_failures_dead_lettered_before_ack(self):
+        """A batch whose write fails transiently dead-letters nothing; the retry dead-letters once, then acks."""
+        def make_batch():
+            items = [{'tweet_id': "1", 'text_clean': "ok"}, {'tweet_id': "2", 'text_clean': "bad row"}]
+            return {'read_ids': {"tweets:micro": ["1-0", "2-0", "3-0"]}, 'items': items,
+                    'sources': {"1": ("tweets:micro", "1-0", {}), "2": ("tweets:micro", "2-0", {})},
+                    'failed': [("tweets:micro", "3-0", {}, ValueError("no text"))],
+                    'embeddings': np.zeros((2, 384), dtype=np.float32)}
+
+        attempts = []
+        def write(session, items, embeddings, on_poison):
+            attempts.append(len(items))
+            if len(attempts) == 1:
+                raise ConnectionError("database went away")
+            on_poison(items[1], ValueError("rejected"))
+            return 1
+
+        write_queue = queue.Queue()
+        for batch in (make_batch(), make_batch(), worker.STOP):
+            write_queue.put(batch)
+        with patch.object(worker, 'write_with_bisect', side_effect=write), \
+             patch.object(worker, 'dead_letter', side_effect=lambda r, stream, msg_id, data, e: self.log.append(("dlq", msg_id))):
+            worker.write_stage(self.consumer, write_queue)
+
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(self.log, [("dlq", "3-0"), ("dlq", "2-0"), ("ack", "1-0"), ("ack", "2-0"), ("ack", "3-0")])
+
+if __name__ == '__main__':
+    unittest.main()